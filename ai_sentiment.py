@@ -2,28 +2,210 @@
 AI Sentiment Analysis Module
 Uses a lightweight approach for sentiment analysis without external APIs
 """
+import hashlib
 import re
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from types import MappingProxyType
+
+# Compiled once; clean_text runs for every analyzed document
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+# Apostrophes stay: contractions such as "don't" are negations
+SPECIAL_CHARS_RE = re.compile(r"[^\w\s.,!?;:']")
+
+
+class Lexicon:
+    """
+    Precompiled weighted word list for the fallback analyzer
+    Built once; scoring is a single pass over the tokens with dict lookups,
+    negation windows and intensifier multipliers.
+    """
+
+    # Words, contractions and clause-ending punctuation
+    TOKEN_RE = re.compile(r"[a-z]+(?:'[a-z]+)?|[.!?;]")
+    CLAUSE_END = frozenset('.!?;')
+
+    DEFAULT_NEGATIONS = frozenset([
+        'not', 'no', 'never', 'none', 'nobody', 'nothing', 'neither', 'nor',
+        'without', 'hardly', 'barely', "don't", "doesn't", "didn't", "isn't",
+        "aren't", "wasn't", "weren't", "can't", "couldn't", "won't", "wouldn't",
+        "shouldn't", "haven't", "hasn't", "hadn't", 'cannot'
+    ])
+
+    DEFAULT_INTENSIFIERS = {
+        'very': 1.5, 'really': 1.5, 'extremely': 2.0, 'so': 1.3, 'super': 1.5,
+        'incredibly': 1.8, 'totally': 1.5, 'absolutely': 1.8, 'quite': 1.2,
+        'slightly': 0.5, 'somewhat': 0.7, 'kinda': 0.7
+    }
+
+    # Token kinds in the lookup table
+    _WEIGHT, _INTENSIFIER, _NEGATION, _CLAUSE_END = range(4)
+
+    # Negated sentiment is flipped and damped (same scalar VADER uses)
+    NEGATION_SCALAR = -0.74
+    NEGATION_WINDOW = 3
+
+    def __init__(self, weights, negations=None, intensifiers=None):
+        """Freeze the lexicon tables"""
+        self.weights = MappingProxyType(dict(weights))
+        self.negations = frozenset(negations if negations is not None else self.DEFAULT_NEGATIONS)
+        self.intensifiers = MappingProxyType(dict(
+            intensifiers if intensifiers is not None else self.DEFAULT_INTENSIFIERS))
+
+        # One lookup per token: (kind, value) for every word the scorer cares about
+        table = {word: (self._WEIGHT, weight) for word, weight in self.weights.items()}
+        table.update({word: (self._INTENSIFIER, boost) for word, boost in self.intensifiers.items()})
+        table.update({word: (self._NEGATION, None) for word in self.negations})
+        table.update({mark: (self._CLAUSE_END, None) for mark in self.CLAUSE_END})
+        self._table = table
+
+        digest = hashlib.sha256()
+        for word in sorted(self.weights):
+            digest.update(f"{word}={self.weights[word]};".encode('utf-8'))
+        self.fingerprint = digest.hexdigest()[:12]
+
+    @classmethod
+    def default(cls):
+        """The built-in positive/negative word lists"""
+        positive_words = [
+            'good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic',
+            'awesome', 'brilliant', 'outstanding', 'superb', 'magnificent',
+            'love', 'like', 'enjoy', 'happy', 'pleased', 'satisfied',
+            'beautiful', 'perfect', 'best', 'incredible', 'remarkable'
+        ]
+
+        negative_words = [
+            'bad', 'terrible', 'awful', 'horrible', 'disgusting', 'hate',
+            'dislike', 'angry', 'sad', 'disappointed', 'frustrated',
+            'worst', 'pathetic', 'useless', 'boring', 'annoying',
+            'difficult', 'problem', 'issue', 'wrong', 'error', 'fail'
+        ]
+
+        weights = {word: 1.0 for word in positive_words}
+        weights.update({word: -1.0 for word in negative_words})
+        return cls(weights)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Load a lexicon file: one "word<TAB>weight" entry per line
+        Extra columns are ignored, so VADER's vader_lexicon.txt loads as-is.
+        Weights are scaled into [-1, 1] by the largest absolute weight.
+        """
+        weights = {}
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                if not line.strip() or line.startswith('#'):
+                    continue
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) < 2:
+                    continue
+                try:
+                    weights[parts[0].strip().lower()] = float(parts[1])
+                except ValueError:
+                    continue
+
+        peak = max((abs(weight) for weight in weights.values()), default=1.0) or 1.0
+        return cls({word: weight / peak for word, weight in weights.items()})
+
+    def score(self, text):
+        """
+        Score lower-cased tokens of `text` in one pass
+        Returns: (weighted sum, sentiment word count, total word count)
+        """
+        lookup = self._table.get
+        weighted_sum = 0.0
+        sentiment_words = 0
+        total_words = 0
+        negate_for = 0
+        multiplier = 1.0
+
+        for token in self.TOKEN_RE.findall(text.lower()):
+            entry = lookup(token)
+            if entry is None:
+                # Plain word: closes any intensifier, advances the negation window
+                total_words += 1
+                multiplier = 1.0
+                if negate_for:
+                    negate_for -= 1
+                continue
+
+            kind, value = entry
+            if kind == self._WEIGHT:
+                total_words += 1
+                value *= multiplier
+                if negate_for:
+                    value *= self.NEGATION_SCALAR
+                    negate_for -= 1
+                weighted_sum += value
+                sentiment_words += 1
+                multiplier = 1.0
+            elif kind == self._INTENSIFIER:
+                total_words += 1
+                multiplier *= value
+            elif kind == self._NEGATION:
+                total_words += 1
+                negate_for = self.NEGATION_WINDOW
+            else:
+                negate_for = 0
+                multiplier = 1.0
+
+        return weighted_sum, sentiment_words, total_words
+
 
 class SentimentAnalyzer:
     """AI-powered sentiment analysis for blog posts"""
 
-    def __init__(self):
-        """Initialize the sentiment analyzer"""
+    # Where nltk.download() puts the VADER lexicon
+    VADER_RESOURCE = 'sentiment/vader_lexicon.zip'
+
+    def __init__(self, cache_size=2048, allow_download=False):
+        """Initialize the sentiment analyzer (the scoring engine loads on first use)"""
         self.use_vader = False
         self.analyzer = None
+        self.lexicon = Lexicon.default()
+        self.allow_download = allow_download
+        self._engine_loaded = False
+        self._engine_lock = threading.Lock()
 
-        try:
-            # Try to use NLTK's VADER sentiment analyzer (more accurate)
-            import nltk
-            from nltk.sentiment import SentimentIntensityAnalyzer
+        # Results keyed by a hash of the cleaned text, evicted least-recently-used
+        self.cache_size = cache_size
+        self.cache_store = None  # optional persistent store with get(key) / set(key, result)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def load_engine(self):
+        """
+        Pick the scoring engine once: NLTK's VADER (more accurate) when it and
+        its lexicon are installed, else the built-in lexicon. The lexicon is
+        only downloaded when allow_download is set, so booting never touches
+        the network.
+        """
+        if self._engine_loaded:
+            return
+        with self._engine_lock:
+            if self._engine_loaded:
+                return
             try:
-                nltk.download('vader_lexicon', quiet=True)
+                import nltk
+                from nltk.sentiment import SentimentIntensityAnalyzer
+                try:
+                    nltk.data.find(self.VADER_RESOURCE)
+                except LookupError:
+                    if self.allow_download:
+                        nltk.download('vader_lexicon', quiet=True)
+                    else:
+                        print("VADER lexicon not installed - using the built-in lexicon")
+                        self._engine_loaded = True
+                        return
                 self.analyzer = SentimentIntensityAnalyzer()
                 self.use_vader = True
-            except:
+            except ImportError:
                 pass
-        except ImportError:
-            pass
+            except Exception as e:
+                print(f"VADER unavailable, using the built-in lexicon: {e}")
+            self._engine_loaded = True
 
     def clean_text(self, text):
         """Clean and preprocess text for analysis"""
@@ -31,16 +213,73 @@ class SentimentAnalyzer:
             return ""
 
         # Remove HTML tags
-        text = re.sub(r'<[^>]+>', '', text)
+        text = HTML_TAG_RE.sub('', text)
         # Remove extra whitespace
         text = ' '.join(text.split())
         # Remove special characters but keep punctuation for sentiment
-        text = re.sub(r'[^\w\s.,!?;:]', '', text)
+        text = SPECIAL_CHARS_RE.sub('', text.replace('\u2019', "'"))
         return text.strip()
 
-    def analyze_sentiment(self, text):
+    def load_lexicon(self, path):
+        """Replace the fallback lexicon with one loaded from a file"""
+        self.lexicon = Lexicon.from_file(path)
+        self.clear_cache()
+
+    @property
+    def engine_name(self):
+        """Name of the scoring engine, part of every cache key"""
+        self.load_engine()
+        if self.use_vader and self.analyzer:
+            return 'vader'
+        return f'simple:{self.lexicon.fingerprint}'
+
+    def cache_key(self, clean_text):
+        """Content hash of cleaned text for the active engine"""
+        digest = hashlib.sha256(f"{self.engine_name}\0{clean_text}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def _cache_get(self, key):
+        """Look a result up in memory, then in the persistent store"""
+        with self._cache_lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                return dict(result)
+
+        if self.cache_store is not None:
+            try:
+                result = self.cache_store.get(key)
+            except Exception as e:
+                print(f"Sentiment cache store read error: {e}")
+                result = None
+            if result is not None:
+                self._cache_put(key, result, persist=False)
+                return dict(result)
+        return None
+
+    def _cache_put(self, key, result, persist=True):
+        """Remember a result, evicting the least recently used entries"""
+        with self._cache_lock:
+            self._cache[key] = dict(result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        if persist and self.cache_store is not None:
+            try:
+                self.cache_store.set(key, result)
+            except Exception as e:
+                print(f"Sentiment cache store write error: {e}")
+
+    def clear_cache(self):
+        """Forget all in-memory results"""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def analyze_sentiment(self, text, use_cache=True):
         """
         Analyze sentiment of given text
+        Pass use_cache=False to score afresh without reading or storing cached results
         Returns: dict with score, label, and confidence
         """
         if not text or len(text.strip()) < 10:
@@ -53,10 +292,58 @@ class SentimentAnalyzer:
         # Clean the text
         clean_text = self.clean_text(text)
 
+        if not use_cache:
+            self.load_engine()
+            return self._score(clean_text)
+
+        # Unchanged content is never re-scored
+        key = self.cache_key(clean_text)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        result = self._score(clean_text)
+        self._cache_put(key, result)
+        return result
+
+    def _score(self, clean_text):
+        """Score cleaned text with the active engine"""
         if self.use_vader and self.analyzer:
             return self._analyze_with_vader(clean_text)
-        else:
-            return self._analyze_with_simple(clean_text)
+        return self._analyze_with_simple(clean_text)
+
+    def analyze_many(self, texts, chunk_size=256, processes=None, use_cache=True):
+        """
+        Analyze a stream of documents
+        Args:
+            texts: any iterable of strings, consumed lazily chunk by chunk
+            chunk_size: documents per chunk handed to a worker
+            processes: fan out across this many worker processes (None/1 = in-process)
+            use_cache: False scores every document afresh (see analyze_sentiment)
+        Yields: one result dict per document, in input order
+        """
+        iter_texts = iter(texts)
+        chunks = iter(lambda: list(islice(iter_texts, chunk_size)), [])
+
+        if not processes or processes <= 1:
+            for chunk in chunks:
+                for text in chunk:
+                    yield self.analyze_sentiment(text, use_cache)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Workers score with this analyzer's lexicon, not the built-in default.
+        # Keep a bounded number of chunks in flight so memory stays flat.
+        lexicon = (dict(self.lexicon.weights), self.lexicon.negations, dict(self.lexicon.intensifiers))
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=lexicon) as executor:
+            in_flight = deque()
+            for chunk in chunks:
+                in_flight.append(executor.submit(_analyze_chunk, chunk, use_cache))
+                if len(in_flight) >= processes * 2:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
 
     def _analyze_with_vader(self, text):
         """Analyze sentiment using NLTK's VADER"""
@@ -86,30 +373,11 @@ class SentimentAnalyzer:
             return self._analyze_with_simple(text)
 
     def _analyze_with_simple(self, text):
-        """Simple sentiment analysis using word lists"""
+        """Simple sentiment analysis using the compiled lexicon"""
         try:
-            # Simple positive and negative word lists
-            positive_words = [
-                'good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic',
-                'awesome', 'brilliant', 'outstanding', 'superb', 'magnificent',
-                'love', 'like', 'enjoy', 'happy', 'pleased', 'satisfied',
-                'beautiful', 'perfect', 'best', 'incredible', 'remarkable'
-            ]
-
-            negative_words = [
-                'bad', 'terrible', 'awful', 'horrible', 'disgusting', 'hate',
-                'dislike', 'angry', 'sad', 'disappointed', 'frustrated',
-                'worst', 'pathetic', 'useless', 'boring', 'annoying',
-                'difficult', 'problem', 'issue', 'wrong', 'error', 'fail'
-            ]
-
-            words = text.lower().split()
-            positive_count = sum(1 for word in words if word in positive_words)
-            negative_count = sum(1 for word in words if word in negative_words)
-
-            total_sentiment_words = positive_count + negative_count
-
-            if total_sentiment_words == 0:
+            weighted_sum, sentiment_words, total_words = self.lexicon.score(text)
+
+            if sentiment_words == 0:
                 return {
                     'score': 0.0,
                     'label': 'neutral',
@@ -117,7 +385,7 @@ class SentimentAnalyzer:
                 }
 
             # Calculate score
-            score = (positive_count - negative_count) / len(words)
+            score = max(-1.0, min(weighted_sum / total_words, 1.0))
 
             # Determine label
             if score > 0.01:
@@ -128,7 +396,7 @@ class SentimentAnalyzer:
                 label = 'neutral'
 
             # Calculate confidence
-            confidence = min(total_sentiment_words / len(words) * 2, 1.0)
+            confidence = min(sentiment_words / total_words * 2, 1.0)
 
             return {
                 'score': score,
@@ -181,5 +449,47 @@ class SentimentAnalyzer:
         except Exception as e:
             return ["Sentiment analysis completed."]
 
+_process_analyzer = None
+
+
+def _init_worker(weights, negations, intensifiers):
+    """Process-pool initializer: a process-local analyzer with the parent's lexicon"""
+    global _process_analyzer
+    # No persistent store here: worker processes have no app context
+    _process_analyzer = SentimentAnalyzer()
+    _process_analyzer.lexicon = Lexicon(weights, negations, intensifiers)
+
+
+def _analyze_chunk(texts, use_cache=True):
+    """Process-pool entry point: score a chunk with the process-local analyzer"""
+    if _process_analyzer is None:
+        _init_worker(Lexicon.default().weights, None, None)
+    return [_process_analyzer.analyze_sentiment(text, use_cache) for text in texts]
+
+
+class SentimentCacheStore:
+    """Persists analyzer results in the sentiment_cache table so they survive restarts"""
+
+    def get(self, key):
+        """Return a stored result dict or None"""
+        from models import db, SentimentCacheEntry
+
+        entry = db.session.get(SentimentCacheEntry, key)
+        if entry is None:
+            return None
+        return {'score': entry.score, 'label': entry.label, 'confidence': entry.confidence}
+
+    def set(self, key, result):
+        """Store a result in the caller's transaction (committed with it)"""
+        from models import db, SentimentCacheEntry
+
+        db.session.merge(SentimentCacheEntry(
+            content_hash=key,
+            score=result['score'],
+            label=result['label'],
+            confidence=result['confidence']
+        ))
+
+
 # Global instance
 sentiment_analyzer = SentimentAnalyzer()
@@ -1,4 +1,6 @@
+import click
 from flask import Flask, render_template
+from flask.cli import with_appcontext
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 import os
@@ -17,11 +19,47 @@ def create_app():
 
     # Configuration
     app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///blog.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///blog.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['UPLOAD_FOLDER'] = 'static/uploads'
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
+    app.config['IMAGE_WORKERS'] = 2  # processes rendering upload renditions (0 = render inline)
+    app.config['VIEW_COUNTER_FLUSH_INTERVAL'] = 5.0  # seconds between view count flushes
+    app.config['VIEW_COUNTER_FLUSH_THRESHOLD'] = 200  # buffered views that force a flush
+    app.config['SENTIMENT_WORKERS'] = 2  # background analysis threads (0 = analyze inline)
+    app.config['SENTIMENT_QUEUE_SIZE'] = 100  # in-memory backlog before jobs wait for a sweep
+    app.config['SENTIMENT_MAX_ATTEMPTS'] = 3
+    app.config['SENTIMENT_RETRY_DELAY'] = 30  # seconds, multiplied by the attempt number
+    app.config['SENTIMENT_CACHE_SIZE'] = 2048  # in-memory results kept by content hash
+    app.config['SENTIMENT_CACHE_PERSIST'] = True  # also keep results in the sentiment_cache table
+    app.config['SENTIMENT_LEXICON_PATH'] = os.environ.get('SENTIMENT_LEXICON_PATH')  # optional word<TAB>weight file
+    app.config['SQLITE_TUNING'] = os.environ.get('SQLITE_TUNING', '1') != '0'  # WAL + pragmas + writer lock
+    app.config['SQLITE_BUSY_TIMEOUT'] = 5000  # ms a connection waits for a lock before failing
+    app.config['SQLITE_MMAP_SIZE'] = 256 * 1024 * 1024  # bytes of the database file read via mmap
+    app.config['SQLITE_SINGLE_WRITER'] = True  # queue writers instead of busy-polling SQLite's lock
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))  # PostgreSQL connections per worker
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    app.config['DB_POOL_RECYCLE'] = 1800  # seconds before a pooled connection is replaced
+    app.config['FRAGMENT_CACHE_SIZE'] = 512  # rendered template fragments kept in memory (0 = off)
+    app.config['FRAGMENT_CACHE_TTL'] = 300  # seconds; bounds staleness across processes without Redis
+    app.config['FRAGMENT_CACHE_REDIS_URL'] = os.environ.get('FRAGMENT_CACHE_REDIS_URL')  # optional shared backend
+    app.config['RELATED_POSTS_COUNT'] = 5  # neighbours stored per post (view_post shows 3)
+    app.config['RELATED_POSTS_TAG_WEIGHT'] = 0.4  # tag Jaccard share of the score; the rest is TF-IDF cosine
+    app.config['RELATED_POSTS_MIN_SCORE'] = 0.05  # weaker matches are not listed
+    app.config['RELATED_WORKERS'] = 1  # background related-posts refresh threads (0 = refresh inline)
+    app.config['CONDITIONAL_GET'] = True  # ETag/Last-Modified and 304s for posts and listings
+    app.config['COMMENTS_PER_PAGE'] = 20  # comments rendered with a post; older ones load on demand
+    app.config['CHATBOT_MAX_POSTS'] = 3  # posts retrieved per chatbot answer
+    app.config['CHATBOT_CACHE_SIZE'] = 256  # answers kept for repeated questions
+    app.config['CHATBOT_CACHE_TTL'] = 300  # seconds; post changes in this process invalidate sooner
+    app.config['SQL_INSTRUMENTATION'] = os.environ.get('SQL_INSTRUMENTATION') == '1'  # per-request query counts and DB time in Server-Timing
+    app.config['SQL_NPLUS1_THRESHOLD'] = 5  # repeats of one SELECT within a request that flag an N+1
+    app.config['SQL_NPLUS1_WARN'] = os.environ.get('SQL_NPLUS1_WARN') == '1'  # print N+1 suspects as they happen
+    app.config['SQL_DEBUG_ENDPOINT'] = os.environ.get('SQL_DEBUG_ENDPOINT') == '1'  # expose /_debug/queries (local requests only)
+    app.config['SQL_DEBUG_HISTORY'] = 50  # request profiles kept for the debug endpoint
+    app.config['STARTUP_MODE'] = os.environ.get('STARTUP_MODE', 'auto')  # 'fast' skips schema/seed work; run `flask init-db`
+    app.config['SENTIMENT_NLTK_DOWNLOAD'] = os.environ.get('SENTIMENT_NLTK_DOWNLOAD') == '1'  # fetch the VADER lexicon if missing
 
     # Create upload directories
     upload_dirs = ['static/uploads', 'static/uploads/posts', 'static/uploads/profiles']
@@ -32,10 +70,49 @@ def create_app():
             print(f"Error creating directory {directory}: {e}")
 
     # Initialize extensions with app
+    from database_profile import database_profile
+    database_profile.configure(app)
     db.init_app(app)
+    database_profile.init_app(app)
     login_manager.init_app(app)
     csrf.init_app(app)
 
+    from view_counter import view_counter
+    view_counter.init_app(app)
+
+    from image_pipeline import image_pipeline
+    image_pipeline.init_app(app)
+
+    from sentiment_queue import sentiment_queue
+    sentiment_queue.init_app(app)
+
+    from fragment_cache import fragment_cache
+    fragment_cache.init_app(app)
+
+    from related_posts import related_index, related_queue
+    related_index.init_app(app)
+    related_queue.init_app(app)
+
+    from conditional_get import conditional_get
+    conditional_get.init_app(app)
+
+    from instrumentation import query_instrumentation
+    query_instrumentation.init_app(app)
+
+    from chatbot_engine import chatbot_engine
+    chatbot_engine.init_app(app)
+
+    from ai_sentiment import sentiment_analyzer, SentimentCacheStore
+    sentiment_analyzer.cache_size = app.config['SENTIMENT_CACHE_SIZE']
+    sentiment_analyzer.allow_download = app.config['SENTIMENT_NLTK_DOWNLOAD']
+    if app.config['SENTIMENT_CACHE_PERSIST']:
+        sentiment_analyzer.cache_store = SentimentCacheStore()
+    if app.config['SENTIMENT_LEXICON_PATH']:
+        try:
+            sentiment_analyzer.load_lexicon(app.config['SENTIMENT_LEXICON_PATH'])
+        except Exception as e:
+            print(f"Error loading sentiment lexicon: {e}")
+
     # Login manager configuration
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
@@ -54,10 +131,31 @@ def create_app():
     from blueprints.auth import auth_bp
     from blueprints.main import main_bp
     from blueprints.blog import blog_bp
+    from blueprints.chatbot import chatbot_bp
 
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(main_bp)
     app.register_blueprint(blog_bp, url_prefix='/blog')
+    app.register_blueprint(chatbot_bp, url_prefix='/chatbot')
+
+    # CLI commands
+    from post_counters import rebuild_counters_command
+    from sentiment_queue import sentiment_backfill_command
+    from image_pipeline import render_images_command
+    from migrations import db_upgrade_command, db_check_command
+    from user_stats import reconcile_user_stats_command
+    from related_posts import rebuild_related_command
+    from corpus_transfer import export_data_command, import_data_command
+    app.cli.add_command(rebuild_counters_command)
+    app.cli.add_command(sentiment_backfill_command)
+    app.cli.add_command(render_images_command)
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(db_check_command)
+    app.cli.add_command(reconcile_user_stats_command)
+    app.cli.add_command(rebuild_related_command)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(export_data_command)
+    app.cli.add_command(import_data_command)
 
     # Error handlers
     @app.errorhandler(500)
@@ -76,21 +174,57 @@ def create_app():
         db.session.rollback()
         return render_template('errors/500.html'), 500
 
-    # Create database tables (only if they don't exist)
     with app.app_context():
-        try:
-            print("Checking database tables...")
-            # This only creates tables that don't exist - preserves existing data
-            db.create_all()
-            print("Database tables verified/created successfully!")
+        if app.config['STARTUP_MODE'] == 'fast':
+            # Schema and seed work was done by `flask init-db`; just find the search index
+            from search_index import search_index
+            search_index.detect()
+        else:
+            try:
+                prepare_database()
+            except Exception:
+                # Already reported; let the app boot so the error can be seen
+                pass
+
+    return app
+
+
+def prepare_database(sample_data=True):
+    """
+    Create tables, apply migrations, build the search index and seed an empty database
+    Errors are printed and re-raised, so `flask init-db` exits non-zero.
+    """
+    from search_index import search_index
+
+    try:
+        print("Checking database tables...")
+        # This only creates tables that don't exist - preserves existing data
+        db.create_all()
+        print("Database tables verified/created successfully!")
 
-            # Initialize sample data only if database is empty
+        # Bring existing databases up to date (columns, indexes, backfills)
+        from migrations import upgrade
+        upgrade()
+
+        # Create (and backfill if empty) the full-text search index
+        search_index.ensure_index()
+
+        # Initialize sample data only if database is empty
+        if sample_data:
             init_sample_data_if_needed()
 
-        except Exception as e:
-            print(f"Database initialization error: {e}")
+    except Exception as e:
+        print(f"Database initialization error: {e}")
+        raise
 
-    return app
+
+@click.command('init-db')
+@click.option('--no-sample-data', is_flag=True, help='Do not seed an empty database.')
+@with_appcontext
+def init_db_command(no_sample_data):
+    """Create tables, apply migrations and build the search index (run before STARTUP_MODE=fast)."""
+    prepare_database(sample_data=not no_sample_data)
+    click.echo("Database ready.")
 
 
 def init_sample_data_if_needed():
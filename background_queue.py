@@ -0,0 +1,148 @@
+"""
+Background Queue Module
+Worker threads, table sweeps and fork handling shared by the durable post job queues
+"""
+import atexit
+import os
+import queue
+import threading
+from datetime import datetime, timedelta
+
+
+class BackgroundQueue:
+    """
+    Base for durable background queues of per-post jobs
+
+    Jobs live in a table, so nothing is lost on restart. A bounded in-memory
+    queue feeds a small thread pool; when it is full, jobs simply stay in the
+    table until an idle worker sweeps them up. Subclasses implement
+    process(post_id) and due_jobs(limit), and may override recover().
+    """
+
+    # App config keys are <config_prefix>_WORKERS, _MAX_ATTEMPTS, _RETRY_DELAY,
+    # _POLL_INTERVAL and _QUEUE_SIZE
+    config_prefix = None
+    label = 'Background'
+    default_workers = 1
+
+    def __init__(self):
+        """Initialize the queue"""
+        self.app = None
+        self.num_workers = self.default_workers
+        self.max_attempts = 3
+        self.retry_delay = 30
+        self.poll_interval = 10
+        self.queue_size = 100
+        self._reset()
+
+        # Worker threads do not survive a fork; start fresh in the child
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """Drop worker threads and the in-memory queue"""
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._stop = threading.Event()
+        self._workers = []
+
+    def init_app(self, app):
+        """Read configuration and stop the workers on shutdown"""
+        prefix = self.config_prefix
+        self.app = app
+        self.num_workers = app.config.get(f'{prefix}_WORKERS', self.default_workers)
+        self.max_attempts = app.config.get(f'{prefix}_MAX_ATTEMPTS', 3)
+        self.retry_delay = app.config.get(f'{prefix}_RETRY_DELAY', 30)
+        self.poll_interval = app.config.get(f'{prefix}_POLL_INTERVAL', 10)
+        self.queue_size = app.config.get(f'{prefix}_QUEUE_SIZE', 100)
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        atexit.register(self.shutdown)
+
+        # Start workers with the first request so jobs left pending by a
+        # previous run are picked up even if nothing new is submitted
+        app.before_request(self._ensure_workers)
+
+    def submit(self, post_id):
+        """Hand a committed job to the workers"""
+        if self.num_workers <= 0:
+            # Synchronous mode (tests, CLI, single-process debugging)
+            self.process(post_id)
+            return
+
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait(post_id)
+        except queue.Full:
+            # Backpressure: the job stays in the table for the next sweep
+            print(f"{self.label} queue full - post {post_id} deferred to sweep")
+
+    def retry_at(self, attempts):
+        """When a job that has failed `attempts` times runs again (linear backoff)"""
+        return datetime.utcnow() + timedelta(seconds=self.retry_delay * attempts)
+
+    def process(self, post_id):
+        """Claim and run the job for a post; returns True when it completed"""
+        raise NotImplementedError
+
+    def due_jobs(self, limit):
+        """Post ids of up to `limit` jobs ready to run (inside an app context)"""
+        raise NotImplementedError
+
+    def recover(self):
+        """Return jobs abandoned by a dead worker to the table (inside an app context)"""
+
+    def sweep(self):
+        """Queue due jobs left in the table"""
+        from models import db
+
+        room = self._queue.maxsize - self._queue.qsize()
+        with self.app.app_context():
+            try:
+                self.recover()
+                due = self.due_jobs(room) if room > 0 else []
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error sweeping {self.label.lower()} jobs: {e}")
+                return
+            finally:
+                db.session.remove()
+
+        for post_id in due:
+            try:
+                self._queue.put_nowait(post_id)
+            except queue.Full:
+                break
+
+    def shutdown(self):
+        """Ask the workers to stop; unfinished jobs stay in the table"""
+        self._stop.set()
+
+    def _ensure_workers(self):
+        """Start the worker threads lazily (after any fork)"""
+        if self.num_workers <= 0 or (len(self._workers) >= self.num_workers
+                                     and all(worker.is_alive() for worker in self._workers)):
+            return
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.num_workers:
+                worker = threading.Thread(target=self._run,
+                                          name=f'{self.config_prefix.lower()}-worker-{len(self._workers)}',
+                                          daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _run(self):
+        """Worker loop: process queued posts, sweep the table when idle"""
+        while not self._stop.is_set():
+            try:
+                post_id = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                self.sweep()
+                continue
+
+            try:
+                self.process(post_id)
+            except Exception as e:
+                print(f"{self.label} worker error: {e}")
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,5 @@
+"""
+Benchmarks
+Standalone performance scripts; run them from the project root with
+`python -m benchmarks.<name>`
+"""
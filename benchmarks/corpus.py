@@ -0,0 +1,195 @@
+"""
+Synthetic Corpus Generator
+Fills a database with a reproducible corpus of users, posts, tags, comments
+and favorites using bulk inserts, then rebuilds the derived tables (counters,
+user stats, search index and related posts).
+
+Usage: python -m benchmarks.corpus --database sqlite:////tmp/bench.db [--scale small|medium|large] [--seed 42]
+"""
+import argparse
+import itertools
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+SCALES = {
+    'tiny': {'users': 50, 'posts': 500, 'tags': 40, 'comments_per_post': 3, 'favorites_per_user': 10},
+    'small': {'users': 500, 'posts': 5_000, 'tags': 150, 'comments_per_post': 3, 'favorites_per_user': 15},
+    'medium': {'users': 2_000, 'posts': 50_000, 'tags': 400, 'comments_per_post': 3, 'favorites_per_user': 25},
+    'large': {'users': 10_000, 'posts': 500_000, 'tags': 1_000, 'comments_per_post': 3, 'favorites_per_user': 40},
+}
+
+# Every generated user logs in with this password
+PASSWORD = 'benchmark'
+
+# Related posts are rebuilt automatically up to this many posts; beyond it use --related
+RELATED_AUTO_LIMIT = 20_000
+
+FIRST_NAMES = ['Ada', 'Alan', 'Grace', 'Linus', 'Barbara', 'Ken', 'Margaret', 'Dennis', 'Frances', 'Edsger',
+               'Radia', 'Guido', 'Katherine', 'John', 'Hedy', 'Tim', 'Annie', 'Donald', 'Sophie', 'Niklaus']
+LAST_NAMES = ['Lovelace', 'Turing', 'Hopper', 'Torvalds', 'Liskov', 'Thompson', 'Hamilton', 'Ritchie', 'Allen',
+              'Dijkstra', 'Perlman', 'Rossum', 'Johnson', 'Backus', 'Lamarr', 'Berners', 'Easley', 'Knuth',
+              'Wilson', 'Wirth']
+TOPICS = ['python', 'flask', 'travel', 'recipes', 'coffee', 'running', 'yoga', 'gardening', 'music', 'guitar',
+          'photography', 'history', 'science', 'databases', 'startups', 'design', 'books', 'movies', 'hiking',
+          'cycling', 'baking', 'parenting', 'finance', 'career', 'productivity', 'security', 'cloud', 'mobile',
+          'gaming', 'fitness']
+FILLER = ('the a of to and in is it that for on with as this was at by be from or an are have but not they '
+          'we you all can your more about when there one time people how some what just like get make '
+          'week year day way thing idea plan team work code post story trip meal song book place').split()
+MOOD = ('good great excellent amazing wonderful love enjoy happy best beautiful perfect incredible '
+        'bad terrible awful hate sad disappointed worst boring annoying difficult problem wrong fail').split()
+
+
+def insert_batches(session, table, rows, batch_size):
+    """Bulk insert rows with executemany, committing each batch"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            session.execute(table.insert(), batch)
+            session.commit()
+            batch = []
+    if batch:
+        session.execute(table.insert(), batch)
+        session.commit()
+
+
+def sentence(rng, topic, words):
+    """A run of filler words seeded with a topic and some sentiment words"""
+    picked = rng.choices(FILLER, k=words)
+    for _ in range(max(1, words // 12)):
+        picked[rng.randrange(words)] = rng.choice((topic, topic, rng.choice(MOOD)))
+    return ' '.join(picked).capitalize() + '.'
+
+
+def generate(app, scale='small', seed=42, batch_size=5000, related=None):
+    """
+    Generate the corpus for a scale preset into the app's database
+    Returns the counts inserted. `related` forces (True) or skips (False) the
+    related-posts rebuild; None rebuilds it for corpora up to RELATED_AUTO_LIMIT.
+    """
+    from werkzeug.security import generate_password_hash
+    from models import db, User, Category, Tag, BlogPost, Comment, Favorite, post_tags
+    from post_counters import PostCounters
+    from user_stats import UserStatsRollup
+    from search_index import search_index
+    from related_posts import related_index
+
+    sizes = SCALES[scale]
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    with app.app_context():
+        session = db.session
+        category_ids = [row[0] for row in session.query(Category.id)] or [None]
+
+        # One hash for everyone: hashing 10k passwords would dominate the run
+        password_hash = generate_password_hash(PASSWORD)
+        first_user = (session.query(db.func.max(User.id)).scalar() or 0) + 1
+        insert_batches(session, User.__table__, (
+            {'username': f'user{i:05d}', 'email': f'user{i:05d}@example.com',
+             'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES),
+             'password_hash': password_hash, 'bio': sentence(rng, rng.choice(TOPICS), 20),
+             'profile_image': 'default.jpg', 'created_at': now - timedelta(days=rng.randrange(730)),
+             'is_active': True}
+            for i in range(1, sizes['users'] + 1)
+        ), batch_size)
+        user_ids = [row[0] for row in session.query(User.id).filter(User.id >= first_user).order_by(User.id)]
+        # A few prolific authors write most posts
+        author_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(user_ids) + 1)))
+
+        first_tag = (session.query(db.func.max(Tag.id)).scalar() or 0) + 1
+        insert_batches(session, Tag.__table__, (
+            {'name': f'{TOPICS[i % len(TOPICS)]}-{i}'} for i in range(sizes['tags'])
+        ), batch_size)
+        tag_ids = [row[0] for row in session.query(Tag.id).filter(Tag.id >= first_tag).order_by(Tag.id)]
+        tag_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(tag_ids) + 1)))
+
+        def posts():
+            for i in range(sizes['posts']):
+                topic = rng.choice(TOPICS)
+                # Mostly short posts with a long tail of long reads
+                paragraphs = [' '.join(sentence(rng, topic, rng.randint(8, 24)) for _ in range(rng.randint(2, 6)))
+                              for _ in range(rng.choice((2, 3, 4, 6, 20)))]
+                content = '\n\n'.join(paragraphs)
+                created_at = now - timedelta(seconds=rng.randrange(730 * 86400))
+                score = rng.uniform(-1, 1)
+                yield {
+                    'title': f'{topic.title()} notes {i}: ' + ' '.join(rng.choices(FILLER, k=rng.randint(2, 6))),
+                    'content': content, 'summary': content[:180],
+                    'created_at': created_at, 'updated_at': created_at,
+                    'published': rng.random() < 0.9, 'views': int(rng.paretovariate(1.2)) * 10,
+                    'sentiment_score': round(score, 3),
+                    'sentiment_label': 'positive' if score > 0.1 else 'negative' if score < -0.1 else 'neutral',
+                    'sentiment_confidence': round(abs(score), 3),
+                    'user_id': rng.choices(user_ids, cum_weights=author_weights)[0],
+                    'category_id': rng.choice(category_ids),
+                }
+
+        first_post = (session.query(db.func.max(BlogPost.id)).scalar() or 0) + 1
+        insert_batches(session, BlogPost.__table__, posts(), batch_size)
+        post_rows = session.query(BlogPost.id, BlogPost.created_at, BlogPost.published)\
+                           .filter(BlogPost.id >= first_post).order_by(BlogPost.id).all()
+        published_ids = [post_id for post_id, _, published in post_rows if published]
+
+        def taggings():
+            for post_id, _, _ in post_rows:
+                for tag_id in set(rng.choices(tag_ids, cum_weights=tag_weights, k=rng.randint(0, 4))):
+                    yield {'post_id': post_id, 'tag_id': tag_id}
+
+        def comments():
+            for post_id, created_at, published in post_rows:
+                if not published:
+                    continue
+                for _ in range(int(rng.expovariate(1.0 / sizes['comments_per_post']))):
+                    yield {'post_id': post_id, 'user_id': rng.choice(user_ids),
+                           'content': sentence(rng, rng.choice(TOPICS), rng.randint(6, 40)),
+                           'created_at': created_at + timedelta(seconds=rng.randrange(1, 30 * 86400)),
+                           'approved': True}
+
+        def favorites():
+            for user_id in user_ids:
+                count = min(len(published_ids), rng.randint(0, 2 * sizes['favorites_per_user']))
+                for post_id in rng.sample(published_ids, count):
+                    yield {'user_id': user_id, 'post_id': post_id,
+                           'created_at': now - timedelta(seconds=rng.randrange(365 * 86400))}
+
+        insert_batches(session, post_tags, taggings(), batch_size)
+        insert_batches(session, Comment.__table__, comments(), batch_size)
+        insert_batches(session, Favorite.__table__, favorites(), batch_size)
+        print(f"Inserted {sizes['users']} users, {len(post_rows)} posts in {time.perf_counter() - started:.1f}s")
+
+        # Derived tables the app normally maintains incrementally
+        PostCounters.rebuild()
+        PostCounters.rebuild_comment_counts()
+        UserStatsRollup.rebuild()
+        search_index.rebuild()
+        if related or (related is None and len(published_ids) <= RELATED_AUTO_LIMIT):
+            related_index.rebuild()
+        else:
+            print("Skipped the related-posts rebuild (run `flask rebuild-related` or pass --related)")
+        print(f"Corpus ready in {time.perf_counter() - started:.1f}s")
+
+    return {'users': len(user_ids), 'posts': len(post_rows), 'tags': len(tag_ids)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', required=True, help='database URL to fill (should be empty)')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--related', action='store_true', default=None, help='always rebuild related posts')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database
+    from app import create_app
+
+    generate(create_app(), args.scale, args.seed, args.batch_size, args.related)
+
+
+if __name__ == '__main__':
+    main()
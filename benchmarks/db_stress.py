@@ -0,0 +1,177 @@
+"""
+Database Concurrency Stress Test
+Runs reader and writer processes against a scratch SQLite database, once with
+the default engine settings and once with the tuned profile (WAL, pragmas,
+single-writer lock). Each profile first runs the readers alone, then
+readers and writers together, and reports read latency for both phases and
+write latency separately, so reads stalling behind writes show up as the
+gap between the two read lines.
+
+Usage: python -m benchmarks.db_stress [--seconds 5] [--readers 4] [--writers 4]
+       python -m benchmarks.db_stress --database postgresql://... (tuned profile only)
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def seed(app, posts):
+    """Insert a user, a category and `posts` published posts"""
+    from models import db, User, Category, BlogPost
+
+    with app.app_context():
+        if BlogPost.query.count() >= posts:
+            return
+        user = User.query.first()
+        if user is None:
+            user = User(username='stress', email='stress@example.com', first_name='Stress', last_name='Test')
+            user.set_password('stress')
+            db.session.add(user)
+        category = Category.query.first() or Category(name='Stress')
+        db.session.add(category)
+        db.session.commit()
+        db.session.execute(BlogPost.__table__.insert(), [
+            {'title': f'Stress post {i}', 'content': 'lorem ipsum ' * 50, 'user_id': user.id,
+             'category_id': category.id, 'published': True, 'views': 0}
+            for i in range(posts)
+        ])
+        db.session.commit()
+
+
+def reader(app, seconds, post_ids, results):
+    """Worker process: time listing and detail reads until the deadline"""
+    from models import db, BlogPost
+    from keyset_pagination import paginate_posts
+
+    latencies, errors = [], 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        with app.app_context():
+            started = time.perf_counter()
+            try:
+                paginate_posts(BlogPost.query.filter_by(published=True), sort='newest')
+                db.session.get(BlogPost, post_ids[len(latencies) % len(post_ids)])
+                latencies.append((time.perf_counter() - started) * 1000)
+            except Exception:
+                errors += 1
+            finally:
+                db.session.remove()
+    results.put({'latencies': latencies, 'read_errors': errors})
+
+
+def writer(app, seconds, post_ids, user_id, number, results):
+    """Worker process: commit comment + view-count writes until the deadline"""
+    from models import db, BlogPost, Comment
+
+    latencies, errors = [], 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        with app.app_context():
+            post_id = post_ids[(len(latencies) + number) % len(post_ids)]
+            started = time.perf_counter()
+            try:
+                # Shaped like add_comment plus a view-count flush
+                db.session.add(Comment(content='stress comment', user_id=user_id, post_id=post_id))
+                db.session.execute(BlogPost.__table__.update()
+                                   .where(BlogPost.id == post_id)
+                                   .values(views=BlogPost.views + 1))
+                db.session.commit()
+                latencies.append((time.perf_counter() - started) * 1000)
+            except Exception:
+                db.session.rollback()
+                errors += 1
+            finally:
+                db.session.remove()
+    results.put({'write_latencies': latencies, 'write_errors': errors})
+
+
+def run(app, seconds, readers, writers):
+    """
+    Hammer the database from separate processes, like gunicorn workers
+    Returns read and write latencies (ms) and error counts
+    """
+    from models import db, BlogPost, User
+
+    with app.app_context():
+        user_id = User.query.first().id
+        post_ids = [row[0] for row in db.session.query(BlogPost.id).limit(200)]
+        # Children must open their own connections
+        db.engine.dispose()
+
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    processes = [context.Process(target=reader, args=(app, seconds, post_ids, queue))
+                 for _ in range(readers)]
+    processes += [context.Process(target=writer, args=(app, seconds, post_ids, user_id, number, queue))
+                  for number in range(writers)]
+    for process in processes:
+        process.start()
+
+    results = {'latencies': [], 'write_latencies': [], 'read_errors': 0, 'write_errors': 0}
+    for _ in processes:
+        for key, value in queue.get().items():
+            results[key] += value
+    for process in processes:
+        process.join()
+    return results
+
+
+def report(name, phase, latencies, errors, seconds):
+    """Print one result line"""
+    print(f"{name:<8} {phase:<22}{len(latencies) / seconds:8.1f}/s  "
+          f"p50 {statistics.median(latencies) if latencies else 0:7.2f} ms  "
+          f"p99 {percentile(latencies, 0.99):8.2f} ms  max {max(latencies, default=0):8.2f} ms  "
+          f"errors {errors:4d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5, help='duration of each run')
+    parser.add_argument('--readers', type=int, default=4, help='reader processes')
+    parser.add_argument('--writers', type=int, default=4, help='writer processes')
+    parser.add_argument('--posts', type=int, default=500, help='posts to seed')
+    parser.add_argument('--database', help='database URL to test instead of scratch SQLite files')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    if args.database:
+        profiles = [('tuned', args.database, '1')]
+    else:
+        scratch = tempfile.mkdtemp(prefix='blog-stress-')
+        profiles = [('default', f"sqlite:///{os.path.join(scratch, 'default.db')}", '0'),
+                    ('tuned', f"sqlite:///{os.path.join(scratch, 'tuned.db')}", '1')]
+
+    # With fewer cores than processes, readers also slow down from sharing the CPU
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:g}s per phase, "
+          f"{os.cpu_count()} CPUs")
+    try:
+        for name, url, tuning in profiles:
+            os.environ['DATABASE_URL'] = url
+            os.environ['SQLITE_TUNING'] = tuning
+            app = create_app()
+            seed(app, args.posts)
+            alone = run(app, args.seconds, args.readers, 0)
+            report(name, 'reads (no writers)', alone['latencies'], alone['read_errors'], args.seconds)
+            mixed = run(app, args.seconds, args.readers, args.writers)
+            report(name, 'reads (with writers)', mixed['latencies'], mixed['read_errors'], args.seconds)
+            report(name, 'writes', mixed['write_latencies'], mixed['write_errors'], args.seconds)
+    finally:
+        if not args.database:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
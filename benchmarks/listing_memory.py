@@ -0,0 +1,135 @@
+"""
+Listing Memory Benchmark
+Renders every post listing against a scratch corpus of long posts, once with
+full rows (the old loading) and once with the card projection, and reports
+bytes loaded into ORM objects, peak Python memory and query count per page.
+
+Usage: python -m benchmarks.listing_memory [--posts 300] [--kb 64]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+ROUTES = ['/', '/blog/posts', '/blog/api/posts', '/category/1', '/tag/1', '/search?query=benchmark',
+          '/dashboard', '/blog/my_posts', '/favorites', '/auth/profile']
+
+
+def seed(app, posts, kilobytes):
+    """Insert `posts` published posts of about `kilobytes` KB each, tagged and favorited"""
+    from models import db, User, Category, Tag, BlogPost, Favorite, post_tags
+    from search_index import search_index
+
+    paragraph = 'This benchmark paragraph pads the post body so it resembles a long article. '
+    body = paragraph * (kilobytes * 1024 // len(paragraph))
+    with app.app_context():
+        user = User.query.filter_by(username='admin').first()
+        category = Category.query.first()
+        tag = Tag(name='benchmark')
+        db.session.add(tag)
+        db.session.commit()
+        db.session.execute(BlogPost.__table__.insert(), [
+            {'title': f'Benchmark post {i}', 'content': body, 'summary': f'Summary of benchmark post {i}',
+             'user_id': user.id, 'category_id': category.id, 'published': True, 'views': i}
+            for i in range(posts)
+        ])
+        post_ids = [row[0] for row in db.session.query(BlogPost.id)]
+        db.session.execute(post_tags.insert(), [{'post_id': post_id, 'tag_id': tag.id} for post_id in post_ids])
+        db.session.execute(Favorite.__table__.insert(),
+                           [{'user_id': user.id, 'post_id': post_id} for post_id in post_ids[:20]])
+        db.session.commit()
+        search_index.rebuild()
+
+
+def measure(app, client, route):
+    """Bytes loaded into ORM instances, peak traced memory and queries for one request"""
+    from sqlalchemy import event
+    from models import db
+
+    loaded = {'bytes': 0, 'queries': 0}
+
+    def size(value):
+        return len(value) if isinstance(value, (str, bytes)) else 8
+
+    def on_load(target, context):
+        loaded['bytes'] += sum(size(value) for key, value in vars(target).items() if key != '_sa_instance_state')
+
+    def on_refresh(target, context, attrs):
+        loaded['bytes'] += sum(size(vars(target).get(key)) for key in attrs or ())
+
+    def on_execute(*args):
+        loaded['queries'] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(db.Model, 'load', on_load, propagate=True)
+    event.listen(db.Model, 'refresh', on_refresh, propagate=True)
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    tracemalloc.start()
+    try:
+        response = client.get(route)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        event.remove(db.Model, 'load', on_load)
+        event.remove(db.Model, 'refresh', on_refresh)
+        event.remove(engine, 'before_cursor_execute', on_execute)
+    return response.status_code, loaded['bytes'], peak, loaded['queries']
+
+
+def full_rows(with_tags=False):
+    """Card options that keep loading the content column, as list views did before"""
+    from sqlalchemy.orm import undefer, selectinload
+    from models import BlogPost
+
+    options = [undefer(BlogPost.preview), selectinload(BlogPost.author), selectinload(BlogPost.category)]
+    if with_tags:
+        options.append(selectinload(BlogPost.tags))
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--posts', type=int, default=300, help='posts in the corpus')
+    parser.add_argument('--kb', type=int, default=64, help='approximate size of each post body')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='blog-listing-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(scratch, 'listing.db')}"
+    try:
+        from app import create_app
+        from query_options import query_options
+
+        app = create_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        app.config['FRAGMENT_CACHE_SIZE'] = 0
+        seed(app, args.posts, args.kb)
+
+        client = app.test_client()
+        client.post('/auth/login', data={'username': 'admin', 'password': 'admin123'})
+
+        modes = [('full rows', full_rows), ('projected', query_options.post_cards)]
+        results = {}
+        for name, options in modes:
+            # Instance attribute shadows the method for this run only
+            query_options.post_cards = options
+            for route in ROUTES:
+                client.get(route)  # warm up template compilation and caches
+                results[name, route] = measure(app, client, route)
+        del query_options.post_cards
+
+        print(f"{args.posts} posts of ~{args.kb} KB")
+        print(f"{'route':<26}{'loaded (full -> projected)':>32}{'peak memory':>28}{'queries':>12}")
+        for route in ROUTES:
+            status, full_bytes, full_peak, full_queries = results['full rows', route]
+            _, bytes_, peak, queries = results['projected', route]
+            print(f"{route:<26}{full_bytes / 1024:>13.1f} KB -> {bytes_ / 1024:>9.1f} KB"
+                  f"{full_peak / 1024:>12.1f} KB -> {peak / 1024:>9.1f} KB"
+                  f"{full_queries:>6d} -> {queries:<3d}{'' if status == 200 else f'  (HTTP {status})'}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
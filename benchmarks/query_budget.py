@@ -0,0 +1,80 @@
+"""
+Query Budget Check
+Runs every route against a scratch corpus with fragment caching off and
+fails when a route issues more SQL statements than its budget. A lazy
+relationship load inside a card or comment loop adds one query per row and
+blows the budget, so eager-loading regressions surface here.
+
+Usage: python -m benchmarks.query_budget [--scale tiny] [--verbose]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+# Queries allowed per request; routes not listed get DEFAULT_BUDGET.
+# Pages list at least 6-12 posts, so one lazy load per card is always caught.
+DEFAULT_BUDGET = 12
+BUDGETS = {
+    'GET /': 14,
+    'GET /blog/post/<int:id>': 16,
+    'GET /blog/post/<int:id> (anonymous)': 14,
+    'GET /dashboard': 14,
+    'POST /auth/register': 8,
+    'POST /toggle_favorite/<int:post_id>': 10,
+    # Saves run the background sentiment and related-posts jobs inline here;
+    # the related refresh is a fixed ~15 statements whatever the corpus size
+    'POST /blog/create': 45,
+    'POST /blog/post/<int:id>/edit': 30,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', default='tiny', help='corpus preset for the scratch database')
+    parser.add_argument('--verbose', action='store_true', help='print every route, not just failures')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='blog-budget-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(scratch, 'budget.db')}"
+    try:
+        from app import create_app
+        from benchmarks.corpus import generate, PASSWORD
+        from benchmarks.routes import Fixtures, get_scenarios, run_route
+        from fragment_cache import fragment_cache
+        from sentiment_queue import sentiment_queue
+        from related_posts import related_queue
+
+        app = create_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        sentiment_queue.num_workers = 0
+        related_queue.num_workers = 0
+        # Cached fragments hide the queries a cold render would issue
+        fragment_cache.enabled = False
+        generate(app, args.scale)
+
+        fixtures = Fixtures(app)
+        clients = {'user': app.test_client(), 'anonymous': app.test_client()}
+        clients['user'].post('/auth/login', data={'username': fixtures.username, 'password': PASSWORD})
+
+        over = []
+        for scenario in get_scenarios(app, fixtures):
+            name = scenario[0]
+            result = run_route(app, clients, scenario, iterations=3, warmup=1)
+            budget = BUDGETS.get(name, DEFAULT_BUDGET)
+            if result['queries'] > budget:
+                over.append(name)
+            if args.verbose or result['queries'] > budget:
+                print(f"{name:<45}{result['queries']:>5g} / {budget:<4d}"
+                      f"{'OVER BUDGET' if result['queries'] > budget else 'ok'}")
+
+        if over:
+            print(f"{len(over)} route(s) over their query budget.")
+            raise SystemExit(1)
+        print("All routes within their query budgets.")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""
+Route Benchmark Suite
+Drives every route of the main, blog and auth blueprints through the Flask
+test client against a synthetic corpus and reports p50/p95/p99 latency,
+queries per request and peak RSS per route. Results can be saved as a
+baseline and later runs are printed as a diff against it.
+
+Usage: python -m benchmarks.routes [--scale small] [--iterations 20]
+       python -m benchmarks.routes --database sqlite:////tmp/bench.db   (reuse a generated corpus)
+       python -m benchmarks.routes --save-baseline benchmarks/baseline.json
+       python -m benchmarks.routes --baseline benchmarks/baseline.json --check
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+BLUEPRINTS = ('main', 'blog', 'auth')
+
+# Would end the benchmark user's session mid-run
+SKIPPED_ENDPOINTS = {'auth.logout'}
+
+# Only meaningful before logging in (they redirect signed-in users)
+ANONYMOUS_ENDPOINTS = {'auth.login', 'auth.register'}
+
+# Public pages also measured for anonymous visitors
+PUBLIC_ENDPOINTS = {'main.index', 'blog.view_post', 'blog.all_posts', 'main.category_posts'}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def reset_peak_rss():
+    """Start a fresh peak-RSS window (Linux); returns False where unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident set size since the last reset, in MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KB on Linux and only ever grows
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Fixtures:
+    """Ids from the corpus used to fill in URL arguments and forms"""
+
+    def __init__(self, app):
+        from models import db, User, BlogPost, Category, Tag
+
+        with app.app_context():
+            # The author of the most posts exercises the heaviest personal pages
+            self.user = db.session.query(User).join(BlogPost, BlogPost.user_id == User.id)\
+                                  .group_by(User.id).order_by(db.func.count(BlogPost.id).desc()).first()
+            if self.user is None:
+                self.user = User.query.first()
+            self.username = self.user.username
+            self.user_id = self.user.id
+            self.post_id = db.session.query(BlogPost.id).filter_by(published=True)\
+                                     .order_by(BlogPost.views.desc()).limit(1).scalar()
+            self.own_post_id = db.session.query(BlogPost.id).filter_by(user_id=self.user_id)\
+                                         .order_by(BlogPost.id).limit(1).scalar()
+            self.category_id = db.session.query(Category.id)\
+                                         .order_by(Category.published_post_count.desc()).limit(1).scalar()
+            self.tag_id = db.session.query(Tag.id).order_by(Tag.published_post_count.desc()).limit(1).scalar()
+            self.search_term = 'python'
+
+    def url_arguments(self, endpoint):
+        """Values for a route's URL arguments"""
+        post_id = self.own_post_id if endpoint == 'blog.edit_post' else self.post_id
+        return {'id': post_id, 'post_id': post_id, 'category_id': self.category_id,
+                'tag_id': self.tag_id, 'user_id': self.user_id}
+
+
+def get_scenarios(app, fixtures):
+    """
+    (name, client kind, method, url, form data or form factory) for every route
+    GET routes come from the URL map; POST routes use representative forms.
+    """
+    scenarios = []
+    with app.test_request_context():
+        from flask import url_for
+
+        for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+            if rule.endpoint.split('.')[0] not in BLUEPRINTS or rule.endpoint in SKIPPED_ENDPOINTS:
+                continue
+            if 'GET' not in rule.methods:
+                continue
+            arguments = {name: value for name, value in fixtures.url_arguments(rule.endpoint).items()
+                         if name in rule.arguments}
+            url = url_for(rule.endpoint, **arguments)
+            if rule.endpoint == 'main.search':
+                url = url_for(rule.endpoint, query=fixtures.search_term)
+            if rule.endpoint in ANONYMOUS_ENDPOINTS:
+                scenarios.append((f'GET {rule.rule}', 'anonymous', 'GET', url, None))
+                continue
+            scenarios.append((f'GET {rule.rule}', 'user', 'GET', url, None))
+            if rule.endpoint in PUBLIC_ENDPOINTS:
+                scenarios.append((f'GET {rule.rule} (anonymous)', 'anonymous', 'GET', url, None))
+
+        post_id, own_post_id = fixtures.post_id, fixtures.own_post_id
+        counter = iter(range(1, 10 ** 9))
+
+        def registration():
+            number = next(counter)
+            return {'username': f'bench{number:07d}', 'email': f'bench{number}@example.com',
+                    'first_name': 'Bench', 'last_name': 'Mark', 'password': 'benchmark', 'password2': 'benchmark'}
+
+        scenarios += [
+            ('POST /auth/login', 'fresh', 'POST', url_for('auth.login'),
+             lambda: {'username': fixtures.username, 'password': 'benchmark'}),
+            ('POST /auth/register', 'fresh', 'POST', url_for('auth.register'), registration),
+            ('POST /toggle_favorite/<int:post_id>', 'user', 'POST',
+             url_for('main.toggle_favorite', post_id=post_id), None),
+            ('POST /blog/post/<int:id>/comment', 'user', 'POST', url_for('blog.add_comment', id=post_id),
+             lambda: {'content': 'Benchmark comment with enough characters.'}),
+            ('POST /blog/create', 'user', 'POST', url_for('blog.create_post'),
+             lambda: {'title': 'Benchmark post', 'content': 'Benchmark post body about python and flask. ' * 20,
+                      'category_id': fixtures.category_id, 'tags': 'benchmark, python', 'published': 'y'}),
+            ('POST /blog/post/<int:id>/edit', 'user', 'POST', url_for('blog.edit_post', id=own_post_id),
+             lambda: {'title': 'Benchmark edit', 'content': 'Edited benchmark post body about flask. ' * 20,
+                      'category_id': fixtures.category_id, 'tags': 'benchmark', 'published': 'y'}),
+            # A fresh question each time so the answer cache doesn't hide retrieval
+            ('POST /chatbot/chat', 'user', 'POST', url_for('chatbot.chat'),
+             lambda: {'message': f'find posts about {fixtures.search_term} {next(counter)}'}),
+            ('POST /auth/edit_profile', 'user', 'POST', url_for('auth.edit_profile'),
+             lambda: {'first_name': 'Bench', 'last_name': 'Mark', 'email': f'{fixtures.username}@example.com',
+                      'bio': 'Benchmark profile'}),
+        ]
+    return scenarios
+
+
+def run_route(app, clients, scenario, iterations, warmup):
+    """Time one scenario; returns its result dict"""
+    from sqlalchemy import event
+    from models import db
+
+    name, kind, method, url, form = scenario
+    queries = [0]
+    main_thread = threading.get_ident()
+
+    def count(*args):
+        # Background flushes (view counter, sentiment) don't belong to the request
+        if threading.get_ident() == main_thread:
+            queries[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+
+    latencies, per_request, statuses = [], [], set()
+    has_window = reset_peak_rss()
+    try:
+        for i in range(warmup + iterations):
+            client = clients['user'] if kind == 'user' else \
+                clients['anonymous'] if kind == 'anonymous' else app.test_client()
+            data = form() if callable(form) else form
+            queries[0] = 0
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            elapsed = (time.perf_counter() - started) * 1000
+            if i >= warmup:
+                latencies.append(elapsed)
+                per_request.append(queries[0])
+                statuses.add(response.status_code)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    return {
+        'p50': round(percentile(latencies, 0.50), 2),
+        'p95': round(percentile(latencies, 0.95), 2),
+        'p99': round(percentile(latencies, 0.99), 2),
+        'queries': statistics.median(per_request) if per_request else 0,
+        'peak_rss_mb': round(peak_rss_mb(), 1) if has_window else None,
+        'status': sorted(statuses),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Regression messages for results that got worse than the baseline"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('routes', {}).get(name)
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            regressions.append(f"{name}: queries {before['queries']} -> {result['queries']}")
+        if result['p95'] > before['p95'] * (1 + threshold) and result['p95'] - before['p95'] > 1:
+            regressions.append(f"{name}: p95 {before['p95']:.1f} -> {result['p95']:.1f} ms")
+    return regressions
+
+
+def report(results, baseline):
+    """Print the results table, with deltas when a baseline is given"""
+    def delta(name, key, fmt):
+        before = baseline.get('routes', {}).get(name, {}).get(key) if baseline else None
+        value = results[name][key]
+        if before is None or value is None:
+            return ''
+        change = value - before
+        return f" ({'+' if change >= 0 else ''}{fmt.format(change)})" if change else ''
+
+    print(f"{'route':<44}{'p50 ms':>10}{'p95 ms':>18}{'p99 ms':>10}{'queries':>16}{'peak RSS MB':>14}  status")
+    for name, result in results.items():
+        rss = f"{result['peak_rss_mb']:.1f}" if result['peak_rss_mb'] is not None else '-'
+        p95 = f"{result['p95']:.1f}{delta(name, 'p95', '{:.1f}')}"
+        queries = f"{result['queries']:g}{delta(name, 'queries', '{:g}')}"
+        print(f"{name:<44}{result['p50']:>10.1f}{p95:>18}{result['p99']:>10.1f}{queries:>16}{rss:>14}  "
+              f"{','.join(map(str, result['status']))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', help='database URL with a generated corpus (default: scratch SQLite)')
+    parser.add_argument('--scale', default='small', help='corpus preset for the scratch database')
+    parser.add_argument('--iterations', type=int, default=20, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=2, help='untimed requests per route')
+    parser.add_argument('--only', help='run routes whose name contains this text')
+    parser.add_argument('--baseline', help='JSON results to diff against')
+    parser.add_argument('--save-baseline', help='write the results to this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='p95 slowdown reported as a regression')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 on regressions')
+    args = parser.parse_args()
+
+    scratch = None
+    if args.database:
+        os.environ['DATABASE_URL'] = args.database
+    else:
+        scratch = tempfile.mkdtemp(prefix='blog-routes-')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(scratch, 'routes.db')}"
+
+    try:
+        from app import create_app
+        from benchmarks.corpus import generate, PASSWORD
+
+        app = create_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        # Analyze and refresh related posts inline so create/edit timings
+        # include the work and nothing runs behind the numbers
+        app.config['SENTIMENT_WORKERS'] = 0
+        app.config['RELATED_WORKERS'] = 0
+        from sentiment_queue import sentiment_queue
+        from related_posts import related_queue
+        sentiment_queue.num_workers = 0
+        related_queue.num_workers = 0
+
+        if scratch:
+            generate(app, args.scale)
+
+        fixtures = Fixtures(app)
+        clients = {'user': app.test_client(), 'anonymous': app.test_client()}
+        clients['user'].post('/auth/login', data={'username': fixtures.username, 'password': PASSWORD})
+
+        results = {}
+        for scenario in get_scenarios(app, fixtures):
+            if args.only and args.only not in scenario[0]:
+                continue
+            results[scenario[0]] = run_route(app, clients, scenario, args.iterations, args.warmup)
+
+        baseline = None
+        if args.baseline and os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+
+        report(results, baseline)
+
+        if args.save_baseline:
+            with open(args.save_baseline, 'w') as f:
+                json.dump({'scale': args.scale if scratch else args.database, 'iterations': args.iterations,
+                           'routes': results}, f, indent=2, sort_keys=True)
+                f.write('\n')
+            print(f"Saved baseline to {args.save_baseline}")
+
+        if baseline:
+            regressions = compare(results, baseline, args.threshold)
+            for message in regressions:
+                print(f"REGRESSION {message}")
+            if not regressions:
+                print("No regressions against the baseline.")
+            if regressions and args.check:
+                raise SystemExit(1)
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
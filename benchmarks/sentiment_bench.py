@@ -0,0 +1,118 @@
+"""
+Sentiment Micro-Benchmark
+Compares the original list-scan fallback, the compiled lexicon engine and
+(when NLTK's lexicon is installed) VADER on long documents, after checking
+that negations, contractions included, flip the fallback engine's label.
+
+Usage: python -m benchmarks.sentiment_bench [--docs 200] [--words 5000]
+"""
+import argparse
+import random
+import time
+
+from ai_sentiment import SentimentAnalyzer, Lexicon
+
+
+def legacy_simple_score(text):
+    """The fallback analyzer as it was before the compiled lexicon (for comparison)"""
+    positive_words = [
+        'good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic',
+        'awesome', 'brilliant', 'outstanding', 'superb', 'magnificent',
+        'love', 'like', 'enjoy', 'happy', 'pleased', 'satisfied',
+        'beautiful', 'perfect', 'best', 'incredible', 'remarkable'
+    ]
+    negative_words = [
+        'bad', 'terrible', 'awful', 'horrible', 'disgusting', 'hate',
+        'dislike', 'angry', 'sad', 'disappointed', 'frustrated',
+        'worst', 'pathetic', 'useless', 'boring', 'annoying',
+        'difficult', 'problem', 'issue', 'wrong', 'error', 'fail'
+    ]
+    words = text.lower().split()
+    positive_count = sum(1 for word in words if word in positive_words)
+    negative_count = sum(1 for word in words if word in negative_words)
+    return (positive_count - negative_count) / max(len(words), 1)
+
+
+# (text, expected label) pairs the fallback engine must get right
+NEGATION_CASES = [
+    ("I don't like this at all", 'negative'),
+    ("I do not like this at all", 'negative'),
+    ("I don\u2019t like this at all", 'negative'),
+    ("It isn't bad, the trip was not boring", 'positive'),
+    ("This can't be good", 'negative'),
+]
+
+
+def check_negations(analyzer):
+    """Score the negation cases through the full analyzer path; returns the failures"""
+    failures = []
+    for text, expected in NEGATION_CASES:
+        label = analyzer._analyze_with_simple(analyzer.clean_text(text))['label']
+        if label != expected:
+            failures.append((text, expected, label))
+    return failures
+
+
+def make_corpus(docs, words, seed=42):
+    """Reproducible long documents mixing filler, sentiment words and punctuation"""
+    rng = random.Random(seed)
+    lexicon = Lexicon.default()
+    vocabulary = ['the', 'a', 'trip', 'post', 'code', 'food', 'city', 'and', 'was', 'it',
+                  'very', 'not', 'really', 'today', 'we', 'our', 'team', 'blog']
+    sentiment = list(lexicon.weights)
+    corpus = []
+    for _ in range(docs):
+        tokens = []
+        for _ in range(words):
+            token = rng.choice(sentiment) if rng.random() < 0.08 else rng.choice(vocabulary)
+            if rng.random() < 0.05:
+                token += rng.choice('.!,?')
+            tokens.append(token)
+        corpus.append(' '.join(tokens))
+    return corpus
+
+
+def time_engine(name, score, corpus):
+    """Run one engine over the corpus and print its throughput"""
+    started = time.perf_counter()
+    for document in corpus:
+        score(document)
+    elapsed = time.perf_counter() - started
+    total_words = sum(len(document.split()) for document in corpus)
+    print(f"{name:<18} {elapsed * 1000 / len(corpus):9.3f} ms/doc "
+          f"{len(corpus) / elapsed:10.1f} docs/s {total_words / elapsed / 1e6:8.2f} Mwords/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, default=200, help='number of documents')
+    parser.add_argument('--words', type=int, default=5000, help='words per document')
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.docs, args.words)
+    print(f"{args.docs} documents x {args.words} words")
+
+    analyzer = SentimentAnalyzer(cache_size=0)
+    failures = check_negations(analyzer)
+    for text, expected, label in failures:
+        print(f"negation check failed: {text!r} scored {label}, expected {expected}")
+    print(f"negation checks: {len(NEGATION_CASES) - len(failures)}/{len(NEGATION_CASES)} passed")
+
+    baseline = time_engine('legacy list scan', legacy_simple_score, corpus)
+    compiled = time_engine('compiled lexicon', analyzer.lexicon.score, corpus)
+    print(f"compiled lexicon speedup: {baseline / compiled:.1f}x")
+
+    # The engine is picked lazily; load it so use_vader is meaningful
+    analyzer.load_engine()
+    if analyzer.use_vader and analyzer.analyzer:
+        time_engine('vader', analyzer.analyzer.polarity_scores, corpus)
+    else:
+        print("vader              skipped (NLTK / vader_lexicon not installed)")
+
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Startup Benchmark
+Boots the app in fresh interpreters against a scratch database and reports
+import time, create_app() time, first- and second-request latency, queries
+issued during boot and whether NLTK or NumPy were imported, for each
+STARTUP_MODE.
+
+Usage: python -m benchmarks.startup [--runs 5] [--modes auto,fast]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Runs in a fresh interpreter so nothing is imported or cached beforehand
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+queries = {'boot': 0}
+event.listen(Engine, 'before_cursor_execute', lambda *args: queries.__setitem__('boot', queries['boot'] + 1))
+
+application = app_module.create_app()
+created = time.perf_counter()
+boot_queries = queries['boot']
+client = application.test_client()
+first = time.perf_counter()
+status = client.get('/').status_code
+first_done = time.perf_counter()
+client.get('/')
+second_done = time.perf_counter()
+
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first_done - first) * 1000,
+    'second_request_ms': (second_done - first_done) * 1000,
+    'boot_queries': boot_queries,
+    'status': status,
+    'nltk': 'nltk' in sys.modules,
+    'numpy': 'numpy' in sys.modules,
+}))
+'''
+
+METRICS = ['import_ms', 'create_app_ms', 'first_request_ms', 'second_request_ms']
+
+
+def probe(env):
+    """One cold boot; returns the probe's measurements"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', PROBE], cwd=root, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='cold boots per mode')
+    parser.add_argument('--modes', default='auto,fast', help='comma-separated STARTUP_MODE values')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='blog-startup-')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(scratch, 'startup.db')}",
+               SENTIMENT_NLTK_DOWNLOAD='0')
+    try:
+        # Prepare the schema once, as `flask init-db` would before a deploy
+        probe(dict(env, STARTUP_MODE='auto'))
+
+        print(f"median of {args.runs} cold boots")
+        print(f"{'mode':<8}" + ''.join(f'{name:>20}' for name in METRICS) +
+              f"{'boot queries':>14}{'nltk':>6}{'numpy':>7}")
+        for mode in args.modes.split(','):
+            runs = [probe(dict(env, STARTUP_MODE=mode)) for _ in range(args.runs)]
+            medians = [statistics.median(run[name] for run in runs) for name in METRICS]
+            last = runs[-1]
+            note = '' if last['status'] == 200 else f"  (HTTP {last['status']})"
+            print(f"{mode:<8}" + ''.join(f'{value:>17.1f} ms' for value in medians) +
+                  f"{last['boot_queries']:>14d}{'yes' if last['nltk'] else 'no':>6}"
+                  f"{'yes' if last['numpy'] else 'no':>7}{note}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
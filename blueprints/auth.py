@@ -7,6 +7,9 @@ from flask_login import login_user, logout_user, login_required, current_user
 from models import User, BlogPost, Favorite, db, Comment
 from forms import RegistrationForm, LoginForm, EditProfileForm
 from utils import FileHandler
+from fragment_cache import fragment_cache
+from user_stats import UserStatsRollup
+from query_options import query_options
 from sqlalchemy import desc
 
 auth_bp = Blueprint('auth', __name__)
@@ -116,6 +119,7 @@ def profile(user_id=None):
         recent_posts = []
         try:
             recent_posts = BlogPost.query.filter_by(user_id=user_id, published=True)\
+                                         .options(*query_options.post_cards())\
                                          .order_by(desc(BlogPost.created_at))\
                                          .limit(5).all()
         except Exception as e:
@@ -125,12 +129,15 @@ def profile(user_id=None):
         favorite_posts = []
         if current_user.is_authenticated and current_user.id == user_id:
             try:
-                favorites = Favorite.query.filter_by(user_id=user_id).limit(5).all()
-                favorite_posts = [fav.post for fav in favorites if fav.post]
+                favorite_posts = BlogPost.query.join(Favorite, Favorite.post_id == BlogPost.id)\
+                                               .filter(Favorite.user_id == user_id)\
+                                               .options(*query_options.post_cards())\
+                                               .order_by(desc(Favorite.created_at))\
+                                               .limit(5).all()
             except Exception as e:
                 print(f"Error getting favorite posts: {e}")
 
-        # User statistics
+        # User statistics from the maintained rollup (one primary-key lookup)
         stats = {
             'total_posts': 0,
             'total_favorites': 0,
@@ -138,22 +145,13 @@ def profile(user_id=None):
         }
 
         try:
-            # Count published posts
-            stats['total_posts'] = BlogPost.query.filter_by(user_id=user_id, published=True).count()
-        except:
-            pass
-
-        try:
-            # Count favorites
-            stats['total_favorites'] = Favorite.query.filter_by(user_id=user_id).count()
-        except:
-            pass
-
-        try:
-            # Count comments
-            stats['total_comments'] = Comment.query.filter_by(user_id=user_id).count()
-        except:
-            pass
+            rollup = UserStatsRollup.get(user_id)
+            if rollup:
+                stats = rollup.to_dict()
+                # The public profile counts published posts only
+                stats['total_posts'] = rollup.published_post_count
+        except Exception as e:
+            print(f"Error getting user stats: {e}")
 
         return render_template('auth/profile.html',
                              user=user,
@@ -195,6 +193,7 @@ def edit_profile():
                         flash('Error uploading image. Profile updated without image.', 'warning')
 
                 db.session.commit()
+                fragment_cache.bump(f'user:{current_user.id}')
                 flash('Your profile has been updated successfully!', 'success')
                 return redirect(url_for('auth.profile', user_id=current_user.id))
 
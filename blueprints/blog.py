@@ -2,13 +2,22 @@
 Blog Blueprint
 Handles blog post creation, editing, viewing, and commenting
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify, session, current_app
 from flask_login import login_required, current_user
 from models import BlogPost, Comment, Tag, Category, db
 from forms import BlogPostForm, CommentForm
 from utils import FileHandler, TextProcessor, DatabaseHelper
 from ai_sentiment import sentiment_analyzer
-from sqlalchemy import desc
+from search_index import search_index
+from post_counters import PostCounters
+from user_stats import UserStatsRollup
+from related_posts import related_index, related_queue
+from sentiment_queue import sentiment_queue
+from fragment_cache import fragment_cache, Lazy
+from conditional_get import conditional_get
+from query_options import query_options
+from view_counter import view_counter
+from keyset_pagination import paginate_posts, paginate_comments, InvalidCursor, SORTS
 
 blog_bp = Blueprint('blog', __name__)
 
@@ -39,17 +48,13 @@ def create_post():
                 if picture_file:
                     post.featured_image = picture_file
 
-            # AI Sentiment Analysis
-            combined_text = f"{post.title} {post.content}"
-            sentiment_result = sentiment_analyzer.analyze_sentiment(combined_text)
-
-            post.sentiment_score = sentiment_result['score']
-            post.sentiment_label = sentiment_result['label']
-            post.sentiment_confidence = sentiment_result['confidence']
-
             db.session.add(post)
             db.session.flush()  # Get the post ID
 
+            # AI Sentiment Analysis and related posts run in the background
+            sentiment_queue.enqueue(post)
+            related_queue.enqueue(post)
+
             # Handle tags
             if form.tags.data:
                 tag_names = TextProcessor.extract_tags(form.tags.data)
@@ -57,12 +62,19 @@ def create_post():
                     tag = DatabaseHelper.get_or_create_tag(tag_name)
                     post.tags.append(tag)
 
+            # Keep the full-text index and post counters in sync
+            search_index.index_post(post)
+            db.session.flush()
+            snapshot = PostCounters.snapshot(post)
+            PostCounters.apply(None, snapshot)
+            UserStatsRollup.apply_post(None, snapshot)
+
             db.session.commit()
+            fragment_cache.bump_post(post)
+            related_queue.submit(post.id)
 
-            # Show sentiment insights
-            insights = sentiment_analyzer.get_sentiment_insights(sentiment_result)
-            for insight in insights:
-                flash(f"AI Insight: {insight}", 'info')
+            # Sentiment insights are flashed on the post page once ready
+            sentiment_queue.submit(post.id)
 
             flash('Your blog post has been created successfully!', 'success')
             return redirect(url_for('blog.view_post', id=post.id))
@@ -77,24 +89,41 @@ def create_post():
 @blog_bp.route('/post/<int:id>')
 def view_post(id):
     """View a single blog post"""
-    post = BlogPost.query.get_or_404(id)
+    # Revalidate a repeat visit before loading comments or rendering anything
+    validators = conditional_get.post_validators(id)
+    if validators is None:
+        abort(404)
+    awaiting_insights = str(id) in session.get('sentiment_pending', {})
+    if not awaiting_insights:
+        not_modified = conditional_get.not_modified(validators)
+        if not_modified is not None:
+            view_counter.increment(id)
+            return not_modified
+
+    post = BlogPost.query.options(*query_options.post_detail()).get_or_404(id)
 
     # Increment view count
     post.increment_views()
 
-    # Get comments
-    comments = Comment.query.filter_by(post_id=id, approved=True)\
-                           .order_by(desc(Comment.created_at)).all()
+    # First page of comments; older ones load through post_comments
+    try:
+        comments = _comment_page(id, request.args.get('comments'))
+    except InvalidCursor:
+        comments = _comment_page(id, None)
 
     # Comment form for authenticated users
     comment_form = CommentForm() if current_user.is_authenticated else None
 
-    # Related posts (same category or tags)
-    related_posts = []
-    if post.category:
-        related_posts = BlogPost.query.filter_by(category_id=post.category_id, published=True)\
-                                     .filter(BlogPost.id != post.id)\
-                                     .limit(3).all()
+    # Precomputed related posts and the category sidebar only run their
+    # queries when the template's cached fragments miss
+    related_posts = Lazy(lambda: related_index.for_post(post.id, limit=3))
+    categories = Lazy(lambda: Category.query.order_by(Category.name).all())
+
+    # Insights for a post this user just created or edited
+    try:
+        sentiment_queue.flash_ready_insights(post)
+    except Exception as e:
+        print(f"Error flashing sentiment insights: {e}")
 
     # AI sentiment insights
     sentiment_insights = None
@@ -106,12 +135,15 @@ def view_post(id):
         }
         sentiment_insights = sentiment_analyzer.get_sentiment_insights(sentiment_data)
 
-    return render_template('blog/view_post.html',
-                         post=post,
-                         comments=comments,
-                         comment_form=comment_form,
-                         related_posts=related_posts,
-                         sentiment_insights=sentiment_insights)
+    cacheable = conditional_get.cacheable() and not awaiting_insights
+    response = render_template('blog/view_post.html',
+                               post=post,
+                               comments=comments,
+                               comment_form=comment_form,
+                               related_posts=related_posts,
+                               categories=categories,
+                               sentiment_insights=sentiment_insights)
+    return conditional_get.apply(response, validators if cacheable else None)
 
 @blog_bp.route('/post/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -128,6 +160,9 @@ def edit_post(id):
 
         if form.validate_on_submit():
             try:
+                counters_before = PostCounters.snapshot(post)
+                text_before = (post.title, post.content)
+
                 # Update post fields
                 post.title = form.title.data
                 post.content = form.content.data
@@ -150,13 +185,11 @@ def edit_post(id):
                     if picture_file:
                         post.featured_image = picture_file
 
-                # Re-analyze sentiment with updated content
-                combined_text = f"{post.title} {post.content}"
-                sentiment_result = sentiment_analyzer.analyze_sentiment(combined_text)
-
-                post.sentiment_score = sentiment_result['score']
-                post.sentiment_label = sentiment_result['label']
-                post.sentiment_confidence = sentiment_result['confidence']
+                # Re-analyze sentiment in the background, only if the text changed
+                text_changed = (post.title, post.content) != text_before or post.sentiment_score is None
+                if text_changed:
+                    sentiment_queue.enqueue(post)
+                related_queue.enqueue(post)
 
                 # Update tags safely
                 try:
@@ -170,15 +203,24 @@ def edit_post(id):
                 except Exception as e:
                     print(f"Error updating tags: {e}")
 
+                # A tag-only edit leaves the row untouched; every save is a new page version
+                post.version = BlogPost.version + 1
+
+                # Keep the full-text index and post counters in sync
+                search_index.index_post(post)
+                db.session.flush()
+                counters_after = PostCounters.snapshot(post)
+                PostCounters.apply(counters_before, counters_after)
+                UserStatsRollup.apply_post(counters_before, counters_after)
+
                 db.session.commit()
+                fragment_cache.bump_post(post)
+                fragment_cache.bump(f"category:{counters_before['category_id']}")
+                related_queue.submit(post.id)
 
-                # Show updated sentiment insights
-                try:
-                    insights = sentiment_analyzer.get_sentiment_insights(sentiment_result)
-                    for insight in insights:
-                        flash(f"Updated AI Insight: {insight}", 'info')
-                except Exception as e:
-                    print(f"Error getting sentiment insights: {e}")
+                # Updated sentiment insights are flashed on the post page once ready
+                if text_changed:
+                    sentiment_queue.submit(post.id, insight_prefix='Updated AI Insight')
 
                 flash('Your blog post has been updated successfully!', 'success')
                 return redirect(url_for('blog.view_post', id=post.id))
@@ -230,8 +272,20 @@ def delete_post(id):
         if post.featured_image:
             FileHandler.delete_picture(post.featured_image, 'posts')
 
+        search_index.remove_post(post.id)
+        snapshot = PostCounters.snapshot(post)
+        PostCounters.apply(snapshot, None)
+        activity = UserStatsRollup.post_activity(post)
+        containing = related_index.remove_post(post.id)
+        conditional_get.touch_posts(containing)
+        stale_fragments = (f'post:{post.id}', f'category:{post.category_id}', 'categories', 'tags', 'posts',
+                           *(f'post:{other_id}' for other_id in containing))
         db.session.delete(post)
+        db.session.flush()
+        UserStatsRollup.apply_post(snapshot, None)
+        UserStatsRollup.forget_post_activity(activity)
         db.session.commit()
+        fragment_cache.bump(*stale_fragments)
 
         flash('Your blog post has been deleted successfully.', 'success')
         return redirect(url_for('main.dashboard'))
@@ -258,7 +312,11 @@ def add_comment(id):
             )
 
             db.session.add(comment)
+            db.session.flush()
+            PostCounters.adjust_comments(id, 1)
+            UserStatsRollup.adjust(current_user.id, comment_count=1)
             db.session.commit()
+            fragment_cache.bump(f'post:{id}')
 
             flash('Your comment has been added successfully!', 'success')
         except Exception as e:
@@ -272,53 +330,125 @@ def add_comment(id):
 
     return redirect(url_for('blog.view_post', id=id))
 
+def _comment_page(post_id, cursor):
+    """Keyset page of a post's approved comments, newest first"""
+    query = Comment.query.filter_by(post_id=post_id, approved=True).options(*query_options.comment_thread())
+    return paginate_comments(query, cursor=cursor, per_page=current_app.config.get('COMMENTS_PER_PAGE', 20))
+
+@blog_bp.route('/post/<int:id>/comments')
+def post_comments(id):
+    """JSON page of older comments for the view_post thread"""
+    validators = conditional_get.post_validators(id)
+    if validators is None:
+        abort(404)
+    not_modified = conditional_get.not_modified(validators)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        comments = _comment_page(id, request.args.get('cursor'))
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    return conditional_get.apply(jsonify({
+        'comments': [{
+            'id': comment.id,
+            'content': comment.content,
+            'created_at': comment.created_at.isoformat() if comment.created_at else None,
+            'author': comment.author.get_full_name()
+        } for comment in comments.items],
+        'comments_html': render_template('blog/_comments.html', comments=comments.items),
+        'next_cursor': comments.next_cursor
+    }), validators)
+
+def _listing_page(sort_by, category_id, cursor, per_page=12, with_tags=False):
+    """Keyset page of published posts for the all posts listing and its API"""
+    query = BlogPost.query.filter_by(published=True).options(*query_options.post_cards(with_tags=with_tags))
+    if category_id > 0:
+        query = query.filter_by(category_id=category_id)
+    return paginate_posts(query, sort=sort_by, cursor=cursor, per_page=per_page,
+                          count_key=('published', category_id))
+
+def _listing_validators(sort_by):
+    """Conditional GET validators for a listing, or None when its order can't be versioned"""
+    # View counts move constantly without touching updated_at
+    if sort_by == 'popular':
+        return None
+    return conditional_get.listing_validators()
+
 @blog_bp.route('/posts')
 def all_posts():
-    """View all published blog posts with pagination"""
-    page = request.args.get('page', 1, type=int)
+    """View all published blog posts with cursor pagination"""
     category_id = request.args.get('category', 0, type=int)
     sort_by = request.args.get('sort', 'newest')
+    if sort_by not in SORTS:
+        sort_by = 'newest'
 
-    # Base query
-    query = BlogPost.query.filter_by(published=True)
-
-    # Category filter
-    if category_id > 0:
-        query = query.filter_by(category_id=category_id)
+    validators = _listing_validators(sort_by)
+    not_modified = conditional_get.not_modified(validators)
+    if not_modified is not None:
+        return not_modified
 
-    # Sorting
-    if sort_by == 'oldest':
-        query = query.order_by(BlogPost.created_at.asc())
-    elif sort_by == 'popular':
-        query = query.order_by(desc(BlogPost.views))
-    elif sort_by == 'positive':
-        query = query.filter(BlogPost.sentiment_label == 'positive')\
-                    .order_by(desc(BlogPost.sentiment_score))
-    elif sort_by == 'negative':
-        query = query.filter(BlogPost.sentiment_label == 'negative')\
-                    .order_by(BlogPost.sentiment_score.asc())
-    else:  # newest
-        query = query.order_by(desc(BlogPost.created_at))
-
-    posts = query.paginate(page=page, per_page=12, error_out=False)
+    try:
+        posts = _listing_page(sort_by, category_id, request.args.get('cursor'))
+    except InvalidCursor:
+        return redirect(url_for('blog.all_posts', category=category_id, sort=sort_by))
 
     # Get categories for filter
     categories = Category.query.all()
 
-    return render_template('blog/all_posts.html',
-                         posts=posts,
-                         categories=categories,
-                         current_category=category_id,
-                         current_sort=sort_by)
+    cacheable = conditional_get.cacheable()
+    response = render_template('blog/all_posts.html',
+                               posts=posts,
+                               categories=categories,
+                               current_category=category_id,
+                               current_sort=sort_by)
+    return conditional_get.apply(response, validators if cacheable else None)
+
+@blog_bp.route('/api/posts')
+def api_posts():
+    """JSON page of published posts for infinite scroll"""
+    category_id = request.args.get('category', 0, type=int)
+    sort_by = request.args.get('sort', 'newest')
+    if sort_by not in SORTS:
+        sort_by = 'newest'
+    per_page = min(max(request.args.get('limit', 12, type=int), 1), 50)
+
+    validators = _listing_validators(sort_by)
+    not_modified = conditional_get.not_modified(validators)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        posts = _listing_page(sort_by, category_id, request.args.get('cursor'), per_page, with_tags=True)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    return conditional_get.apply(jsonify({
+        'posts': [{
+            'id': post.id,
+            'title': post.title,
+            'url': url_for('blog.view_post', id=post.id),
+            'created_at': post.created_at.isoformat() if post.created_at else None,
+            'views': post.views,
+            'sentiment_label': post.sentiment_label,
+            'tags': [tag.name for tag in post.tags]
+        } for post in posts.items],
+        'posts_html': render_template('blog/_post_cards.html', posts=posts.items),
+        'next_cursor': posts.next_cursor,
+        'prev_cursor': posts.prev_cursor,
+        'total': posts.total
+    }), validators)
 
 @blog_bp.route('/my_posts')
 @login_required
 def my_posts():
     """View current user's blog posts"""
-    page = request.args.get('page', 1, type=int)
-
-    posts = BlogPost.query.filter_by(user_id=current_user.id)\
-                          .order_by(desc(BlogPost.created_at))\
-                          .paginate(page=page, per_page=10, error_out=False)
+    try:
+        posts = paginate_posts(BlogPost.query.filter_by(user_id=current_user.id)
+                                             .options(*query_options.post_cards()),
+                               cursor=request.args.get('cursor'), per_page=10)
+    except InvalidCursor:
+        return redirect(url_for('blog.my_posts'))
 
     return render_template('blog/my_posts.html', posts=posts)
@@ -4,8 +4,15 @@ Handles home page, dashboard, search, and general site functionality
 """
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from models import BlogPost, Category, Tag, User, Favorite, Comment, db
-from sqlalchemy import or_, desc, func
+from models import BlogPost, Category, Tag, User, Favorite, Comment, db, post_tags
+from sqlalchemy import desc, func
+from search_index import search_index
+from favorite_loader import favorite_loader
+from keyset_pagination import paginate_posts, InvalidCursor
+from fragment_cache import Lazy
+from conditional_get import conditional_get
+from query_options import query_options
+from user_stats import UserStatsRollup
 
 main_bp = Blueprint('main', __name__)
 
@@ -17,6 +24,7 @@ def index():
         featured_posts = []
         try:
             featured_posts = BlogPost.query.filter_by(published=True)\
+                                          .options(*query_options.post_cards())\
                                           .order_by(desc(BlogPost.views))\
                                           .limit(6).all()
         except Exception as e:
@@ -24,6 +32,7 @@ def index():
             # Fallback to recent posts
             try:
                 featured_posts = BlogPost.query.filter_by(published=True)\
+                                              .options(*query_options.post_cards())\
                                               .order_by(desc(BlogPost.created_at))\
                                               .limit(6).all()
             except:
@@ -33,71 +42,34 @@ def index():
         recent_posts = []
         try:
             recent_posts = BlogPost.query.filter_by(published=True)\
+                                         .options(*query_options.post_cards())\
                                          .order_by(desc(BlogPost.created_at))\
                                          .limit(4).all()
         except Exception as e:
             print(f"Error getting recent posts: {e}")
             recent_posts = []
 
-        # Get categories - simplified
-        categories = []
-        try:
-            all_categories = Category.query.all()
-            for category in all_categories:
-                try:
-                    post_count = BlogPost.query.filter_by(category_id=category.id, published=True).count()
-                    categories.append((category, post_count))
-                except:
-                    categories.append((category, 0))
-        except Exception as e:
-            print(f"Error getting categories: {e}")
-            categories = []
-
-        # Get popular tags - simplified
-        popular_tags = []
-        try:
-            all_tags = Tag.query.all()
-            tag_counts = []
-            for tag in all_tags:
-                try:
-                    # Count posts for this tag
-                    post_count = 0
-                    for post in tag.posts:
-                        if post.published:
-                            post_count += 1
-                    if post_count > 0:
-                        tag_counts.append((tag, post_count))
-                except:
-                    pass
-
-            # Sort by count and take top 10
-            tag_counts.sort(key=lambda x: x[1], reverse=True)
-            popular_tags = tag_counts[:10]
-        except Exception as e:
-            print(f"Error getting popular tags: {e}")
-            popular_tags = []
+        # Sidebars are deferred: the template only runs these queries when
+        # its cached category / tag fragments are stale
+        categories = Lazy(lambda: [
+            (category, category.published_post_count)
+            for category in Category.query.order_by(desc(Category.published_post_count), Category.name)
+                                          .limit(10)
+        ])
+        popular_tags = Lazy(lambda: [
+            (tag, tag.published_post_count)
+            for tag in Tag.query.filter(Tag.published_post_count > 0)
+                                .order_by(desc(Tag.published_post_count))
+                                .limit(10)
+        ])
 
         # Get user stats if logged in
         user_stats = None
         if current_user.is_authenticated:
             try:
-                user_stats = {
-                    'total_posts': 0,
-                    'total_favorites': 0
-                }
-
-                # Count user's posts safely
-                try:
-                    user_stats['total_posts'] = BlogPost.query.filter_by(user_id=current_user.id).count()
-                except:
-                    user_stats['total_posts'] = 0
-
-                # Count user's favorites safely
-                try:
-                    user_stats['total_favorites'] = Favorite.query.filter_by(user_id=current_user.id).count()
-                except:
-                    user_stats['total_favorites'] = 0
-
+                # One primary-key lookup on the maintained rollup
+                rollup = UserStatsRollup.get(current_user.id)
+                user_stats = rollup.to_dict() if rollup else {'total_posts': 0, 'total_favorites': 0}
             except Exception as e:
                 print(f"Error getting user stats: {e}")
                 user_stats = {'total_posts': 0, 'total_favorites': 0}
@@ -132,6 +104,7 @@ def dashboard():
             'published_posts': 0,
             'total_views': 0,
             'total_favorites': 0,
+            'favorites_received': 0,
             'total_comments': 0
         }
 
@@ -140,18 +113,21 @@ def dashboard():
             flash('Please log in to access your dashboard.', 'warning')
             return redirect(url_for('auth.login'))
 
+        # Stats come from the maintained rollup (one primary-key lookup)
+        try:
+            rollup = UserStatsRollup.get(current_user.id)
+            if rollup:
+                stats = rollup.to_dict()
+        except Exception as e:
+            print(f"Error getting user stats: {e}")
+
         # Get user's posts with basic error handling
         try:
             user_posts = db.session.query(BlogPost)\
                                   .filter(BlogPost.user_id == current_user.id)\
+                                  .options(*query_options.post_cards())\
                                   .order_by(BlogPost.created_at.desc())\
                                   .limit(5).all()
-
-            # Calculate basic stats from user posts
-            if user_posts:
-                stats['total_posts'] = len(user_posts)
-                stats['published_posts'] = sum(1 for p in user_posts if p.published)
-                stats['total_views'] = sum(getattr(p, 'views', 0) or 0 for p in user_posts)
         except Exception as e:
             print(f"Error getting user posts: {e}")
             user_posts = []
@@ -161,6 +137,7 @@ def dashboard():
             recent_posts = db.session.query(BlogPost)\
                                     .filter(BlogPost.published == True)\
                                     .filter(BlogPost.user_id != current_user.id)\
+                                    .options(*query_options.post_cards())\
                                     .order_by(BlogPost.created_at.desc())\
                                     .limit(10).all()
         except Exception as e:
@@ -169,40 +146,18 @@ def dashboard():
 
         # Try to get favorites if table exists
         try:
-            # Check if Favorite table exists by trying a simple query
-            favorite_count = db.session.query(Favorite)\
-                                      .filter(Favorite.user_id == current_user.id)\
-                                      .count()
-            stats['total_favorites'] = favorite_count
-
-            # Get favorite posts
-            favorites = db.session.query(Favorite)\
-                                 .filter(Favorite.user_id == current_user.id)\
-                                 .limit(5).all()
-
-            for fav in favorites:
-                try:
-                    if hasattr(fav, 'post') and fav.post and getattr(fav.post, 'published', False):
-                        favorite_posts.append(fav.post)
-                except Exception as inner_e:
-                    print(f"Error processing favorite: {inner_e}")
-                    continue
+            # Published favorite posts, joined in SQL rather than loaded per favorite
+            favorite_posts = db.session.query(BlogPost)\
+                                      .join(Favorite, Favorite.post_id == BlogPost.id)\
+                                      .filter(Favorite.user_id == current_user.id, BlogPost.published == True)\
+                                      .options(*query_options.post_cards())\
+                                      .order_by(desc(Favorite.created_at))\
+                                      .limit(5).all()
 
         except Exception as e:
             print(f"Favorites table might not exist or has issues: {e}")
-            stats['total_favorites'] = 0
             favorite_posts = []
 
-        # Try to get comments count if table exists
-        try:
-            comment_count = db.session.query(Comment)\
-                                     .filter(Comment.user_id == current_user.id)\
-                                     .count()
-            stats['total_comments'] = comment_count
-        except Exception as e:
-            print(f"Comments table might not exist: {e}")
-            stats['total_comments'] = 0
-
         return render_template('main/dashboard.html',
                              user_posts=user_posts,
                              favorite_posts=favorite_posts,
@@ -219,6 +174,7 @@ def dashboard():
             'published_posts': 0,
             'total_views': 0,
             'total_favorites': 0,
+            'favorites_received': 0,
             'total_comments': 0
         }
 
@@ -230,11 +186,12 @@ def dashboard():
 
 @main_bp.route('/search')
 def search():
-    """Search functionality"""
+    """Search functionality backed by the full-text index"""
     try:
-        posts = []
+        posts = None
         query = request.args.get('query', '').strip()
         category_id = request.args.get('category', 0, type=int)
+        page = request.args.get('page', 1, type=int)
 
         # Get all categories for the form
         categories = []
@@ -245,40 +202,28 @@ def search():
 
         if query:
             try:
-                # Build search query
-                search_query = BlogPost.query.filter_by(published=True)
-
-                # Text search in title and content
-                search_query = search_query.filter(
-                    or_(
-                        BlogPost.title.contains(query),
-                        BlogPost.content.contains(query),
-                        BlogPost.summary.contains(query)
-                    )
-                )
+                # BM25-ranked, paginated results from the FTS index
+                posts = search_index.search(query, category_id=category_id, page=page)
 
-                # Category filter
-                if category_id > 0:
-                    search_query = search_query.filter_by(category_id=category_id)
-
-                posts = search_query.order_by(desc(BlogPost.created_at)).all()
-
-                flash(f'Found {len(posts)} posts for "{query}"', 'info')
+                if page == 1:
+                    flash(f'Found {posts.total} posts for "{query}"', 'info')
             except Exception as e:
                 print(f"Search query error: {e}")
                 flash('An error occurred during search.', 'danger')
-                posts = []
+                posts = None
 
         return render_template('main/search.html',
                              posts=posts,
                              query=query,
+                             current_category=category_id,
                              categories=categories)
     except Exception as e:
         print(f"Search error: {e}")
         flash('An error occurred during search.', 'danger')
         return render_template('main/search.html',
-                             posts=[],
+                             posts=None,
                              query='',
+                             current_category=0,
                              categories=[])
 
 @main_bp.route('/favorites')
@@ -288,53 +233,14 @@ def favorites():
     try:
         page = request.args.get('page', 1, type=int)
 
-        # Get user's favorites - simplified approach
-        favorite_posts = []
-        try:
-            favorites = Favorite.query.filter_by(user_id=current_user.id)\
-                                     .order_by(desc(Favorite.created_at))\
-                                     .all()
-
-            for fav in favorites:
-                try:
-                    if fav.post and fav.post.published:
-                        favorite_posts.append(fav.post)
-                except:
-                    continue
-        except Exception as e:
-            print(f"Error getting favorites: {e}")
-            favorite_posts = []
+        # Join favorites to published posts and paginate in SQL
+        posts = BlogPost.query.join(Favorite, Favorite.post_id == BlogPost.id)\
+                              .filter(Favorite.user_id == current_user.id, BlogPost.published == True)\
+                              .options(*query_options.post_cards())\
+                              .order_by(desc(Favorite.created_at))\
+                              .paginate(page=page, per_page=10, error_out=False)
 
-        # Simple pagination simulation
-        per_page = 10
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated_posts = favorite_posts[start:end]
-
-        # Create a simple pagination object
-        class SimplePagination:
-            def __init__(self, items, page, per_page, total):
-                self.items = items
-                self.page = page
-                self.per_page = per_page
-                self.total = total
-                self.pages = (total + per_page - 1) // per_page
-                self.has_prev = page > 1
-                self.has_next = page < self.pages
-                self.prev_num = page - 1 if self.has_prev else None
-                self.next_num = page + 1 if self.has_next else None
-
-            def iter_pages(self, left_edge=2, right_edge=2, left_current=2, right_current=2):
-                last = self.pages
-                for num in range(1, last + 1):
-                    if num <= left_edge or \
-                       (self.page - left_current - 1 < num < self.page + right_current) or \
-                       num > last - right_edge:
-                        yield num
-
-        pagination = SimplePagination(paginated_posts, page, per_page, len(favorite_posts))
-
-        return render_template('main/favorites.html', posts=pagination)
+        return render_template('main/favorites.html', posts=posts)
     except Exception as e:
         print(f"Favorites error: {e}")
         flash('An error occurred loading your favorites.', 'danger')
@@ -362,7 +268,10 @@ def toggle_favorite(post_id):
             is_favorited = True
             message = 'Added to favorites'
 
+        db.session.flush()
+        UserStatsRollup.favorite_changed(current_user.id, post.user_id, 1 if is_favorited else -1)
         db.session.commit()
+        favorite_loader.forget(post_id)
 
         # Get updated favorite count
         favorite_count = Favorite.query.filter_by(post_id=post_id).count()
@@ -386,14 +295,25 @@ def toggle_favorite(post_id):
 def category_posts(category_id):
     """View posts by category"""
     try:
-        category = Category.query.get_or_404(category_id)
-        page = request.args.get('page', 1, type=int)
+        validators = conditional_get.listing_validators()
+        not_modified = conditional_get.not_modified(validators)
+        if not_modified is not None:
+            return not_modified
 
-        posts = BlogPost.query.filter_by(category_id=category_id, published=True)\
-                              .order_by(desc(BlogPost.created_at))\
-                              .paginate(page=page, per_page=12, error_out=False)
+        category = Category.query.get_or_404(category_id)
 
-        return render_template('main/category_posts.html', posts=posts, category=category)
+        try:
+            posts = paginate_posts(BlogPost.query.filter_by(category_id=category_id, published=True)
+                                                 .options(*query_options.post_cards()),
+                                   cursor=request.args.get('cursor'))
+        except InvalidCursor:
+            return redirect(url_for('main.category_posts', category_id=category_id))
+        # The maintained counter is exact, so no COUNT(*) is needed
+        posts.total = category.published_post_count
+
+        cacheable = conditional_get.cacheable()
+        response = render_template('main/category_posts.html', posts=posts, category=category)
+        return conditional_get.apply(response, validators if cacheable else None)
     except Exception as e:
         print(f"Category posts error: {e}")
         flash('Category not found.', 'danger')
@@ -403,25 +323,24 @@ def category_posts(category_id):
 def tag_posts(tag_id):
     """View posts by tag"""
     try:
+        validators = conditional_get.listing_validators()
+        not_modified = conditional_get.not_modified(validators)
+        if not_modified is not None:
+            return not_modified
+
         tag = Tag.query.get_or_404(tag_id)
         page = request.args.get('page', 1, type=int)
 
-        # Get posts with this tag
-        posts = []
-        for post in tag.posts:
-            if post.published:
-                posts.append(post)
-
-        # Sort by creation date
-        posts.sort(key=lambda x: x.created_at, reverse=True)
-
-        # Simple pagination
-        per_page = 12
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated_posts = posts[start:end]
+        # Published posts with this tag, newest first, paginated in SQL
+        posts = BlogPost.query.join(post_tags, post_tags.c.post_id == BlogPost.id)\
+                              .filter(post_tags.c.tag_id == tag_id, BlogPost.published == True)\
+                              .options(*query_options.post_cards())\
+                              .order_by(desc(BlogPost.created_at))\
+                              .paginate(page=page, per_page=12, error_out=False)
 
-        return render_template('main/tag_posts.html', posts=paginated_posts, tag=tag)
+        cacheable = conditional_get.cacheable()
+        response = render_template('main/tag_posts.html', posts=posts, tag=tag)
+        return conditional_get.apply(response, validators if cacheable else None)
     except Exception as e:
         print(f"Tag posts error: {e}")
         flash('Tag not found.', 'danger')
@@ -0,0 +1,260 @@
+"""
+Chatbot Engine Module
+Precompiled intent matching, post retrieval from the local search index and
+an LRU cache of answers, with a token stream for Server-Sent Events
+"""
+import re
+import zlib
+from flask import url_for
+from sqlalchemy import select, func, text, desc
+
+from fragment_cache import LRUBackend, fragment_cache
+from related_posts import STOP_WORDS
+
+
+# Intent name -> trigger words/phrases, in priority order (first match wins)
+INTENTS = [
+    ('find_posts', ['find', 'search for', 'look for', 'looking for', 'recommend', 'suggest', 'show me',
+                    'posts about', 'posts on', 'articles about', 'anything about', 'something about',
+                    'read about']),
+    ('sentiment', ['sentiment', 'emotion', 'emotions', 'feeling', 'feelings', 'mood', 'tone']),
+    ('favorites', ['favorite', 'favorites', 'favourite', 'like', 'save', 'bookmark', 'heart']),
+    ('tips', ['tip', 'tips', 'advice']),
+    ('writing', ['write', 'create', 'publish', 'draft', 'new post']),
+    ('search', ['search', 'discover', 'filter', 'browse']),
+    ('profile', ['profile', 'account', 'settings', 'bio', 'avatar', 'edit']),
+    ('ai', ['ai', 'artificial', 'intelligence', 'technology', 'work', 'works']),
+    ('help', ['help', 'support', 'question', 'how to', 'tutorial']),
+    ('greeting', ['hello', 'hi', 'hey', 'greetings']),
+]
+
+
+def _compile_intents(intents):
+    """One alternation with a named group per intent; phrases match across any whitespace"""
+    groups = []
+    for name, words in intents:
+        alternatives = '|'.join(r'\s+'.join(map(re.escape, word.split())) for word in words)
+        groups.append(f'(?P<{name}>{alternatives})')
+    return re.compile(r'\b(?:' + '|'.join(groups) + r')\b')
+
+
+# Compiled once at import
+INTENT_PATTERN = _compile_intents(INTENTS)
+INTENT_PRIORITY = {name: rank for rank, (name, _) in enumerate(INTENTS)}
+
+# Words that carry no topic in a question about posts
+QUERY_STOP_WORDS = STOP_WORDS | frozenset("""
+    post posts article articles blog blogs find search look looking recommend suggest show read
+    something anything any please want know tell give list some good interesting latest new
+    is me my we us it of on in to an or at be do so up as by if no
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9'+#-]*")
+STREAM_TOKEN_RE = re.compile(r'\S+\s*')
+
+RESPONSES = {
+    'sentiment': [
+        "Sentiment analysis helps understand the emotional tone of your writing. Positive posts tend to get more engagement!",
+        "Our AI analyzes the sentiment of each post - positive 😊, negative 😔, or neutral 😐. This helps readers find content that matches their mood.",
+        "Sentiment analysis can help you understand how your writing might be perceived. Would you like tips on writing more positive content?",
+    ],
+    'search': [
+        "You can search for posts using keywords, filter by category, or sort by popularity. Try the search page!",
+        "Use the filters on the All Posts page to find exactly what you're looking for - by category, sentiment, or popularity.",
+        "Looking for something specific? Ask me for posts about a topic, or use the search page to look through titles, summaries and content.",
+    ],
+    'favorites': [
+        "Click the heart icon ❤️ on any post to add it to your favorites! You can view them all from your dashboard.",
+        "Your favorites are saved in your profile. It's a great way to keep track of posts you want to read again!",
+        "Favoriting posts helps you build a personal collection of content you love. Check your favorites page!",
+    ],
+    'tips': [
+        "Writing tips: start with a strong, clear title, keep paragraphs short, add a compelling summary and a few relevant tags so readers can find your post.",
+        "Engage with other writers by commenting and favoriting their posts, and check the sentiment insights after publishing - positive posts tend to get more engagement.",
+    ],
+    'writing': [
+        "Ready to share your thoughts? Click 'Write New Post' to create a blog post. Our AI will analyze the sentiment!",
+        "When you create a post, our AI automatically analyzes its sentiment and provides insights to help improve engagement.",
+    ],
+    'profile': [
+        "You can edit your profile from the dashboard or by clicking your name in the navigation. Add a bio and profile picture!",
+        "Your profile shows your posts, stats, and favorites. Make it interesting with a good bio and profile picture!",
+    ],
+    'ai': [
+        "Our AI uses natural language processing to analyze the sentiment of blog posts and provide insights for better engagement.",
+        "The AI features include sentiment analysis, related-post recommendations, and this chatbot to help you navigate the platform!",
+    ],
+    'help': [
+        "I'm here to help! You can ask me about finding posts, understanding sentiment analysis, writing tips, or navigating the site.",
+        "Need help? I can guide you through creating posts, using favorites, searching content, or understanding AI features.",
+    ],
+    'greeting': [
+        "Hello! I'm your AI assistant. I can help you navigate the blog, find posts, or answer questions about our features!",
+        "Hi there! Ready to explore the blog? Ask me for posts about any topic, or how our AI features work.",
+    ],
+    'default': [
+        "I can help you with blog navigation, sentiment analysis, finding posts, or writing tips. Try asking for posts about a topic!",
+        "I'm here to help with anything blog-related! Try asking me about sentiment analysis, searching for posts, or creating content.",
+    ],
+}
+
+
+class ChatbotEngine:
+    """
+    Answers chatbot messages without external services
+
+    Intents come from one precompiled regex. Questions about a topic (and
+    messages no intent claims) retrieve published posts: BM25 over titles and
+    summaries in the FTS5 index, plus posts carrying a tag named in the
+    question. Answers are cached by normalized message and the 'posts'
+    fragment version, so post changes in this process invalidate them.
+    """
+
+    def __init__(self):
+        """Initialize the engine"""
+        self.max_posts = 3
+        self.cache = LRUBackend(max_entries=256, ttl=300)
+
+    def init_app(self, app):
+        """Read configuration"""
+        self.max_posts = app.config.get('CHATBOT_MAX_POSTS', 3)
+        self.cache = LRUBackend(max_entries=app.config.get('CHATBOT_CACHE_SIZE', 256),
+                                ttl=app.config.get('CHATBOT_CACHE_TTL', 300))
+
+    @staticmethod
+    def normalize(message):
+        """Lower-case and collapse a message so trivially different repeats share a cache entry"""
+        return ' '.join(TOKEN_RE.findall((message or '').lower()))
+
+    @staticmethod
+    def match_intent(message):
+        """Highest-priority intent named in a normalized message, or None"""
+        matched = {match.lastgroup for match in INTENT_PATTERN.finditer(message)}
+        return min(matched, key=INTENT_PRIORITY.get) if matched else None
+
+    @staticmethod
+    def topic_terms(message):
+        """Words of a normalized message that could name a topic"""
+        terms = []
+        for term in TOKEN_RE.findall(message):
+            if len(term) > 1 and term not in QUERY_STOP_WORDS and term not in terms:
+                terms.append(term)
+        return terms[:8]
+
+    @staticmethod
+    def _pick(intent, message):
+        """Stable choice among an intent's canned answers"""
+        options = RESPONSES.get(intent) or RESPONSES['default']
+        return options[zlib.crc32(message.encode('utf-8')) % len(options)]
+
+    def retrieve(self, terms):
+        """Published posts matching the terms: title/summary BM25 hits first, then tag matches"""
+        from models import db, BlogPost, Tag, post_tags
+        from search_index import search_index
+
+        if not terms:
+            return []
+
+        ids = []
+        if search_index.available:
+            # Prefix-match longer words only: "ai"* would match "airplane"
+            match = '{title summary} : (' + ' OR '.join(
+                f'"{term}"*' if len(term) > 3 else f'"{term}"' for term in terms) + ')'
+            try:
+                ids = [row[0] for row in db.session.execute(
+                    text(f"SELECT rowid FROM {search_index.TABLE_NAME} WHERE {search_index.TABLE_NAME} "
+                         f"MATCH :match ORDER BY {search_index.RANK_EXPRESSION} LIMIT :limit"),
+                    {'match': match, 'limit': self.max_posts}
+                )]
+            except Exception as e:
+                print(f"Error querying search index for chatbot: {e}")
+
+        if len(ids) < self.max_posts:
+            tagged = select(BlogPost.id)\
+                .join(post_tags, post_tags.c.post_id == BlogPost.id)\
+                .join(Tag, Tag.id == post_tags.c.tag_id)\
+                .where(func.ltrim(func.lower(Tag.name), '#').in_(terms), BlogPost.published == True)\
+                .order_by(desc(BlogPost.views), desc(BlogPost.id))\
+                .limit(self.max_posts * 2)
+            # The tag join yields a post once per matching tag; keep the first
+            ids = list(dict.fromkeys(ids + db.session.execute(tagged).scalars().all()))
+        ids = ids[:self.max_posts]
+        if not ids:
+            return []
+
+        rows = {row.id: row for row in db.session.execute(
+            select(BlogPost.id, BlogPost.title, BlogPost.summary)
+            .where(BlogPost.id.in_(ids), BlogPost.published == True)
+        )}
+        return [{'id': post_id, 'title': rows[post_id].title, 'summary': rows[post_id].summary or '',
+                 'url': url_for('blog.view_post', id=post_id)}
+                for post_id in ids if post_id in rows]
+
+    def _cache_key(self, message):
+        """Message plus the version of the post corpus its retrieval saw"""
+        try:
+            version = fragment_cache.backend.get_versions(['posts'])[0]
+        except Exception as e:
+            print(f"Error reading chatbot cache version: {e}")
+            version = 0
+        return f"chat|{version}|{message}"
+
+    def stream(self, message):
+        """
+        Yield ('token', text), ('posts', list) and finally ('done', info) events
+        The opening sentence streams before retrieval runs; a cached answer
+        streams straight from the cache.
+        """
+        message = self.normalize(message)
+        key = self._cache_key(message)
+        cached = self.cache.get(key)
+        if cached is not None:
+            for token in STREAM_TOKEN_RE.findall(cached['response']):
+                yield 'token', token
+            if cached['posts']:
+                yield 'posts', cached['posts']
+            yield 'done', {'intent': cached['intent'], 'cached': True}
+            return
+
+        intent = self.match_intent(message)
+        terms = self.topic_terms(message) if intent in ('find_posts', None) else []
+        parts = []
+
+        if intent == 'find_posts' and terms:
+            opening = f"Let me look through the blog for {' '.join(terms)}. "
+            parts.append(opening)
+            for token in STREAM_TOKEN_RE.findall(opening):
+                yield 'token', token
+
+        posts = self.retrieve(terms)
+        if posts:
+            closing = f"I found {len(posts)} post{'s' if len(posts) > 1 else ''} you might like: " + \
+                      '; '.join(post['title'] for post in posts) + '.'
+        elif intent == 'find_posts':
+            closing = "I couldn't find posts on that yet - try other keywords or browse the categories."
+        else:
+            closing = self._pick(intent, message)
+        parts.append(closing)
+        for token in STREAM_TOKEN_RE.findall(closing):
+            yield 'token', token
+        if posts:
+            yield 'posts', posts
+
+        self.cache.set(key, {'response': ''.join(parts), 'posts': posts, 'intent': intent or 'default'})
+        yield 'done', {'intent': intent or 'default', 'cached': False}
+
+    def answer(self, message):
+        """Whole answer at once: {'response', 'posts', 'intent', 'cached'}"""
+        tokens, posts, info = [], [], {}
+        for event, data in self.stream(message):
+            if event == 'token':
+                tokens.append(data)
+            elif event == 'posts':
+                posts = data
+            else:
+                info = data
+        return {'response': ''.join(tokens), 'posts': posts, **info}
+
+
+# Global instance
+chatbot_engine = ChatbotEngine()
@@ -0,0 +1,168 @@
+"""
+Conditional GET Module
+ETag / Last-Modified validators and early 304 responses for posts and listings
+"""
+import hashlib
+import time
+from datetime import timezone
+from flask import request, session, current_app, make_response
+from flask_login import current_user
+from sqlalchemy import select, update, func
+
+
+class ConditionalGet:
+    """
+    Cheap validators computed before a page's heavy queries
+
+    A view asks for its validators first; when the client's copy still
+    matches, it returns 304 Not Modified without loading or rendering
+    anything else. Otherwise the validators go on the full response.
+    """
+
+    def __init__(self):
+        """Initialize the helper"""
+        self.enabled = True
+
+    def init_app(self, app):
+        """Read configuration"""
+        self.enabled = app.config.get('CONDITIONAL_GET', True)
+
+    @staticmethod
+    def _etag(parts):
+        """Stable weak-comparison tag for a list of validator parts"""
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:24]
+
+    @staticmethod
+    def _viewer():
+        """Validator parts that depend on who is looking"""
+        from models import db, Favorite
+
+        if not current_user.is_authenticated:
+            return ['anonymous']
+
+        # Favorite hearts are per user; any toggle changes the count or the latest time
+        favorites, latest = db.session.execute(
+            select(func.count(Favorite.id), func.max(Favorite.created_at))
+            .where(Favorite.user_id == current_user.id)
+        ).one()
+        # Pages embed CSRF tokens, which expire; cached copies must age out first
+        token_window = current_app.config.get('WTF_CSRF_TIME_LIMIT') or 3600
+        return [current_user.id, favorites, latest, int(time.time() // (token_window / 2))]
+
+    @staticmethod
+    def touch_posts(post_ids, executor=None):
+        """
+        Move the validators of post pages that changed without an edit
+        (tags, related lists). updated_at is pinned, so listings and
+        Last-Modified are unaffected. Runs inside the caller's transaction.
+        """
+        from models import db, BlogPost
+
+        post_ids = sorted(set(post_ids))
+        for start in range(0, len(post_ids), 500):
+            (executor or db.session).execute(
+                update(BlogPost).where(BlogPost.id.in_(post_ids[start:start + 500]))
+                .values(version=BlogPost.version + 1, updated_at=BlogPost.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+
+    @staticmethod
+    def touch_all_posts():
+        """touch_posts for every post, after a bulk rebuild; commits"""
+        from models import db, BlogPost
+
+        db.session.execute(
+            update(BlogPost).values(version=BlogPost.version + 1, updated_at=BlogPost.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def post_validators(self, post_id):
+        """
+        (etag, last_modified) for a post page, or None if the post doesn't exist
+        One query: the post's updated_at, version and comment count, its
+        latest approved comment and favorite count, and the author and
+        category fields the page shows (profile edits don't touch posts).
+        """
+        from models import db, BlogPost, Comment, Favorite, User, Category
+
+        approved = (Comment.post_id == post_id, Comment.approved == True)
+        row = db.session.execute(
+            select(BlogPost.updated_at,
+                   select(func.max(Comment.created_at)).where(*approved).scalar_subquery(),
+                   BlogPost.version,
+                   BlogPost.comment_count,
+                   select(func.count(Favorite.id)).where(Favorite.post_id == post_id).scalar_subquery(),
+                   User.username, User.first_name, User.last_name, User.profile_image, User.bio,
+                   Category.name, Category.color)
+            .join(User, User.id == BlogPost.user_id)
+            .outerjoin(Category, Category.id == BlogPost.category_id)
+            .where(BlogPost.id == post_id)
+        ).first()
+        if row is None:
+            return None
+
+        updated_at, last_comment = row[:2]
+        stamps = [stamp for stamp in (updated_at, last_comment) if stamp]
+        last_modified = max(stamps) if stamps else None
+        parts = ['post', post_id, *row] + self._viewer()
+        return self._etag(parts), last_modified
+
+    def listing_validators(self):
+        """
+        (etag, last_modified) for a post listing at the current URL
+        Any edit, sentiment update or publish toggle moves the newest
+        updated_at; creates and deletes move the post count.
+        """
+        from models import db, BlogPost
+
+        # Counted from blog_post itself so the validator can't drift from the
+        # listing the way a denormalized counter could
+        newest, total = db.session.execute(
+            select(func.max(BlogPost.updated_at), func.count(BlogPost.id))
+        ).one()
+        parts = ['listing', request.full_path, newest, total] + self._viewer()
+        return self._etag(parts), newest
+
+    @staticmethod
+    def cacheable():
+        """Pages carrying one-off flash messages must not be revalidated later"""
+        return not session.get('_flashes')
+
+    def not_modified(self, validators):
+        """Return a 304 response when the client's copy is current, else None"""
+        if not self.enabled or validators is None or request.method != 'GET' or not self.cacheable():
+            return None
+
+        etag, last_modified = validators
+        if request.if_none_match:
+            fresh = request.if_none_match.contains_weak(etag)
+        elif request.if_modified_since and last_modified and not current_user.is_authenticated:
+            # Dates can't see per-user changes, so only anonymous copies use them
+            fresh = last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= request.if_modified_since
+        else:
+            fresh = False
+
+        if not fresh:
+            return None
+        return self.apply(current_app.response_class(status=304), validators)
+
+    def apply(self, response, validators):
+        """Attach validators to a full response so the next request can revalidate"""
+        response = make_response(response)
+        if not self.enabled or validators is None:
+            return response
+
+        etag, last_modified = validators
+        response.set_etag(etag, weak=True)
+        if last_modified:
+            response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+        # Always revalidate; personalised pages stay out of shared caches
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response
+
+
+# Global instance
+conditional_get = ConditionalGet()
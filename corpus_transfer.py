@@ -0,0 +1,384 @@
+"""
+Corpus Transfer Module
+Streams the blog corpus in and out as NDJSON, one record per line
+"""
+import gzip
+import json
+import time
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, update, func, text, DateTime
+from fragment_cache import fragment_cache
+
+# Bumped when the record layout changes incompatibly
+FORMAT_VERSION = 1
+
+# Record types in dependency order: every foreign key points at an earlier type
+RECORD_TYPES = ['user', 'category', 'tag', 'post', 'post_tag', 'comment', 'favorite']
+
+# Columns derived from other tables; rebuilt after an import instead of copied
+DERIVED_COLUMNS = {
+    'category': {'published_post_count'},
+    'tag': {'published_post_count'},
+    'post': {'comment_count'},
+}
+
+# Foreign key column -> record type it refers to
+FOREIGN_KEYS = {
+    'post': {'user_id': 'user', 'category_id': 'category'},
+    'post_tag': {'post_id': 'post', 'tag_id': 'tag'},
+    'comment': {'user_id': 'user', 'post_id': 'post'},
+    'favorite': {'user_id': 'user', 'post_id': 'post'},
+}
+
+
+def open_stream(path, mode):
+    """Open a path (or '-' for stdin/stdout) as text, gzip-compressed when it ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', compresslevel=6)
+    return click.open_file(path, mode, encoding='utf-8')
+
+
+def _encode(value):
+    """JSON fallback for column types json cannot write"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot export value of type {type(value).__name__}")
+
+
+class CorpusTransfer:
+    """
+    Bulk export and import of users, categories, tags, posts, comments and favorites
+
+    Export streams each table with yield_per and writes one JSON line per row,
+    so memory stays flat however large the corpus. Import reads line by line
+    and inserts with executemany in batches. Users, posts, comments and
+    favorites get explicit ids shifted past the target's current maximum, so
+    their foreign keys are remapped by arithmetic rather than a lookup table;
+    only categories and tags (matched by name) and users that already exist
+    (matched by username or email) are remapped through small dictionaries.
+    Sentiment is not scored row by row: posts without a score are marked
+    pending and scored in one bulk pass after the load.
+    """
+
+    @staticmethod
+    def tables():
+        """Record type -> table"""
+        from models import User, Category, Tag, BlogPost, Comment, Favorite, post_tags
+
+        return {'user': User.__table__, 'category': Category.__table__, 'tag': Tag.__table__,
+                'post': BlogPost.__table__, 'post_tag': post_tags, 'comment': Comment.__table__,
+                'favorite': Favorite.__table__}
+
+    def export_corpus(self, stream, batch_size=1000, report=None):
+        """
+        Write the whole corpus to a text stream
+        Args:
+            stream: writable text stream
+            batch_size: rows fetched per round trip
+            report: optional callback(record_type, rows_written) after each batch
+        Returns: rows written per record type
+        """
+        from models import db
+        from migrations import current_version
+
+        tables = self.tables()
+        counts = {}
+        connection = db.engine.connect()
+        try:
+            stream.write(json.dumps({
+                'type': 'header', 'format': FORMAT_VERSION,
+                'schema_version': current_version(connection),
+                'exported_at': datetime.utcnow().isoformat()
+            }) + '\n')
+
+            for record_type in RECORD_TYPES:
+                table = tables[record_type]
+                derived = DERIVED_COLUMNS.get(record_type, set())
+                columns = [column for column in table.columns if column.name not in derived]
+                stmt = select(*columns).order_by(*table.primary_key.columns)
+
+                counts[record_type] = 0
+                rows = connection.execution_options(yield_per=batch_size).execute(stmt)
+                for partition in rows.partitions():
+                    stream.write(''.join(
+                        json.dumps({'type': record_type, 'row': dict(row._mapping)},
+                                   default=_encode, separators=(',', ':')) + '\n'
+                        for row in partition
+                    ))
+                    counts[record_type] += len(partition)
+                    if report:
+                        report(record_type, counts[record_type])
+        finally:
+            connection.close()
+        return counts
+
+    def import_corpus(self, stream, batch_size=1000, score_sentiment=True, rebuild_related=True, report=None,
+                      allow_duplicate=False):
+        """
+        Load an exported corpus from a text stream into the current database
+        Batches are committed as they load, so a failed import leaves partial
+        data behind: restore the database from a backup taken before it. Each
+        import is recorded by the header's exported_at, and an export that was
+        already imported (or whose import failed) is refused.
+        Args:
+            stream: readable text stream of export lines
+            batch_size: rows per executemany INSERT and commit
+            score_sentiment: score unscored posts after the load (otherwise
+                leave them pending for `flask sentiment-backfill`)
+            rebuild_related: recompute related posts after the load
+            report: optional callback(record_type, rows_inserted) after each batch
+            allow_duplicate: import even if this export was imported before
+        Returns: rows inserted per record type
+        """
+        from models import db, CorpusImport
+
+        tables = self.tables()
+        state = self._initial_state(tables)
+        counts = {record_type: 0 for record_type in RECORD_TYPES}
+        batch, batch_type = [], None
+        import_id = None
+
+        def flush():
+            if batch:
+                counts[batch_type] += self._insert(tables[batch_type], batch_type, batch, state)
+                db.session.commit()
+                if report:
+                    report(batch_type, counts[batch_type])
+                batch.clear()
+
+        try:
+            for number, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                record_type = record.get('type')
+                if record_type == 'header':
+                    if record.get('format') != FORMAT_VERSION:
+                        raise ValueError(f"Unsupported export format {record.get('format')} on line {number}")
+                    import_id = self._start_import(record, allow_duplicate)
+                    continue
+                if import_id is None:
+                    raise ValueError(f"Record on line {number} comes before the export header")
+                if record_type not in tables:
+                    raise ValueError(f"Unknown record type {record_type!r} on line {number}")
+                if record_type != batch_type:
+                    # Remapping a foreign key needs the rows it points at first
+                    if batch_type and RECORD_TYPES.index(record_type) < RECORD_TYPES.index(batch_type):
+                        raise ValueError(f"Record type {record_type!r} out of order on line {number}")
+                    flush()
+                    batch_type = record_type
+                batch.append(record['row'])
+                if len(batch) >= batch_size:
+                    flush()
+            flush()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error importing corpus: {e}")
+            raise
+
+        self._sync_sequences(tables)
+        self._rebuild_derived(state, score_sentiment, rebuild_related, batch_size)
+        db.session.execute(
+            update(CorpusImport).where(CorpusImport.id == import_id)
+            .values(status='done', finished_at=datetime.utcnow())
+        )
+        db.session.commit()
+        return counts
+
+    @staticmethod
+    def _start_import(header, allow_duplicate):
+        """Record an import of the export with this header; returns its id"""
+        from models import db, CorpusImport
+
+        exported_at = header.get('exported_at')
+        if not exported_at:
+            raise ValueError("Export header has no exported_at stamp")
+        previous = CorpusImport.query.filter_by(exported_at=exported_at)\
+                                     .order_by(CorpusImport.id.desc()).first()
+        if previous is not None and not allow_duplicate:
+            if previous.status == 'done':
+                raise ValueError(f"The export of {exported_at} was already imported on "
+                                 f"{previous.finished_at:%Y-%m-%d %H:%M}; importing it again duplicates its posts")
+            raise ValueError(f"An import of the export of {exported_at} started on "
+                             f"{previous.started_at:%Y-%m-%d %H:%M} did not finish and left partial data; "
+                             f"restore the database from a backup taken before it, then import again")
+
+        record = CorpusImport(exported_at=exported_at)
+        db.session.add(record)
+        db.session.commit()
+        return record.id
+
+    @staticmethod
+    def _initial_state(tables):
+        """Id offsets and name maps for remapping the incoming foreign keys"""
+        from models import db
+
+        state = {'offsets': {}, 'ids': {'user': {}, 'category': {}, 'tag': {}}, 'names': {}, 'next_id': {},
+                 'merged_users': set(), 'pending_sentiment': 0}
+        for record_type in ('user', 'post', 'comment', 'favorite'):
+            table = tables[record_type]
+            state['offsets'][record_type] = db.session.execute(select(func.max(table.c.id))).scalar() or 0
+        for record_type in ('category', 'tag'):
+            table = tables[record_type]
+            state['names'][record_type] = dict(db.session.execute(select(table.c.name, table.c.id)).all())
+            state['next_id'][record_type] = max(state['names'][record_type].values(), default=0) + 1
+        return state
+
+    @staticmethod
+    def _remap(record_type, old_id, state):
+        """New id for an exported id; None when the referenced row was not imported"""
+        if old_id is None:
+            return None
+        if record_type in state['ids'] and old_id in state['ids'][record_type]:
+            return state['ids'][record_type][old_id]
+        if record_type in state['offsets']:
+            return old_id + state['offsets'][record_type]
+        return None
+
+    def _insert(self, table, record_type, rows, state):
+        """Remap one batch of rows and insert it with executemany; returns rows inserted"""
+        from models import db, User
+
+        if record_type == 'user':
+            # Accounts that already exist are kept; their content is attached to them
+            existing = db.session.execute(
+                select(User.id, User.username, User.email)
+                .where(User.username.in_([row['username'] for row in rows]) |
+                       User.email.in_([row['email'] for row in rows]))
+            ).all()
+            by_username = {user.username: user.id for user in existing}
+            by_email = {user.email: user.id for user in existing}
+            kept = []
+            for row in rows:
+                user_id = by_username.get(row['username']) or by_email.get(row['email'])
+                if user_id is None:
+                    kept.append(row)
+                else:
+                    state['ids']['user'][row['id']] = user_id
+                    state['merged_users'].add(user_id)
+            rows = kept
+
+        elif record_type in ('category', 'tag'):
+            # Matched by name: the target's own categories and tags win
+            names, kept = state['names'][record_type], []
+            for row in rows:
+                if row['name'] not in names:
+                    names[row['name']] = state['next_id'][record_type]
+                    state['next_id'][record_type] += 1
+                    kept.append(dict(row, id=names[row['name']]))
+                state['ids'][record_type][row['id']] = names[row['name']]
+            rows = kept
+
+        columns = {column.name: column for column in table.columns}
+        dates = {name for name, column in columns.items() if isinstance(column.type, DateTime)}
+        foreign_keys = FOREIGN_KEYS.get(record_type, {})
+        params = []
+        for row in rows:
+            values = {}
+            for name, value in row.items():
+                if name not in columns or name in DERIVED_COLUMNS.get(record_type, ()):
+                    continue
+                if name in dates and isinstance(value, str):
+                    value = datetime.fromisoformat(value)
+                elif name in foreign_keys:
+                    value = self._remap(foreign_keys[name], value, state)
+                elif name == 'id' and record_type in state['offsets']:
+                    value += state['offsets'][record_type]
+                values[name] = value
+            if any(values.get(name) is None and not columns[name].nullable for name in foreign_keys):
+                # Points at a row the export did not contain
+                continue
+            if record_type == 'post' and (values.get('sentiment_score') is None or
+                                          values.get('sentiment_label') == 'pending'):
+                values.update(sentiment_score=None, sentiment_label='pending', sentiment_confidence=None)
+                state['pending_sentiment'] += 1
+            params.append(values)
+
+        if params:
+            db.session.execute(table.insert(), params)
+        return len(params)
+
+    @staticmethod
+    def _sync_sequences(tables):
+        """Move PostgreSQL id sequences past the explicit ids the import wrote"""
+        from models import db
+
+        if db.engine.dialect.name != 'postgresql':
+            return
+        for record_type in ('user', 'category', 'tag', 'post', 'comment', 'favorite'):
+            name = tables[record_type].name
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{name}\"', 'id'), "
+                f"coalesce((SELECT max(id) FROM \"{name}\"), 0) + 1, false)"
+            ))
+        db.session.commit()
+
+    @staticmethod
+    def _rebuild_derived(state, score_sentiment, rebuild_related, batch_size):
+        """Recompute counters, stats and indexes the app normally maintains per write"""
+        from post_counters import PostCounters
+        from user_stats import UserStatsRollup
+        from search_index import search_index
+        from related_posts import related_index
+        from sentiment_queue import backfill_sentiment
+        from conditional_get import conditional_get
+
+        PostCounters.rebuild()
+        PostCounters.rebuild_comment_counts()
+        UserStatsRollup.rebuild()
+        if score_sentiment and state['pending_sentiment']:
+            backfill_sentiment(batch_size=batch_size)
+        search_index.rebuild()
+        if rebuild_related:
+            related_index.rebuild()
+            conditional_get.touch_all_posts()
+        fragment_cache.bump('categories', 'tags', 'posts', 'related', *(f'user:{user_id}' for user_id in state['merged_users']))
+
+
+# Global instance
+corpus_transfer = CorpusTransfer()
+
+
+@click.command('export-data')
+@click.argument('path', default='-')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows fetched per round trip.')
+@with_appcontext
+def export_data_command(path, batch_size):
+    """Export the blog corpus as NDJSON to PATH (gzip if it ends in .gz, stdout for -).
+
+    The export includes password hashes; keep the file private. When writing
+    to stdout, run with STARTUP_MODE=fast so boot messages stay out of it.
+    """
+    started = time.perf_counter()
+    with open_stream(path, 'w') as stream:
+        counts = corpus_transfer.export_corpus(stream, batch_size=batch_size)
+    # Keep stdout clean when the export itself goes there
+    click.echo(', '.join(f'{count} {record_type}' for record_type, count in counts.items()) +
+               f' exported in {time.perf_counter() - started:.1f}s', err=path == '-')
+
+
+@click.command('import-data')
+@click.argument('path', default='-')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per INSERT batch.')
+@click.option('--defer-sentiment', is_flag=True,
+              help='Leave unscored posts pending for `flask sentiment-backfill`.')
+@click.option('--skip-related', is_flag=True, help='Do not rebuild related posts (run `flask rebuild-related`).')
+@click.option('--allow-duplicate', is_flag=True, help='Import an export that was imported before (adds a second copy).')
+@with_appcontext
+def import_data_command(path, batch_size, defer_sentiment, skip_related, allow_duplicate):
+    """Import an NDJSON export from PATH (gzip if it ends in .gz, stdin for -).
+
+    Existing users, categories and tags with the same username, email or
+    name are reused; everything else is added alongside the current data.
+    Batches are committed as they load: back the database up first, and
+    restore that backup if an import fails part-way. An export that was
+    already imported is refused.
+    """
+    started = time.perf_counter()
+    with open_stream(path, 'r') as stream:
+        counts = corpus_transfer.import_corpus(stream, batch_size=batch_size, score_sentiment=not defer_sentiment,
+                                               rebuild_related=not skip_related, allow_duplicate=allow_duplicate)
+    click.echo(', '.join(f'{count} {record_type}' for record_type, count in counts.items()) +
+               f' imported in {time.perf_counter() - started:.1f}s')
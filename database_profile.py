@@ -0,0 +1,211 @@
+"""
+Database Profile Module
+Environment-selected engine settings for SQLite and PostgreSQL
+"""
+import os
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+try:
+    import fcntl
+except ImportError:  # Windows: the writer lock is per process only
+    fcntl = None
+
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER')
+
+
+class WriterLock:
+    """
+    Serializes SQLite write transactions across threads and worker processes
+    SQLite allows a single writer. Threads of one process queue on a blocking
+    lock; between processes the holder of that lock then polls a non-blocking
+    flock with a short backoff (1 ms doubling to 10 ms). Either way a writer
+    waits here instead of inside SQLite's busy handler, which gives up with
+    'database is locked'. Readers never take the lock - under WAL they don't
+    need it.
+
+    A thread that already holds the lock for one connection and starts
+    writing on a second connection could never get it: the first
+    transaction is waiting on that very thread. acquire() raises instead of
+    stalling for the whole timeout.
+    """
+
+    POLL_INITIAL = 0.001
+    POLL_MAX = 0.01
+
+    def __init__(self, path=None, timeout=30.0):
+        """Initialize the lock; `path` enables cross-process locking"""
+        self.path = path
+        self.timeout = timeout
+        self._thread_lock = threading.Lock()
+        self._owner = None
+        self._file = None
+
+    def acquire(self):
+        """Block until this thread holds the write lock; returns False on timeout"""
+        if self._owner == threading.get_ident():
+            raise RuntimeError("This thread already holds the SQLite write lock on another connection; "
+                               "commit that transaction before writing on a second connection")
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            return False
+        if self.path and fcntl is not None:
+            deadline = time.monotonic() + self.timeout
+            delay = self.POLL_INITIAL
+            try:
+                if self._file is None:
+                    self._file = open(self.path, 'a')
+                while True:
+                    try:
+                        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() >= deadline:
+                            self._thread_lock.release()
+                            return False
+                        time.sleep(delay)
+                        delay = min(delay * 2, self.POLL_MAX)
+            except OSError as e:
+                print(f"Error taking database write lock: {e}")
+        self._owner = threading.get_ident()
+        return True
+
+    def release(self):
+        """Let the next writer in"""
+        self._owner = None
+        if self._file is not None and fcntl is not None:
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+            except OSError as e:
+                print(f"Error releasing database write lock: {e}")
+        self._thread_lock.release()
+
+    def reset(self):
+        """Forget inherited state in a forked worker"""
+        self._thread_lock = threading.Lock()
+        self._owner = None
+        self._file = None
+
+
+class DatabaseProfile:
+    """
+    Chooses engine options from the database URL and tunes connections
+
+    SQLite: WAL journal, synchronous=NORMAL, memory-mapped reads, a busy
+    timeout and a single-writer lock. PostgreSQL: a sized connection pool
+    with pre-ping and recycling. Either way, a forked worker (gunicorn
+    --preload) starts with an empty pool instead of the parent's connections.
+    """
+
+    def __init__(self):
+        """Initialize the profile"""
+        self.dialect = None
+        self.writer_lock = None
+        self.engines = []
+
+        # Lock and pool state are per process; a forked worker opens its own
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """Drop lock state and pooled connections inherited from the parent process"""
+        if self.writer_lock is not None:
+            self.writer_lock.reset()
+        for engine in self.engines:
+            # close=False: the parent still owns those sockets/file handles
+            engine.dispose(close=False)
+
+    def configure(self, app):
+        """Set SQLALCHEMY_ENGINE_OPTIONS; call before db.init_app(app)"""
+        url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        self.dialect = url.get_backend_name()
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+
+        if self.dialect == 'sqlite':
+            connect_args = dict(options.get('connect_args', {}))
+            # pysqlite's timeout is SQLite's busy handler, in seconds
+            connect_args.setdefault('timeout', app.config.get('SQLITE_BUSY_TIMEOUT', 5000) / 1000)
+            options['connect_args'] = connect_args
+        elif self.dialect == 'postgresql':
+            options.setdefault('pool_size', app.config.get('DB_POOL_SIZE', 10))
+            options.setdefault('max_overflow', app.config.get('DB_MAX_OVERFLOW', 20))
+            options.setdefault('pool_timeout', app.config.get('DB_POOL_TIMEOUT', 30))
+            options.setdefault('pool_recycle', app.config.get('DB_POOL_RECYCLE', 1800))
+            options.setdefault('pool_pre_ping', True)
+
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    def init_app(self, app):
+        """Attach connection tuning to the engine; call after db.init_app(app)"""
+        from models import db
+
+        with app.app_context():
+            if db.engine not in self.engines:
+                self.engines.append(db.engine)
+
+        if self.dialect != 'sqlite' or not app.config.get('SQLITE_TUNING', True):
+            return
+
+        with app.app_context():
+            engine = db.engine
+            event.listen(engine, 'connect', self._sqlite_pragmas(app))
+
+            if app.config.get('SQLITE_SINGLE_WRITER', True):
+                database = engine.url.database
+                lock_path = f"{database}.write-lock" if database and database != ':memory:' else None
+                self.writer_lock = WriterLock(lock_path, timeout=app.config.get('SQLITE_BUSY_TIMEOUT', 5000) / 1000)
+                event.listen(engine, 'before_cursor_execute', self._before_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_execute)
+                event.listen(engine, 'commit', self._end_transaction)
+                event.listen(engine, 'rollback', self._end_transaction)
+                event.listen(engine.pool, 'checkin', self._on_checkin)
+
+    @staticmethod
+    def _sqlite_pragmas(app):
+        """Build the per-connection PRAGMA hook"""
+        busy_timeout = app.config.get('SQLITE_BUSY_TIMEOUT', 5000)
+        mmap_size = app.config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                # WAL lets readers proceed while a write is in progress
+                cursor.execute("PRAGMA journal_mode=WAL")
+                # Durable at checkpoints; avoids an fsync on every commit
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+                cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+            finally:
+                cursor.close()
+
+        return set_pragmas
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """Take the writer lock before the first write of a transaction"""
+        if conn.info.get('holds_write_lock'):
+            return
+        if statement.lstrip()[:7].upper().startswith(WRITE_PREFIXES):
+            if self.writer_lock.acquire():
+                conn.info['holds_write_lock'] = True
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """Autocommit connections (e.g. migrations) end the write with the statement"""
+        if conn.info.get('holds_write_lock') and \
+                conn.get_execution_options().get('isolation_level') == 'AUTOCOMMIT':
+            self._end_transaction(conn)
+
+    def _end_transaction(self, conn):
+        """Release the writer lock on commit or rollback"""
+        if conn.info.pop('holds_write_lock', False):
+            self.writer_lock.release()
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        """Safety net: never return a connection to the pool still holding the lock"""
+        if connection_record.info.pop('holds_write_lock', False):
+            self.writer_lock.release()
+
+
+# Global instance
+database_profile = DatabaseProfile()
@@ -0,0 +1,83 @@
+"""
+Favorite Loader Module
+Request-scoped batch loading of favorite counts and per-user favorite flags
+"""
+from flask import g, has_request_context
+from flask_login import current_user
+from sqlalchemy import select, func, case
+
+
+class FavoriteLoader:
+    """
+    Collects favorite counts and the current user's favorite flags for every
+    post loaded in the request, using one grouped IN (...) query per batch
+    """
+
+    def _state(self):
+        """Return the per-request cache, creating it on first use"""
+        if 'favorite_loader' not in g:
+            viewer_id = current_user.id if current_user.is_authenticated else None
+            g.favorite_loader = {'viewer_id': viewer_id, 'counts': {}, 'favorited': set()}
+        return g.favorite_loader
+
+    def prime(self, post_ids):
+        """Load counts and flags for the given post ids that are not cached yet"""
+        from models import db, Favorite
+
+        state = self._state()
+        missing = {post_id for post_id in post_ids if post_id is not None} - state['counts'].keys()
+        if not missing:
+            return
+
+        stmt = select(
+            Favorite.post_id,
+            func.count(Favorite.id),
+            func.sum(case((Favorite.user_id == state['viewer_id'], 1), else_=0))
+        ).where(Favorite.post_id.in_(missing)).group_by(Favorite.post_id)
+
+        for post_id in missing:
+            state['counts'][post_id] = 0
+        for post_id, count, viewer_count in db.session.execute(stmt):
+            state['counts'][post_id] = count
+            if viewer_count:
+                state['favorited'].add(post_id)
+
+    def _prime_for(self, post):
+        """Prime the requested post together with every other post already loaded"""
+        from models import db, BlogPost
+
+        post_ids = {post.id}
+        for obj in list(db.session.identity_map.values()):
+            if isinstance(obj, BlogPost):
+                post_ids.add(obj.id)
+        self.prime(post_ids)
+
+    def count(self, post):
+        """Number of favorites for a post (None outside a request)"""
+        if not has_request_context():
+            return None
+        state = self._state()
+        if post.id not in state['counts']:
+            self._prime_for(post)
+        return state['counts'][post.id]
+
+    def is_favorited(self, post, user):
+        """Whether `user` favorited `post` (None when the loader can't answer)"""
+        if not has_request_context():
+            return None
+        state = self._state()
+        if state['viewer_id'] is None or user.id != state['viewer_id']:
+            return None
+        if post.id not in state['counts']:
+            self._prime_for(post)
+        return post.id in state['favorited']
+
+    def forget(self, post_id):
+        """Drop cached state for a post after its favorites changed"""
+        if has_request_context() and 'favorite_loader' in g:
+            g.favorite_loader['counts'].pop(post_id, None)
+            g.favorite_loader['favorited'].discard(post_id)
+
+
+# Global instance
+favorite_loader = FavoriteLoader()
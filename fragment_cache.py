@@ -0,0 +1,221 @@
+"""
+Fragment Cache Module
+Caches rendered Jinja fragments keyed by model version stamps
+"""
+import threading
+import time
+from collections import OrderedDict
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+
+class LRUBackend:
+    """In-process LRU store for rendered fragments and version stamps"""
+
+    def __init__(self, max_entries=512, ttl=300):
+        """Initialize the store"""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Versions live outside the LRU: evicting one would resurrect old fragments
+        self._versions = {}
+
+    def get(self, key):
+        """Return a cached fragment or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        """Store a fragment, evicting the least recently used ones"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_versions(self, names):
+        """Current version stamp for each name (0 when never bumped)"""
+        with self._lock:
+            return [self._versions.get(name, 0) for name in names]
+
+    def bump(self, names):
+        """Advance the version stamp of each name"""
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def clear(self):
+        """Drop every fragment (versions are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """Shared store so every worker process sees the same fragments and versions"""
+
+    def __init__(self, url, ttl=300, prefix='fragment:'):
+        """Connect to Redis (requires the optional redis package)"""
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value.encode('utf-8'), ex=self.ttl)
+
+    def get_versions(self, names):
+        if not names:
+            return []
+        values = self.client.mget([f'{self.prefix}version:{name}' for name in names])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def bump(self, names):
+        pipeline = self.client.pipeline()
+        for name in names:
+            pipeline.incr(f'{self.prefix}version:{name}')
+        pipeline.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            if not key.decode('utf-8').startswith(f'{self.prefix}version:'):
+                self.client.delete(key)
+
+
+class FragmentCache:
+    """
+    Renders template fragments once per combination of dependency versions
+
+    Templates wrap a block in {% cache "key", "dep", ... %} ... {% endcache %};
+    the cached HTML is reused until one of the named dependencies is bumped.
+    """
+
+    def __init__(self):
+        """Initialize with an in-process backend"""
+        self.backend = LRUBackend()
+        self.enabled = True
+
+    def init_app(self, app):
+        """Pick a backend from the config and register the template tag"""
+        ttl = app.config.get('FRAGMENT_CACHE_TTL', 300)
+        size = app.config.get('FRAGMENT_CACHE_SIZE', 512)
+        self.enabled = size > 0
+
+        redis_url = app.config.get('FRAGMENT_CACHE_REDIS_URL')
+        self.backend = LRUBackend(max_entries=size, ttl=ttl)
+        if redis_url:
+            try:
+                self.backend = RedisBackend(redis_url, ttl=ttl)
+            except ImportError:
+                print("Warning: redis is not installed - using the in-process fragment cache")
+
+        app.jinja_env.add_extension(FragmentCacheExtension)
+
+    def bump(self, *names):
+        """Invalidate every fragment that depends on one of these names"""
+        names = [name for name in names if name]
+        if not names:
+            return
+        try:
+            self.backend.bump(names)
+        except Exception as e:
+            print(f"Error bumping fragment versions: {e}")
+
+    def bump_post(self, post):
+        """Invalidate fragments showing a post and the listings it appears in"""
+        self.bump(f'post:{post.id}', f'category:{post.category_id}', 'categories', 'tags', 'posts')
+
+    def render(self, key, dependencies, producer):
+        """Return the cached fragment for key + versions, rendering it on a miss"""
+        if not self.enabled:
+            return producer()
+
+        try:
+            versions = self.backend.get_versions(dependencies)
+            cache_key = f"{key}|{'.'.join(map(str, versions))}"
+            cached = self.backend.get(cache_key)
+        except Exception as e:
+            print(f"Error reading fragment cache: {e}")
+            return producer()
+
+        if cached is not None:
+            return cached
+
+        value = producer()
+        try:
+            self.backend.set(cache_key, str(value))
+        except Exception as e:
+            print(f"Error writing fragment cache: {e}")
+        return value
+
+    def clear(self):
+        """Drop every cached fragment"""
+        self.backend.clear()
+
+
+# Global instance
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """Jinja tag: {% cache "key", "dependency", ... %}body{% endcache %}"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        dependencies = []
+        while parser.stream.skip_if('comma'):
+            dependencies.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render', [key, nodes.List(dependencies)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, key, dependencies, caller):
+        return Markup(fragment_cache.render(str(key), [str(dep) for dep in dependencies], caller))
+
+
+class Lazy:
+    """
+    Defers a query until a template actually iterates it
+    Lets views hand sidebar data to a template without paying for it when the
+    surrounding fragment is served from cache.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._value = None
+        self._loaded = False
+
+    def _load(self):
+        if not self._loaded:
+            try:
+                self._value = list(self._loader())
+            except Exception as e:
+                print(f"Error loading deferred query: {e}")
+                self._value = []
+            self._loaded = True
+        return self._value
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __bool__(self):
+        return bool(self._load())
@@ -0,0 +1,29 @@
+"""
+Gunicorn configuration
+Preload the app once in the master and fork workers from it.
+
+    STARTUP_MODE=fast flask --app app:create_app init-db   # once per deploy
+    gunicorn -c gunicorn.conf.py run:app
+"""
+import multiprocessing
+import os
+
+# Schema, migrations and seeding belong to `flask init-db`, not to every boot
+os.environ.setdefault('STARTUP_MODE', 'fast')
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = 30
+
+# Import the app (and warm what workers share) once; workers are copy-on-write forks.
+# No post_fork hook is needed: DatabaseProfile disposes the inherited connection
+# pool in an os.register_at_fork hook, and background threads start lazily per worker.
+preload_app = True
+
+
+def when_ready(server):
+    """Load the sentiment engine in the master so every worker inherits it"""
+    from ai_sentiment import sentiment_analyzer
+    sentiment_analyzer.load_engine()
+
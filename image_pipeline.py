@@ -0,0 +1,216 @@
+"""
+Image Pipeline Module
+Renders resized and WebP renditions of uploaded images off the request path
+"""
+import atexit
+import os
+import threading
+import click
+from flask import current_app, url_for
+from flask.cli import with_appcontext
+
+
+# Rendition name -> ((max width, max height), crop to exactly that size)
+RENDITIONS = {
+    'posts': {
+        'card': ((600, 400), False),
+        'full': ((800, 600), False),
+    },
+    'profiles': {
+        'avatar': ((160, 160), True),
+        'full': ((400, 400), False),
+    },
+}
+
+
+def rendition_filename(filename, rendition, fmt=None):
+    """Name of a rendition file, e.g. abc123_card.jpg or abc123_card.webp"""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}_{rendition}.{fmt or ext.lstrip('.').lower()}"
+
+
+def render_renditions(source_path, renditions):
+    """
+    Write every rendition of one image next to the original
+    Runs in a worker process. JPEG sources are decoded in draft mode at the
+    smallest DCT scale that still covers the largest rendition.
+    """
+    from PIL import Image, ImageOps
+
+    folder, filename = os.path.split(source_path)
+    ext = os.path.splitext(filename)[1].lower()
+    largest = (max(size[0] for size, _ in renditions.values()),
+               max(size[1] for size, _ in renditions.values()))
+
+    with Image.open(source_path) as original:
+        original.draft('RGB', largest)
+        image = ImageOps.exif_transpose(original)
+        if ext in ('.jpg', '.jpeg') and image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        for name, (size, crop) in renditions.items():
+            if crop:
+                rendered = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+            else:
+                rendered = image.copy()
+                rendered.thumbnail(size, Image.Resampling.LANCZOS)
+
+            for fmt, options in ((None, {'optimize': True, 'quality': 85}),
+                                 ('webp', {'quality': 80, 'method': 4})):
+                target = os.path.join(folder, rendition_filename(filename, name, fmt))
+                temp_target = f"{target}.tmp"
+                save_format = 'WEBP' if fmt else Image.registered_extensions().get(ext, 'JPEG')
+                rendered.save(temp_target, format=save_format, **options)
+                # Atomic swap so a half-written file is never served
+                os.replace(temp_target, target)
+
+    return source_path
+
+
+def discard_upload(source_path, renditions):
+    """Remove an upload that could not be rendered, with any renditions it left behind"""
+    folder, filename = os.path.split(source_path)
+    paths = [source_path] + [os.path.join(folder, rendition_filename(filename, name, fmt))
+                             for name in renditions for fmt in (None, 'webp')]
+    for path in paths:
+        for candidate in (path, f"{path}.tmp"):
+            try:
+                os.remove(candidate)
+            except FileNotFoundError:
+                pass
+
+
+class ImagePipeline:
+    """Queues rendition work on a process pool and resolves rendition URLs"""
+
+    def __init__(self):
+        """Initialize the pipeline"""
+        self.app = None
+        self.num_workers = 2
+        self._reset()
+
+        # Pools do not survive a fork; the child creates its own on demand
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """Forget the process pool and the file-existence cache"""
+        self._executor = None
+        self._lock = threading.Lock()
+        self._existing = set()
+
+    def init_app(self, app):
+        """Read configuration and register the template helper"""
+        self.app = app
+        self.num_workers = app.config.get('IMAGE_WORKERS', 2)
+        app.add_template_global(self.image_url, 'image_url')
+        atexit.register(self.shutdown)
+
+    def submit(self, source_path, folder):
+        """Queue rendition rendering for a freshly saved upload"""
+        renditions = RENDITIONS.get(folder)
+        if not renditions:
+            return
+
+        if self.num_workers <= 0:
+            try:
+                render_renditions(source_path, renditions)
+            except Exception as e:
+                print(f"Error rendering image {source_path}: {e}")
+                discard_upload(source_path, renditions)
+            return
+
+        future = self._get_executor().submit(render_renditions, source_path, renditions)
+        future.add_done_callback(lambda done: self._report_failure(done, source_path, renditions))
+
+    def _get_executor(self):
+        """Create the process pool lazily (after any fork)"""
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ProcessPoolExecutor
+                self._executor = ProcessPoolExecutor(max_workers=self.num_workers)
+            return self._executor
+
+    def _report_failure(self, future, source_path, renditions):
+        """Log rendering errors and delete the upload: an image that won't render is never served"""
+        error = future.exception()
+        if error is not None:
+            print(f"Error rendering image {source_path}: {error}")
+            discard_upload(source_path, renditions)
+            self._existing.discard(source_path)
+
+    def shutdown(self):
+        """Stop the process pool without waiting for queued work"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _exists(self, path):
+        """File existence check that remembers positive answers"""
+        if path in self._existing:
+            return True
+        if os.path.exists(path):
+            if len(self._existing) > 10000:
+                self._existing.clear()
+            self._existing.add(path)
+            return True
+        return False
+
+    def image_url(self, filename, folder, rendition='full', fmt=None):
+        """
+        URL of an image rendition, falling back to the original upload
+        Returns None for a missing WebP variant or a missing upload so
+        templates can skip it.
+        """
+        if not filename:
+            return None
+
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        name = rendition_filename(filename, rendition, fmt)
+        if self._exists(os.path.join(upload_folder, folder, name)):
+            return url_for('static', filename=f'uploads/{folder}/{name}')
+        if fmt:
+            return None
+        # Until renditions exist; an upload that failed to render has been deleted
+        if self._exists(os.path.join(upload_folder, folder, filename)):
+            return url_for('static', filename=f'uploads/{folder}/{filename}')
+        return None
+
+    def delete_renditions(self, filename, folder):
+        """Remove every rendition file of an upload"""
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        for rendition in RENDITIONS.get(folder, {}):
+            for fmt in (None, 'webp'):
+                path = os.path.join(upload_folder, folder, rendition_filename(filename, rendition, fmt))
+                self._existing.discard(path)
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+@click.command('render-images')
+@with_appcontext
+def render_images_command():
+    """Generate missing renditions for existing uploads."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    rendered = 0
+    for folder, renditions in RENDITIONS.items():
+        path = os.path.join(upload_folder, folder)
+        if not os.path.isdir(path):
+            continue
+        names = os.listdir(path)
+        rendition_names = {rendition_filename(name, rendition, fmt)
+                           for name in names for rendition in renditions for fmt in (None, 'webp')}
+        for name in names:
+            if name in rendition_names or name.endswith('.tmp'):
+                continue
+            if all(rendition_filename(name, rendition) in names for rendition in renditions):
+                continue
+            try:
+                render_renditions(os.path.join(path, name), renditions)
+                rendered += 1
+            except Exception as e:
+                click.echo(f"Skipping {folder}/{name}: {e}")
+    click.echo(f"Rendered {rendered} images.")
+
+
+# Global instance
+image_pipeline = ImagePipeline()
@@ -0,0 +1,232 @@
+"""
+Query Instrumentation Module
+Per-request SQL counts, database time, repeated-statement fingerprints and
+N+1 detection, reported through a Server-Timing header and a debug endpoint
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from flask import g, request, has_request_context, jsonify, abort
+from sqlalchemy import event
+
+
+# Literals and IN lists that vary between otherwise identical statements
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE = re.compile(r'\s+')
+
+# Frames from these directories are library code, not the caller we want to point at
+_LIBRARY_DIRS = tuple({os.path.dirname(os.__file__), sys.prefix, sys.exec_prefix})
+_APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement):
+    """Normalize a SQL statement so repeats with different parameters compare equal"""
+    statement = _STRING.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _IN_LIST.sub('(...)', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+
+def _call_site():
+    """First application frame (module or template) that led to the current query"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        template = frame.f_globals.get('__jinja_template__')
+        if template is not None:
+            # Compiled template code: map the Python line back to the template source
+            name = os.path.relpath(filename, _APP_ROOT) if filename.startswith(_APP_ROOT) else template.name
+            return f"{name}:{template.get_corresponding_lineno(frame.f_lineno)}"
+        if filename.startswith(_APP_ROOT) and not filename.startswith(_LIBRARY_DIRS) and \
+                'site-packages' not in filename and filename != __file__:
+            return f"{os.path.relpath(filename, _APP_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class RequestProfile:
+    """Queries issued while serving one request"""
+
+    def __init__(self, method, path):
+        """Start an empty profile"""
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.status = None
+        self.query_count = 0
+        self.db_time = 0.0
+        # fingerprint -> {'count', 'time', 'site'}
+        self.statements = {}
+
+    def record(self, statement, elapsed, threshold):
+        """Add one executed statement"""
+        self.query_count += 1
+        self.db_time += elapsed
+        key = fingerprint(statement)
+        entry = self.statements.get(key)
+        if entry is None:
+            entry = self.statements[key] = {'count': 0, 'time': 0.0, 'site': None}
+        entry['count'] += 1
+        entry['time'] += elapsed
+        # Walking the stack is slow, so only do it once a statement looks like a loop
+        if entry['count'] == threshold and entry['site'] is None:
+            entry['site'] = _call_site()
+
+    def repeated(self, threshold):
+        """Statements run at least `threshold` times: likely N+1 loops"""
+        return sorted(
+            ({'statement': key, 'count': entry['count'], 'time_ms': round(entry['time'] * 1000, 2),
+              'site': entry['site']}
+             for key, entry in self.statements.items()
+             if entry['count'] >= threshold and key.upper().startswith(('SELECT', 'WITH'))),
+            key=lambda item: -item['count']
+        )
+
+    def to_dict(self, threshold):
+        """JSON-friendly summary for the debug endpoint"""
+        return {
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'duration_ms': round(self.duration * 1000, 2),
+            'queries': self.query_count,
+            'db_time_ms': round(self.db_time * 1000, 2),
+            'distinct_statements': len(self.statements),
+            'n_plus_one': self.repeated(threshold),
+            'statements': sorted(
+                ({'statement': key, 'count': entry['count'], 'time_ms': round(entry['time'] * 1000, 2)}
+                 for key, entry in self.statements.items()),
+                key=lambda item: -item['time_ms']
+            ),
+        }
+
+
+class QueryInstrumentation:
+    """
+    Times every SQL statement issued on a request's thread
+
+    Engine events feed a RequestProfile kept on flask.g; queries from
+    background threads (sentiment workers, view counter flushes) have no
+    request context and are ignored. Each response gets a Server-Timing
+    header, statements repeated SQL_NPLUS1_THRESHOLD times are reported as
+    N+1 suspects, and recent profiles can be browsed at /_debug/queries
+    when SQL_DEBUG_ENDPOINT is on. Everything is off unless configured.
+    """
+
+    def __init__(self):
+        """Initialize the instrumentation"""
+        self.enabled = False
+        self.threshold = 5
+        self.warn = False
+        self.recent = deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Attach engine listeners, request hooks and the optional debug endpoint"""
+        from models import db
+
+        self.enabled = app.config.get('SQL_INSTRUMENTATION', False)
+        if not self.enabled:
+            return
+        self.threshold = app.config.get('SQL_NPLUS1_THRESHOLD', 5)
+        self.warn = app.config.get('SQL_NPLUS1_WARN', False)
+        self.recent = deque(maxlen=app.config.get('SQL_DEBUG_HISTORY', 50))
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+        if app.config.get('SQL_DEBUG_ENDPOINT'):
+            app.add_url_rule('/_debug/queries', 'sql_debug_queries', self.debug_view)
+
+    def current(self):
+        """The profile for the request being served, if any"""
+        if not has_request_context():
+            return None
+        return g.get('sql_profile')
+
+    def _start_request(self):
+        """Open a profile for the incoming request"""
+        g.sql_profile = RequestProfile(request.method, request.full_path.rstrip('?'))
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """Stamp the statement's start time on the connection"""
+        if self.current() is not None:
+            conn.info['sql_started'] = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """Charge the statement to the current request"""
+        started = conn.info.pop('sql_started', None)
+        profile = self.current()
+        if profile is None or started is None:
+            return
+        profile.record(statement, time.perf_counter() - started, self.threshold)
+
+    def _finish_request(self, response):
+        """Close the profile, add Server-Timing and report N+1 suspects"""
+        profile = g.pop('sql_profile', None)
+        if profile is None or request.endpoint == 'sql_debug_queries':
+            return response
+
+        profile.duration = time.perf_counter() - profile.started
+        profile.status = response.status_code
+        response.headers.add('Server-Timing',
+                             f'db;dur={profile.db_time * 1000:.2f};desc="{profile.query_count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={profile.duration * 1000:.2f}')
+
+        suspects = profile.repeated(self.threshold)
+        if suspects:
+            response.headers.add('Server-Timing', f'nplus1;desc="{len(suspects)} repeated statements"')
+            if self.warn:
+                for suspect in suspects:
+                    print(f"Possible N+1 on {profile.method} {profile.path}: {suspect['count']}x "
+                          f"{suspect['statement'][:120]} ({suspect['site'] or 'unknown caller'})")
+
+        with self._lock:
+            self.recent.append(profile)
+        return response
+
+    def debug_view(self):
+        """Recent request profiles as JSON, newest first (?path= filters, ?n_plus_one=1 only suspects)"""
+        from flask import current_app
+
+        if not current_app.config.get('SQL_DEBUG_ENDPOINT'):
+            abort(404)
+        # Profiles hold every user's paths and search strings
+        if not self._is_local_request():
+            return jsonify({'error': 'Local requests only'}), 403
+        path = request.args.get('path')
+        suspects_only = request.args.get('n_plus_one') == '1'
+        with self._lock:
+            profiles = list(self.recent)
+
+        results = []
+        for profile in reversed(profiles):
+            if path and not profile.path.startswith(path):
+                continue
+            summary = profile.to_dict(self.threshold)
+            if suspects_only and not summary['n_plus_one']:
+                continue
+            results.append(summary)
+        return jsonify({'threshold': self.threshold, 'requests': results})
+
+
+    @staticmethod
+    def _is_local_request():
+        """Whether the request came from this machine and not through a proxy"""
+        return request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+
+
+# Global instance
+query_instrumentation = QueryInstrumentation()
@@ -0,0 +1,198 @@
+"""
+Keyset Pagination Module
+Cursor-based pagination for post listings and comment threads using
+(sort_key, id) seek predicates
+"""
+import base64
+import binascii
+import json
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import tuple_, func, select
+
+
+# Sort mode -> (sort column name, descending, extra filter on sentiment_label)
+SORTS = {
+    'newest': ('created_at', True, None),
+    'oldest': ('created_at', False, None),
+    'popular': ('views', True, None),
+    'positive': ('sentiment_score', True, 'positive'),
+    'negative': ('sentiment_score', False, 'negative'),
+}
+
+
+# Comment threads are newest first; cursors carry their own sort name
+COMMENT_SORT = 'comments'
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that is malformed or belongs to another sort"""
+
+
+class KeysetPage:
+    """One page of a keyset-paginated listing"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def encode_cursor(sort, key, row_id, direction):
+    """Serialize a seek position into an opaque URL-safe token"""
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    payload = json.dumps({'s': sort, 'k': key, 'i': row_id, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """Parse a cursor token; returns (key, id, direction)"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        key, row_id, direction = data['k'], int(data['i']), data['d']
+        if data['s'] != sort or direction not in ('next', 'prev'):
+            raise InvalidCursor(token)
+        if (sort == COMMENT_SORT or SORTS[sort][0] == 'created_at') and key is not None:
+            key = datetime.fromisoformat(key)
+        return key, row_id, direction
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(token) from e
+
+
+class CountCache:
+    """Short-lived cache of listing totals so pages don't run COUNT(*) each time"""
+
+    def __init__(self, ttl=60, max_entries=512):
+        """Initialize the cache"""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key, compute):
+        """Return the cached total for `key`, recomputing it once expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+
+        value = compute()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def clear(self):
+        """Forget every cached total"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Global instance
+count_cache = CountCache()
+
+
+def paginate_posts(query, sort='newest', cursor=None, per_page=12, count_key=None):
+    """
+    Fetch one page of BlogPost rows from `query` in keyset order
+    Args:
+        query: filtered BlogPost query without ORDER BY
+        sort: one of SORTS (unknown values fall back to 'newest')
+        cursor: token from a previous page's next_cursor / prev_cursor
+        per_page: page size
+        count_key: hashable key for the cached approximate total (None to skip)
+    Returns: KeysetPage
+    Raises: InvalidCursor for a malformed or foreign cursor
+    """
+    from models import db, BlogPost
+
+    if sort not in SORTS:
+        sort = 'newest'
+    column_name, descending, label = SORTS[sort]
+    sort_column = getattr(BlogPost, column_name)
+
+    if label:
+        query = query.filter(BlogPost.sentiment_label == label)
+    # Keys must be non-null for the row-value comparison to see every row
+    query = query.filter(sort_column.isnot(None))
+
+    total = None
+    if count_key is not None:
+        count_stmt = select(func.count()).select_from(query.order_by(None).subquery())
+        total = count_cache.get((count_key, sort), lambda: db.session.execute(count_stmt).scalar())
+
+    direction = 'next'
+    if cursor:
+        key, row_id, direction = decode_cursor(cursor, sort)
+        # Walking backwards flips the comparison and the ordering
+        forward = descending if direction == 'next' else not descending
+        seek = tuple_(sort_column, BlogPost.id)
+        position = tuple_(key, row_id, types=[sort_column.type, BlogPost.id.type])
+        query = query.filter(seek < position if forward else seek > position)
+    else:
+        forward = descending
+
+    if forward:
+        query = query.order_by(sort_column.desc(), BlogPost.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), BlogPost.id.asc())
+
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    def cursor_for(post, to):
+        return encode_cursor(sort, getattr(post, column_name), post.id, to)
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if direction == 'next':
+            next_cursor = cursor_for(rows[-1], 'next') if more else None
+            prev_cursor = cursor_for(rows[0], 'prev') if cursor else None
+        else:
+            next_cursor = cursor_for(rows[-1], 'next')
+            prev_cursor = cursor_for(rows[0], 'prev') if more else None
+
+    return KeysetPage(rows, next_cursor, prev_cursor, total)
+
+
+def paginate_comments(query, cursor=None, per_page=20):
+    """
+    Fetch one page of a comment thread, newest first, seeking on (created_at, id)
+    Threads only page forwards ("load more"), so there is no prev_cursor.
+    Raises: InvalidCursor for a malformed or foreign cursor
+    """
+    from models import Comment
+
+    if cursor:
+        key, row_id, _ = decode_cursor(cursor, COMMENT_SORT)
+        position = tuple_(key, row_id, types=[Comment.created_at.type, Comment.id.type])
+        query = query.filter(tuple_(Comment.created_at, Comment.id) < position)
+
+    rows = query.order_by(Comment.created_at.desc(), Comment.id.desc()).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    next_cursor = None
+    if more:
+        next_cursor = encode_cursor(COMMENT_SORT, rows[-1].created_at, rows[-1].id, 'next')
+    return KeysetPage(rows, next_cursor)
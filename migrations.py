@@ -0,0 +1,310 @@
+"""
+Migrations Module
+Versioned, idempotent schema migrations and an index health check
+"""
+import sys
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import (Table, Column, Integer, String, DateTime, MetaData, inspect, select,
+                        insert, text, func, desc, tuple_)
+
+
+# Kept out of db.metadata so db.create_all() never creates or drops it
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+MIGRATIONS = []
+
+
+def migration(version, description, transactional=True):
+    """
+    Register a migration step
+    Steps must be idempotent: on a fresh database db.create_all() has already
+    built every declared column and index before they run.
+    """
+    def decorator(func):
+        MIGRATIONS.append((version, description, transactional, func))
+        MIGRATIONS.sort(key=lambda step: step[0])
+        return func
+    return decorator
+
+
+def add_column(connection, table_name, column_name):
+    """Add a column declared on the models if the table lacks it; returns True when added"""
+    from models import db
+
+    existing = {col['name'] for col in inspect(connection).get_columns(table_name)}
+    if column_name in existing:
+        return False
+
+    col = db.metadata.tables[table_name].columns[column_name]
+    ddl = f"ALTER TABLE {table_name} ADD COLUMN {column_name} {col.type.compile(dialect=connection.dialect)}"
+    if col.server_default is not None:
+        ddl += f" DEFAULT {col.server_default.arg}"
+        if not col.nullable:
+            ddl += " NOT NULL"
+    connection.execute(text(ddl))
+    print(f"Added column {table_name}.{column_name}")
+    return True
+
+
+def create_index(connection, index_name):
+    """
+    Create an index declared on the models if it is missing
+    On PostgreSQL the build is CONCURRENTLY, so writes are not blocked; such
+    migrations must be registered with transactional=False.
+    """
+    from models import db
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name != index_name:
+                continue
+            if index_name in {ix['name'] for ix in inspect(connection).get_indexes(table.name)}:
+                return False
+            if connection.dialect.name == 'postgresql':
+                columns = ', '.join(col.name for col in index.columns)
+                unique = 'UNIQUE ' if index.unique else ''
+                connection.execute(text(f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS "
+                                        f"{index_name} ON {table.name} ({columns})"))
+            else:
+                index.create(connection, checkfirst=True)
+            print(f"Created index {index_name}")
+            return True
+    raise KeyError(f"Index {index_name} is not declared on any model")
+
+
+@migration(1, 'Published post counters on categories and tags')
+def add_published_post_counts(connection):
+    added = add_column(connection, 'category', 'published_post_count')
+    added = add_column(connection, 'tag', 'published_post_count') or added
+    create_index(connection, 'ix_category_published_post_count')
+    create_index(connection, 'ix_tag_published_post_count')
+    if added:
+        from post_counters import PostCounters
+        PostCounters.rebuild(connection)
+
+
+@migration(2, 'Favorite and tag listing indexes', transactional=False)
+def add_listing_indexes(connection):
+    create_index(connection, 'ix_favorite_user_created')
+    create_index(connection, 'ix_post_tags_tag_post')
+
+
+@migration(3, 'Hot-path post, comment and favorite indexes', transactional=False)
+def add_hot_path_indexes(connection):
+    for index_name in ('ix_blog_post_published_created', 'ix_blog_post_published_views',
+                       'ix_blog_post_category_published', 'ix_blog_post_user_created',
+                       'ix_comment_post_approved_created', 'ix_favorite_post'):
+        create_index(connection, index_name)
+
+
+@migration(4, 'Per-user stats rollup')
+def build_user_stats(connection):
+    # db.create_all() has created the user_stats table; fill it in
+    from user_stats import UserStatsRollup
+    UserStatsRollup.rebuild(connection)
+
+
+@migration(5, 'Precomputed related posts')
+def build_related_posts(connection):
+    # db.create_all() has created the related_post table; fill it in
+    from related_posts import related_index
+    related_index.rebuild(connection)
+
+
+@migration(6, 'Listing version stamp index', transactional=False)
+def add_updated_at_index(connection):
+    create_index(connection, 'ix_blog_post_updated_at')
+
+
+@migration(7, 'Comment counts on posts')
+def add_comment_counts(connection):
+    added = add_column(connection, 'blog_post', 'comment_count')
+    create_index(connection, 'ix_blog_post_comment_count')
+    if added:
+        from post_counters import PostCounters
+        PostCounters.rebuild_comment_counts(connection)
+
+
+@migration(8, 'Related-post term vectors and refresh queue')
+def build_related_vectors(connection):
+    # db.create_all() has created the related_term/related_vector tables; a
+    # rebuild fills them (and refreshes the lists they are scored with)
+    from related_posts import related_index
+    related_index.rebuild(connection)
+
+
+@migration(9, 'Post page versions')
+def add_post_versions(connection):
+    add_column(connection, 'blog_post', 'version')
+
+
+def current_version(connection):
+    """Highest applied migration version (0 for an unversioned database)"""
+    schema_version.create(connection, checkfirst=True)
+    return connection.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def pending_migrations(connection):
+    """Migrations newer than the database's version"""
+    version = current_version(connection)
+    return [step for step in MIGRATIONS if step[0] > version]
+
+
+def upgrade():
+    """Apply every pending migration in order; returns the versions applied"""
+    from models import db
+
+    with db.engine.begin() as connection:
+        pending = pending_migrations(connection)
+
+    applied = []
+    for version, description, transactional, step in pending:
+        if transactional:
+            with db.engine.begin() as connection:
+                step(connection)
+                connection.execute(insert(schema_version).values(
+                    version=version, description=description, applied_at=datetime.utcnow()))
+        else:
+            # Concurrent index builds can't run inside a transaction block
+            with db.engine.connect() as connection:
+                connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+                step(connection)
+                connection.execute(insert(schema_version).values(
+                    version=version, description=description, applied_at=datetime.utcnow()))
+        print(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+
+def hot_queries():
+    """Representative statements issued by the blueprints, for plan checks"""
+    from models import (BlogPost, Comment, Favorite, Category, SentimentJob, RelatedPost,
+                        RelatedVector, RelatedJob, post_tags)
+
+    return {
+        'all_posts (newest)': select(BlogPost.id).where(BlogPost.published == True)
+            .order_by(desc(BlogPost.created_at), desc(BlogPost.id)).limit(13),
+        'all_posts (popular)': select(BlogPost.id).where(BlogPost.published == True)
+            .order_by(desc(BlogPost.views), desc(BlogPost.id)).limit(13),
+        'category_posts': select(BlogPost.id)
+            .where(BlogPost.category_id == 1, BlogPost.published == True)
+            .order_by(desc(BlogPost.created_at), desc(BlogPost.id)).limit(13),
+        'my_posts': select(BlogPost.id).where(BlogPost.user_id == 1)
+            .order_by(desc(BlogPost.created_at), desc(BlogPost.id)).limit(11),
+        'favorites': select(BlogPost.id).join(Favorite, Favorite.post_id == BlogPost.id)
+            .where(Favorite.user_id == 1, BlogPost.published == True)
+            .order_by(desc(Favorite.created_at)).limit(10),
+        'tag_posts': select(BlogPost.id).join(post_tags, post_tags.c.post_id == BlogPost.id)
+            .where(post_tags.c.tag_id == 1, BlogPost.published == True)
+            .order_by(desc(BlogPost.created_at)).limit(12),
+        'view_post related': select(BlogPost.id).join(RelatedPost, RelatedPost.related_id == BlogPost.id)
+            .where(RelatedPost.post_id == 1, BlogPost.published == True)
+            .order_by(RelatedPost.rank).limit(3),
+        'listing version stamp': select(func.max(BlogPost.updated_at)),
+        'view_post comments': select(Comment.id).where(Comment.post_id == 1, Comment.approved == True)
+            .where(tuple_(Comment.created_at, Comment.id) < tuple_(func.current_timestamp(), 1000))
+            .order_by(desc(Comment.created_at), desc(Comment.id)).limit(21),
+        'favorite counts': select(Favorite.post_id, func.count(Favorite.id))
+            .where(Favorite.post_id.in_([1, 2, 3])).group_by(Favorite.post_id),
+        'index categories': select(Category.id)
+            .order_by(desc(Category.published_post_count), Category.name).limit(10),
+        'sentiment sweep': select(SentimentJob.post_id)
+            .where(SentimentJob.status == 'pending', SentimentJob.available_at <= func.current_timestamp())
+            .order_by(SentimentJob.available_at).limit(100),
+        'related term postings': select(RelatedVector.post_id).where(RelatedVector.term == 'python')
+            .order_by(desc(RelatedVector.weight)).limit(50),
+        'related refresh sweep': select(RelatedJob.post_id)
+            .where(RelatedJob.available_at <= func.current_timestamp())
+            .order_by(RelatedJob.available_at).limit(100),
+    }
+
+
+def explain(connection, stmt):
+    """
+    Return (plan lines, problems) for a statement
+    Problems are full table scans and sorts that no index satisfies.
+    """
+    sql = str(stmt.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    if connection.dialect.name == 'sqlite':
+        lines = [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        problems = [line for line in lines
+                    if (line.startswith('SCAN ') and 'USING' not in line)
+                    or 'TEMP B-TREE FOR ORDER BY' in line or 'TEMP B-TREE FOR GROUP BY' in line]
+    elif connection.dialect.name == 'postgresql':
+        lines = [row[0] for row in connection.execute(text(f"EXPLAIN {sql}"))]
+        problems = [line.strip() for line in lines if 'Seq Scan' in line]
+    else:
+        return [], []
+    return lines, problems
+
+
+def check_schema():
+    """
+    Compare the database against the models
+    Returns a dict with pending migrations, missing/undeclared indexes and
+    query plans that fall back to scans or temporary sorts.
+    """
+    from models import db
+
+    report = {'version': 0, 'pending': [], 'missing_indexes': [], 'undeclared_indexes': [], 'plans': {}}
+    with db.engine.connect() as connection:
+        report['version'] = current_version(connection)
+        report['pending'] = [(version, description) for version, description, _, _ in
+                             pending_migrations(connection)]
+
+        inspector = inspect(connection)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            actual = {ix['name'] for ix in inspector.get_indexes(table.name)}
+            declared = {index.name for index in table.indexes}
+            report['missing_indexes'] += [(table.name, name) for name in sorted(declared - actual)]
+            report['undeclared_indexes'] += [(table.name, name) for name in sorted(actual - declared)
+                                             if name and not name.startswith('sqlite_autoindex')]
+
+        for name, stmt in hot_queries().items():
+            report['plans'][name] = explain(connection, stmt)
+        connection.commit()
+    return report
+
+
+@click.command('db-upgrade')
+@with_appcontext
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    applied = upgrade()
+    click.echo(f"Applied {len(applied)} migration(s)." if applied else "Database is up to date.")
+
+
+@click.command('db-check')
+@click.option('--verbose', is_flag=True, help='Print every query plan, not just problems.')
+@with_appcontext
+def db_check_command(verbose):
+    """Report pending migrations, missing indexes and unindexed hot queries."""
+    report = check_schema()
+    failed = bool(report['pending'] or report['missing_indexes'])
+
+    click.echo(f"Schema version: {report['version']} (latest {MIGRATIONS[-1][0]})")
+    for version, description in report['pending']:
+        click.echo(f"  pending migration {version}: {description}")
+    for table_name, index_name in report['missing_indexes']:
+        click.echo(f"  missing index {index_name} on {table_name}")
+    for table_name, index_name in report['undeclared_indexes']:
+        click.echo(f"  undeclared index {index_name} on {table_name}")
+
+    for name, (lines, problems) in report['plans'].items():
+        if problems:
+            failed = True
+            click.echo(f"  {name}: {'; '.join(problems)}")
+        elif verbose:
+            click.echo(f"  {name}: {'; '.join(lines) or 'no plan available'}")
+
+    click.echo("Problems found." if failed else "All checks passed.")
+    sys.exit(1 if failed else 0)
@@ -1,5 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import func
+from sqlalchemy.orm import column_property
+from sqlalchemy.orm.attributes import set_committed_value
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
@@ -38,10 +41,15 @@ class User(UserMixin, db.Model):
         return f"{self.first_name} {self.last_name}"
 
     def get_favorite_posts(self):
-        """Get user's favorite posts safely"""
+        """Get user's favorite published posts safely, newest favorite first"""
+        from query_options import query_options
+
         try:
-            favorites = self.favorites.all()
-            return [fav.post for fav in favorites if fav.post and fav.post.published]
+            return BlogPost.query.join(Favorite, Favorite.post_id == BlogPost.id)\
+                                 .filter(Favorite.user_id == self.id, BlogPost.published == True)\
+                                 .options(*query_options.post_cards())\
+                                 .order_by(Favorite.created_at.desc())\
+                                 .all()
         except Exception as e:
             print(f"Error getting favorite posts: {e}")
             return []
@@ -61,6 +69,15 @@ class BlogPost(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     published = db.Column(db.Boolean, default=True)
     views = db.Column(db.Integer, default=0)
+    # Approved comments, maintained by PostCounters so pages never COUNT them
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
+    # Moves whenever the post page changes without its row being edited
+    # (tags, related posts); part of the page's ETag
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Opening of the body for cards of posts without a summary; list views
+    # load this instead of the full content
+    preview = column_property(func.substr(content, 1, 200), deferred=True)
 
     # AI Sentiment Analysis fields
     sentiment_score = db.Column(db.Float)  # -1 to 1 (negative to positive)
@@ -75,15 +92,28 @@ class BlogPost(db.Model):
     comments = db.relationship('Comment', backref='post', lazy='dynamic', cascade='all, delete-orphan')
     favorites = db.relationship('Favorite', backref='post', lazy='dynamic', cascade='all, delete-orphan')
     tags = db.relationship('Tag', secondary='post_tags', back_populates='posts')
+    sentiment_jobs = db.relationship('SentimentJob', backref='post', lazy='dynamic', cascade='all, delete-orphan')
+    related_jobs = db.relationship('RelatedJob', backref='post', lazy='dynamic', cascade='all, delete-orphan')
+
+    # Hot-path listing indexes (existing databases get them from migrations.py)
+    __table_args__ = (db.Index('ix_blog_post_published_created', 'published', 'created_at'),
+                      db.Index('ix_blog_post_published_views', 'published', 'views'),
+                      db.Index('ix_blog_post_category_published', 'category_id', 'published', 'created_at'),
+                      db.Index('ix_blog_post_user_created', 'user_id', 'created_at'),
+                      db.Index('ix_blog_post_updated_at', 'updated_at'))
 
     def increment_views(self):
-        """Increment post view count safely"""
+        """
+        Record a view through the write-behind counter
+        The stored count catches up on the next batch flush
+        """
+        from view_counter import view_counter
         try:
-            self.views = (self.views or 0) + 1
-            db.session.commit()
+            view_counter.increment(self.id)
+            # Show this view without dirtying the row (no per-view write)
+            set_committed_value(self, 'views', (self.views or 0) + 1)
         except Exception as e:
             print(f"Error incrementing views: {e}")
-            db.session.rollback()
 
     def get_sentiment_emoji(self):
         """Return emoji based on sentiment"""
@@ -91,23 +121,33 @@ class BlogPost(db.Model):
             return '😊'
         elif self.sentiment_label == 'negative':
             return '😔'
+        elif self.sentiment_label == 'pending':
+            return '⏳'
         else:
             return '😐'
 
     def get_favorite_count(self):
-        """Get number of favorites for this post safely"""
+        """Get number of favorites for this post safely (batched per request)"""
+        from favorite_loader import favorite_loader
         try:
-            return self.favorites.count()
+            count = favorite_loader.count(self)
+            if count is None:
+                count = self.favorites.count()
+            return count
         except Exception as e:
             print(f"Error getting favorite count: {e}")
             return 0
 
     def is_favorited_by(self, user):
-        """Check if post is favorited by specific user safely"""
+        """Check if post is favorited by specific user safely (batched per request)"""
+        from favorite_loader import favorite_loader
         if not user or not user.is_authenticated:
             return False
         try:
-            return self.favorites.filter_by(user_id=user.id).first() is not None
+            favorited = favorite_loader.is_favorited(self, user)
+            if favorited is None:
+                favorited = self.favorites.filter_by(user_id=user.id).first() is not None
+            return favorited
         except Exception as e:
             print(f"Error checking favorite status: {e}")
             return False
@@ -123,6 +163,9 @@ class Category(db.Model):
     description = db.Column(db.Text)
     color = db.Column(db.String(7), default='#007bff')  # Hex color
 
+    # Denormalized count of published posts, maintained by post_counters
+    published_post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
+
     # Relationships
     posts = db.relationship('BlogPost', backref='category', lazy='dynamic')
 
@@ -135,6 +178,9 @@ class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(30), unique=True, nullable=False)
 
+    # Denormalized count of published posts, maintained by post_counters
+    published_post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
+
     # Relationships
     posts = db.relationship('BlogPost', secondary='post_tags', back_populates='tags')
 
@@ -145,7 +191,9 @@ class Tag(db.Model):
 # Association table for many-to-many relationship between posts and tags
 post_tags = db.Table('post_tags',
                      db.Column('post_id', db.Integer, db.ForeignKey('blog_post.id'), primary_key=True),
-                     db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+                     db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+                     # The primary key covers post -> tags; this covers tag -> posts
+                     db.Index('ix_post_tags_tag_post', 'tag_id', 'post_id')
                      )
 
 
@@ -160,6 +208,8 @@ class Comment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('blog_post.id'), nullable=False)
 
+    __table_args__ = (db.Index('ix_comment_post_approved_created', 'post_id', 'approved', 'created_at'),)
+
     def __repr__(self):
         return f'<Comment {self.id}>'
 
@@ -173,8 +223,134 @@ class Favorite(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('blog_post.id'), nullable=False)
 
-    # Ensure unique user-post combinations
-    __table_args__ = (db.UniqueConstraint('user_id', 'post_id', name='unique_user_post_favorite'),)
+    # Ensure unique user-post combinations; index a user's favorites by recency
+    __table_args__ = (db.UniqueConstraint('user_id', 'post_id', name='unique_user_post_favorite'),
+                      db.Index('ix_favorite_user_created', 'user_id', 'created_at'),
+                      db.Index('ix_favorite_post', 'post_id'))
 
     def __repr__(self):
         return f'<Favorite User:{self.user_id} Post:{self.post_id}>'
+
+
+class UserStats(db.Model):
+    """Per-user activity rollup, maintained incrementally by user_stats"""
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    published_post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total_views = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    favorites_received = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    favorites_given = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def to_dict(self):
+        """Stats in the shape the dashboard, profile and home page templates use"""
+        return {
+            'total_posts': self.post_count,
+            'published_posts': self.published_post_count,
+            'total_views': self.total_views,
+            'total_favorites': self.favorites_given,
+            'favorites_received': self.favorites_received,
+            'total_comments': self.comment_count
+        }
+
+    def __repr__(self):
+        return f'<UserStats User:{self.user_id}>'
+
+
+class RelatedPost(db.Model):
+    """Precomputed related-posts neighbour of a post, maintained by related_posts"""
+    __tablename__ = 'related_post'
+    post_id = db.Column(db.Integer, db.ForeignKey('blog_post.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)  # 1 = most similar
+    related_id = db.Column(db.Integer, db.ForeignKey('blog_post.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+    # Finds the lists a post appears in when it is edited or deleted
+    __table_args__ = (db.Index('ix_related_post_related', 'related_id'),)
+
+    def __repr__(self):
+        return f'<RelatedPost {self.post_id} #{self.rank}: {self.related_id}>'
+
+
+class RelatedTerm(db.Model):
+    """Inverse document frequency of a term, snapshotted by the last related-posts rebuild"""
+    __tablename__ = 'related_term'
+    term = db.Column(db.String(64), primary_key=True)
+    idf = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<RelatedTerm {self.term}: {self.idf:.3f}>'
+
+
+class RelatedVector(db.Model):
+    """One of a published post's strongest TF-IDF terms, the postings scanned by incremental refreshes"""
+    __tablename__ = 'related_vector'
+    post_id = db.Column(db.Integer, db.ForeignKey('blog_post.id'), primary_key=True)
+    term = db.Column(db.String(64), primary_key=True)
+    weight = db.Column(db.Float, nullable=False)  # L2-normalized over the post's full vector
+
+    # A term's postings, strongest first (covering, so candidates never touch the table)
+    __table_args__ = (db.Index('ix_related_vector_term_weight', 'term', 'weight', 'post_id'),)
+
+    def __repr__(self):
+        return f'<RelatedVector {self.post_id} {self.term}: {self.weight:.3f}>'
+
+
+class RelatedJob(db.Model):
+    """Durable queue entry for refreshing a post's related lists in the background"""
+    __tablename__ = 'related_job'
+    post_id = db.Column(db.Integer, db.ForeignKey('blog_post.id'), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow)  # earliest time of the next attempt
+
+    __table_args__ = (db.Index('ix_related_job_available', 'available_at'),)
+
+    def __repr__(self):
+        return f'<RelatedJob Post:{self.post_id}>'
+
+
+class SentimentJob(db.Model):
+    """Durable queue entry for background sentiment analysis of a post"""
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow)  # earliest time of the next attempt
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Foreign keys (one job row per post, reused on every re-analysis)
+    post_id = db.Column(db.Integer, db.ForeignKey('blog_post.id'), nullable=False, unique=True)
+
+    __table_args__ = (db.Index('ix_sentiment_job_status_available', 'status', 'available_at'),)
+
+    def __repr__(self):
+        return f'<SentimentJob Post:{self.post_id} {self.status}>'
+
+
+class CorpusImport(db.Model):
+    """An export loaded by `flask import-data`, keyed by its header's exported_at stamp"""
+    __tablename__ = 'corpus_import'
+    id = db.Column(db.Integer, primary_key=True)
+    exported_at = db.Column(db.String(40), nullable=False, index=True)  # as written in the export header
+    status = db.Column(db.String(20), nullable=False, default='running')  # 'running', 'done'
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<CorpusImport {self.exported_at} {self.status}>'
+
+
+class SentimentCacheEntry(db.Model):
+    """Persisted sentiment result keyed by a hash of the analyzed text"""
+    __tablename__ = 'sentiment_cache'
+
+    content_hash = db.Column(db.String(64), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    label = db.Column(db.String(20), nullable=False)
+    confidence = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SentimentCacheEntry {self.content_hash[:12]} {self.label}>'
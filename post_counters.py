@@ -0,0 +1,141 @@
+"""
+Post Counters Module
+Maintains the denormalized published_post_count on categories and tags
+and comment_count on posts
+"""
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import update, select, func
+
+
+class PostCounters:
+    """Incremental maintenance of per-category and per-tag published post counts"""
+
+    @staticmethod
+    def snapshot(post):
+        """
+        Capture the counter-relevant state of a post
+        Take one before changing a post and one after flushing the change
+        """
+        return {
+            'user_id': post.user_id,
+            'published': bool(post.published),
+            'category_id': post.category_id,
+            'tag_ids': frozenset(tag.id for tag in post.tags if tag.id is not None)
+        }
+
+    @staticmethod
+    def _contribution(snapshot):
+        """Counter increments a post contributes while in the given state"""
+        categories, tags = {}, {}
+        if snapshot and snapshot['published']:
+            if snapshot['category_id']:
+                categories[snapshot['category_id']] = 1
+            for tag_id in snapshot['tag_ids']:
+                tags[tag_id] = 1
+        return categories, tags
+
+    @staticmethod
+    def apply(before, after):
+        """
+        Adjust counters for a post going from `before` to `after`
+        Pass None for `before` on create and for `after` on delete.
+        Runs inside the caller's transaction, so commit afterwards.
+        """
+        from models import db, Category, Tag
+
+        old_categories, old_tags = PostCounters._contribution(before)
+        new_categories, new_tags = PostCounters._contribution(after)
+
+        for model, old, new in ((Category, old_categories, new_categories),
+                                (Tag, old_tags, new_tags)):
+            for row_id in set(old) | set(new):
+                delta = new.get(row_id, 0) - old.get(row_id, 0)
+                if delta:
+                    db.session.execute(
+                        update(model)
+                        .where(model.id == row_id)
+                        .values(published_post_count=model.published_post_count + delta)
+                    )
+
+    @staticmethod
+    def adjust_comments(post_id, delta):
+        """
+        Move a post's approved comment count; runs in the caller's transaction
+        updated_at is pinned so a comment does not count as an edit of the post.
+        """
+        from models import db, BlogPost
+
+        db.session.execute(
+            update(BlogPost)
+            .where(BlogPost.id == post_id)
+            .values(comment_count=BlogPost.comment_count + delta, updated_at=BlogPost.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def rebuild_comment_counts(connection=None):
+        """Recompute every post's approved comment count (pass a connection inside migrations)"""
+        from models import db, BlogPost, Comment
+
+        comment_count = select(func.count(Comment.id))\
+            .where(Comment.post_id == BlogPost.id)\
+            .where(Comment.approved == True)\
+            .scalar_subquery()
+        # A recount is not an edit: keep updated_at from moving under its onupdate
+        stmt = update(BlogPost).values(comment_count=comment_count, updated_at=BlogPost.updated_at)\
+            .execution_options(synchronize_session=False)
+
+        if connection is not None:
+            connection.execute(stmt)
+            return
+        try:
+            db.session.execute(stmt)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error rebuilding comment counts: {e}")
+            raise
+
+    @staticmethod
+    def rebuild(connection=None):
+        """
+        Recompute every counter from the posts table
+        Pass a connection to run inside its transaction (used by migrations)
+        """
+        from models import db, BlogPost, Category, Tag, post_tags
+
+        try:
+            category_count = select(func.count(BlogPost.id))\
+                .where(BlogPost.category_id == Category.id)\
+                .where(BlogPost.published == True)\
+                .scalar_subquery()
+
+            tag_count = select(func.count(BlogPost.id))\
+                .join(post_tags, post_tags.c.post_id == BlogPost.id)\
+                .where(post_tags.c.tag_id == Tag.id)\
+                .where(BlogPost.published == True)\
+                .scalar_subquery()
+
+            if connection is not None:
+                connection.execute(update(Category).values(published_post_count=category_count))
+                connection.execute(update(Tag).values(published_post_count=tag_count))
+                return
+
+            db.session.execute(update(Category).values(published_post_count=category_count))
+            db.session.execute(update(Tag).values(published_post_count=tag_count))
+            db.session.commit()
+        except Exception as e:
+            if connection is None:
+                db.session.rollback()
+            print(f"Error rebuilding post counters: {e}")
+            raise
+
+
+@click.command('rebuild-counters')
+@with_appcontext
+def rebuild_counters_command():
+    """Recompute category and tag published post counts and post comment counts."""
+    PostCounters.rebuild()
+    PostCounters.rebuild_comment_counts()
+    click.echo('Category and tag post counters and post comment counts rebuilt.')
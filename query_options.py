@@ -0,0 +1,48 @@
+"""
+Query Options Module
+Loader strategies for every post and comment query the blueprints render
+"""
+from sqlalchemy.orm import defer, undefer, joinedload, selectinload
+
+
+class QueryOptions:
+    """
+    One place that decides how posts and comments load their relationships
+
+    Templates touch post.author, post.category and post.tags on every card
+    and comment.author on every comment; without these options each access
+    is a lazy single-row SELECT. Many-to-one relations on a single row are
+    joined into the main query; on listings they are loaded with one
+    SELECT ... IN per relationship, which keeps LIMIT/OFFSET paging correct
+    and avoids repeating author columns on every row.
+    """
+
+    def post_cards(self, with_tags=False):
+        """
+        Loader options for list views
+        Leaves the content column unloaded (cards show summary or preview) and
+        loads author and category - plus tags when asked - with one SELECT ... IN each.
+        """
+        from models import BlogPost
+
+        options = [defer(BlogPost.content), undefer(BlogPost.preview),
+                   selectinload(BlogPost.author), selectinload(BlogPost.category)]
+        if with_tags:
+            options.append(selectinload(BlogPost.tags))
+        return options
+
+    def post_detail(self):
+        """Loader options for a single post page: author and category joined, tags in one SELECT"""
+        from models import BlogPost
+
+        return [joinedload(BlogPost.author), joinedload(BlogPost.category), selectinload(BlogPost.tags)]
+
+    def comment_thread(self):
+        """Loader options for a post's comments: each comment's author joined in"""
+        from models import Comment
+
+        return [joinedload(Comment.author)]
+
+
+# Global instance
+query_options = QueryOptions()
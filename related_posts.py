@@ -0,0 +1,560 @@
+"""
+Related Posts Module
+Precomputes each post's nearest neighbours by tag overlap and text similarity
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from datetime import datetime
+from operator import itemgetter
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, insert, delete, func, or_, union_all
+from sqlalchemy.orm import defer
+from background_queue import BackgroundQueue
+
+# Required (requirements.txt) but imported on first use, as they add ~0.2s
+# to boot. The pure-Python scorer gives the same results and only remains as
+# a fallback: it is quadratic in the corpus and impractical at scale.
+np = None
+sparse = None
+_numpy_checked = False
+
+
+def numpy_available():
+    """Import NumPy/SciPy on first call; True when both are installed"""
+    global np, sparse, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            from scipy import sparse as scipy_sparse
+            np, sparse = numpy, scipy_sparse
+        except ImportError:
+            pass
+        _numpy_checked = True
+    return np is not None
+
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9']+")
+
+STOP_WORDS = frozenset("""
+    about above after again against all also and any are because been before being below between both
+    but can could did does doing down during each few for from further had has have having her here
+    hers herself him himself his how into its itself just more most myself nor not now off once only
+    other our ours ourselves out over own same she should some such than that the their theirs them
+    themselves then there these they this those through too under until very was were what when where
+    which while who whom why will with would you your yours yourself yourselves
+""".split())
+
+# Term-frequency multiplier per field: a shared title word says more than one in the body
+FIELD_WEIGHTS = (('title', 3), ('summary', 2), ('content', 1))
+
+# Width of the related_term/related_vector term columns
+MAX_TERM_LENGTH = 64
+
+# Cells of the dense score block scored at once by the NumPy backend
+BLOCK_CELLS = 4_000_000
+
+# Strongest terms stored per post in related_vector
+VECTOR_TERMS = 20
+
+# Candidates an incremental refresh takes from each term's postings and each tag
+CANDIDATES_PER_TERM = 50
+CANDIDATES_PER_TAG = 100
+
+# Ids per IN (...) list
+CHUNK_SIZE = 500
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    """Consecutive slices of a list"""
+    return (items[start:start + size] for start in range(0, len(items), size))
+
+
+class RelatedPostsIndex:
+    """
+    Top-N related posts per published post, stored in the related_post table
+
+    Similarity is a weighted sum of tag Jaccard overlap and TF-IDF cosine over
+    title, summary and content. Scoring is vectorized with SciPy sparse
+    matrices when NumPy/SciPy are installed and falls back to an inverted
+    index in pure Python otherwise.
+    """
+
+    def __init__(self):
+        """Initialize with default weights"""
+        self.top_n = 5
+        self.tag_weight = 0.4
+        self.min_score = 0.05
+
+    @property
+    def text_weight(self):
+        return 1.0 - self.tag_weight
+
+    def init_app(self, app):
+        """Read configuration"""
+        self.top_n = app.config.get('RELATED_POSTS_COUNT', 5)
+        self.tag_weight = app.config.get('RELATED_POSTS_TAG_WEIGHT', 0.4)
+        self.min_score = app.config.get('RELATED_POSTS_MIN_SCORE', 0.05)
+
+    @staticmethod
+    def tokenize(**fields):
+        """Weighted term counts for a post's title, summary and content"""
+        terms = Counter()
+        for name, weight in FIELD_WEIGHTS:
+            for token in TOKEN_PATTERN.findall((fields.get(name) or '').lower()):
+                if 2 < len(token) <= MAX_TERM_LENGTH and token not in STOP_WORDS:
+                    terms[token] += weight
+        return terms
+
+    def _load_corpus(self, executor):
+        """Published post ids with their term counts and tag sets, in id order"""
+        from models import BlogPost, post_tags
+
+        ids, docs = [], []
+        rows = executor.execute(
+            select(BlogPost.id, BlogPost.title, BlogPost.summary, BlogPost.content)
+            .where(BlogPost.published == True)
+            .order_by(BlogPost.id)
+            .execution_options(yield_per=500)
+        )
+        for post_id, title, summary, content in rows:
+            ids.append(post_id)
+            docs.append(self.tokenize(title=title, summary=summary, content=content))
+
+        position = {post_id: i for i, post_id in enumerate(ids)}
+        tag_sets = [set() for _ in ids]
+        for post_id, tag_id in executor.execute(select(post_tags.c.post_id, post_tags.c.tag_id)):
+            if post_id in position:
+                tag_sets[position[post_id]].add(tag_id)
+        return ids, docs, tag_sets
+
+    @staticmethod
+    def _idf(docs):
+        """Smoothed inverse document frequency of every term in the corpus"""
+        document_frequency = Counter()
+        for terms in docs:
+            document_frequency.update(terms.keys())
+
+        count = len(docs)
+        return {term: math.log((1 + count) / (1 + df)) + 1 for term, df in document_frequency.items()}
+
+    @staticmethod
+    def _weigh(terms, idf, unseen_idf=None):
+        """L2-normalized TF-IDF weights ({term: weight}) for one document"""
+        weights = {term: (1 + math.log(tf)) * idf.get(term, unseen_idf) for term, tf in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        return {term: weight / norm for term, weight in weights.items()}
+
+    def _vectorize(self, docs, idf):
+        """Weights for each document of the corpus idf was computed from"""
+        return [self._weigh(terms, idf) for terms in docs]
+
+    @staticmethod
+    def _vector_rows(post_id, vector):
+        """related_vector rows for a post's strongest terms"""
+        return [{'post_id': post_id, 'term': term, 'weight': weight}
+                for term, weight in heapq.nlargest(VECTOR_TERMS, vector.items(), key=itemgetter(1))]
+
+    def _score_rows(self, vectors, tag_sets, rows, limit=None):
+        """
+        Yield (row, [(column, score), ...]) for each requested row
+        Only candidates at or above min_score are returned; `limit` keeps the
+        best ones per row (None keeps them all).
+        """
+        if numpy_available():
+            return self._score_rows_numpy(vectors, tag_sets, rows, limit)
+        return self._score_rows_python(vectors, tag_sets, rows, limit)
+
+    def _score_rows_numpy(self, vectors, tag_sets, rows, limit):
+        """Score rows in blocks with sparse matrix products"""
+        def incidence(rows_of_items, value):
+            columns, indptr, indices, data = {}, [0], [], []
+            for items in rows_of_items:
+                for item in items:
+                    indices.append(columns.setdefault(item, len(columns)))
+                    data.append(value(items, item))
+                indptr.append(len(indices))
+            shape = (len(rows_of_items), max(len(columns), 1))
+            return sparse.csr_matrix((np.asarray(data, dtype=np.float64), indices, indptr), shape=shape)
+
+        text = incidence(vectors, lambda vector, term: vector[term])
+        tags = incidence(tag_sets, lambda tag_ids, tag_id: 1.0)
+        text_t = text.T.tocsr()
+        tags_t = tags.T.tocsr()
+        tag_counts = np.asarray(tags.sum(axis=1)).ravel()
+
+        rows = np.asarray(list(rows), dtype=np.int64)
+        block_size = max(1, BLOCK_CELLS // max(len(vectors), 1))
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            cosine = (text[block] @ text_t).toarray()
+            overlap = (tags[block] @ tags_t).toarray()
+            union = tag_counts[block][:, None] + tag_counts[None, :] - overlap
+            jaccard = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+            scores = self.text_weight * cosine + self.tag_weight * jaccard
+            scores[np.arange(len(block)), block] = 0.0
+
+            for offset, row in enumerate(block):
+                row_scores = scores[offset]
+                columns = np.flatnonzero(row_scores >= self.min_score)
+                if limit is not None and len(columns) > limit:
+                    columns = columns[np.argpartition(row_scores[columns], -limit)[-limit:]]
+                yield int(row), [(int(column), float(row_scores[column])) for column in columns]
+
+    def _score_rows_python(self, vectors, tag_sets, rows, limit):
+        """Score rows by walking inverted term and tag postings"""
+        postings = defaultdict(list)
+        for column, vector in enumerate(vectors):
+            for term, weight in vector.items():
+                postings[term].append((column, weight))
+        tag_postings = defaultdict(list)
+        for column, tag_ids in enumerate(tag_sets):
+            for tag_id in tag_ids:
+                tag_postings[tag_id].append(column)
+
+        for row in rows:
+            cosine = defaultdict(float)
+            for term, weight in vectors[row].items():
+                for column, other_weight in postings[term]:
+                    cosine[column] += weight * other_weight
+            overlap = Counter()
+            for tag_id in tag_sets[row]:
+                overlap.update(tag_postings[tag_id])
+
+            candidates = []
+            for column in set(cosine) | set(overlap):
+                if column == row:
+                    continue
+                union = len(tag_sets[row]) + len(tag_sets[column]) - overlap[column]
+                jaccard = overlap[column] / union if union else 0.0
+                score = self.text_weight * cosine.get(column, 0.0) + self.tag_weight * jaccard
+                if score >= self.min_score:
+                    candidates.append((column, score))
+            if limit is not None:
+                candidates = heapq.nlargest(limit, candidates, key=lambda candidate: candidate[1])
+            yield row, candidates
+
+    def _top(self, neighbours):
+        """Best top_n (post_id, score) pairs, ties broken by post id"""
+        return sorted(neighbours, key=lambda pair: (-pair[1], pair[0]))[:self.top_n]
+
+    @staticmethod
+    def _list_rows(post_id, neighbours):
+        """related_post rows for one post's ranked neighbour list"""
+        return [{'post_id': post_id, 'rank': rank, 'related_id': related_id, 'score': round(score, 6)}
+                for rank, (related_id, score) in enumerate(neighbours, 1)]
+
+    def for_post(self, post_id, limit=3):
+        """A post's precomputed related posts, most similar first"""
+        from models import BlogPost, RelatedPost
+
+        # The sidebar shows title, date and sentiment only
+        return BlogPost.query.options(defer(BlogPost.content))\
+                             .join(RelatedPost, RelatedPost.related_id == BlogPost.id)\
+                             .filter(RelatedPost.post_id == post_id, BlogPost.published == True)\
+                             .order_by(RelatedPost.rank)\
+                             .limit(limit).all()
+
+    def remove_post(self, post_id, executor=None):
+        """
+        Drop a post's own list, its appearances in other lists and its stored vector
+        Runs inside the caller's transaction (used when deleting a post).
+        Returns the ids of the posts whose lists it appeared in.
+        """
+        from models import db, RelatedPost, RelatedVector
+
+        executor = executor or db.session
+        containing = executor.execute(
+            select(RelatedPost.post_id).where(RelatedPost.related_id == post_id)
+        ).scalars().all()
+        executor.execute(
+            delete(RelatedPost).where(or_(RelatedPost.post_id == post_id, RelatedPost.related_id == post_id))
+        )
+        executor.execute(delete(RelatedVector).where(RelatedVector.post_id == post_id))
+        return containing
+
+    def _post_vector(self, post):
+        """A post's TF-IDF weights against the IDF snapshot of the last rebuild"""
+        from models import db, BlogPost, RelatedTerm
+
+        terms = self.tokenize(title=post.title, summary=post.summary, content=post.content)
+        idf = {}
+        for chunk in _chunks(list(terms)):
+            idf.update(db.session.execute(
+                select(RelatedTerm.term, RelatedTerm.idf).where(RelatedTerm.term.in_(chunk))
+            ).all())
+
+        # A term new since the rebuild is weighted as if only this post used it
+        published = db.session.execute(
+            select(func.count(BlogPost.id)).where(BlogPost.published == True)
+        ).scalar() or 1
+        return self._weigh(terms, idf, math.log((1 + published) / 2) + 1)
+
+    def _score_candidates(self, post_id, vector, tag_ids):
+        """
+        {post_id: score} at or above min_score for the posts sharing a term or tag
+        Candidates are the strongest postings of the post's top terms and the
+        newest published posts of each of its tags; only they are scored.
+        """
+        from models import db, BlogPost, RelatedVector, post_tags
+
+        postings = [
+            select(RelatedVector.post_id).where(RelatedVector.term == term)
+            .order_by(RelatedVector.weight.desc()).limit(CANDIDATES_PER_TERM)
+            for term, _ in heapq.nlargest(VECTOR_TERMS, vector.items(), key=itemgetter(1))
+        ] + [
+            select(post_tags.c.post_id).join(BlogPost, BlogPost.id == post_tags.c.post_id)
+            .where(post_tags.c.tag_id == tag_id, BlogPost.published == True)
+            .order_by(post_tags.c.post_id.desc()).limit(CANDIDATES_PER_TAG)
+            for tag_id in sorted(tag_ids)
+        ]
+        if not postings:
+            return {}
+        # One round trip: each term's or tag's limited postings, concatenated
+        subqueries = [stmt.subquery() for stmt in postings]
+        candidates = set(db.session.execute(
+            union_all(*(select(subquery.c.post_id) for subquery in subqueries))
+        ).scalars())
+        candidates.discard(post_id)
+
+        cosine, tag_sets = defaultdict(float), defaultdict(set)
+        for chunk in _chunks(sorted(candidates)):
+            for other_id, term, weight in db.session.execute(
+                select(RelatedVector.post_id, RelatedVector.term, RelatedVector.weight)
+                .where(RelatedVector.post_id.in_(chunk))
+            ):
+                cosine[other_id] += vector.get(term, 0.0) * weight
+            for other_id, tag_id in db.session.execute(
+                select(post_tags.c.post_id, post_tags.c.tag_id).where(post_tags.c.post_id.in_(chunk))
+            ):
+                tag_sets[other_id].add(tag_id)
+
+        scores = {}
+        for other_id in candidates:
+            overlap = len(tag_ids & tag_sets[other_id])
+            union = len(tag_ids) + len(tag_sets[other_id]) - overlap
+            jaccard = overlap / union if union else 0.0
+            score = self.text_weight * cosine[other_id] + self.tag_weight * jaccard
+            if score >= self.min_score:
+                scores[other_id] = score
+        return scores
+
+    def refresh_post(self, post_id):
+        """
+        Recompute one post's neighbours after it was created or edited
+        The post is scored only against the candidates of _score_candidates,
+        using the stored vectors (each post's strongest terms) and IDF of the
+        last rebuild. It is also slotted into (or out of) the lists of posts
+        it is now similar to. Lists it drops out of keep one slot short until
+        the next rebuild-related; that only ever hides a weak neighbour.
+        Returns the ids of the posts whose lists changed, its own first;
+        their page versions are moved in the same transaction.
+        """
+        from models import db, BlogPost, RelatedPost, RelatedVector, post_tags
+        from conditional_get import conditional_get
+
+        # Write first, so a delete or edit of the post cannot commit between
+        # this read and the lists written below (SQLite takes its write lock
+        # here; other databases lock the row)
+        db.session.execute(delete(RelatedVector).where(RelatedVector.post_id == post_id))
+        post = db.session.execute(
+            select(BlogPost.title, BlogPost.summary, BlogPost.content, BlogPost.published)
+            .where(BlogPost.id == post_id).with_for_update()
+        ).first()
+        if post is None or not post.published:
+            # Unpublished: it neither has nor appears in related lists
+            changed = [post_id] + self.remove_post(post_id)
+            conditional_get.touch_posts(changed)
+            db.session.commit()
+            return changed
+
+        vector = self._post_vector(post)
+        tag_ids = set(db.session.execute(
+            select(post_tags.c.tag_id).where(post_tags.c.post_id == post_id)
+        ).scalars())
+        scores = self._score_candidates(post_id, vector, tag_ids)
+
+        containing = set(db.session.execute(
+            select(RelatedPost.post_id).where(RelatedPost.related_id == post_id)
+        ).scalars())
+        lists = defaultdict(list)
+        for chunk in _chunks(sorted(set(scores) | containing)):
+            for other_id, related_id, score in db.session.execute(
+                select(RelatedPost.post_id, RelatedPost.related_id, RelatedPost.score)
+                .where(RelatedPost.post_id.in_(chunk))
+            ):
+                lists[other_id].append((related_id, score))
+
+        # A post enters another post's list if it beats that list's weakest entry
+        entering = {other_id for other_id, score in scores.items()
+                    if len(lists[other_id]) < self.top_n or score > min(s for _, s in lists[other_id])}
+        affected = sorted((entering | containing) - {post_id})
+
+        rows = self._list_rows(post_id, self._top(scores.items()))
+        for other_id in affected:
+            neighbours = [(related_id, score) for related_id, score in lists[other_id] if related_id != post_id]
+            if other_id in entering:
+                neighbours.append((post_id, scores[other_id]))
+            rows += self._list_rows(other_id, self._top(neighbours))
+
+        for chunk in _chunks([post_id] + affected):
+            db.session.execute(delete(RelatedPost).where(RelatedPost.post_id.in_(chunk)))
+        if rows:
+            db.session.execute(insert(RelatedPost), rows)
+        vector_rows = self._vector_rows(post_id, vector)
+        if vector_rows:
+            db.session.execute(insert(RelatedVector), vector_rows)
+        conditional_get.touch_posts([post_id] + affected)
+        db.session.commit()
+        return [post_id] + affected
+
+    def rebuild(self, connection=None):
+        """
+        Recompute every post's related list from scratch
+        Also stores the term vectors and IDF that refresh_post scores against.
+        Pass a connection to run inside its transaction (used by migrations)
+        """
+        from models import db, RelatedPost, RelatedTerm, RelatedVector
+
+        executor = connection if connection is not None else db.session
+        try:
+            ids, docs, tag_sets = self._load_corpus(executor)
+            idf = self._idf(docs)
+            vectors = self._vectorize(docs, idf)
+            rows = []
+            for row, candidates in self._score_rows(vectors, tag_sets, range(len(ids)), self.top_n):
+                rows += self._list_rows(ids[row], self._top((ids[column], score) for column, score in candidates))
+
+            executor.execute(delete(RelatedPost))
+            if rows:
+                executor.execute(insert(RelatedPost), rows)
+
+            executor.execute(delete(RelatedVector))
+            for chunk in _chunks(range(len(ids))):
+                vector_rows = [row for i in chunk for row in self._vector_rows(ids[i], vectors[i])]
+                if vector_rows:
+                    executor.execute(insert(RelatedVector), vector_rows)
+            executor.execute(delete(RelatedTerm))
+            for chunk in _chunks(sorted(idf.items()), 5000):
+                executor.execute(insert(RelatedTerm), [{'term': term, 'idf': value} for term, value in chunk])
+
+            if connection is None:
+                db.session.commit()
+            return len(ids)
+        except Exception as e:
+            if connection is None:
+                db.session.rollback()
+            print(f"Error rebuilding related posts: {e}")
+            raise
+
+
+class RelatedRefreshQueue(BackgroundQueue):
+    """
+    Durable background queue for incremental related-posts refreshes
+    Saving a post records a related_job row in the same transaction; a
+    worker runs refresh_post once it is committed. A job is claimed by
+    deleting its row, so a refresh cut short by a crash is only caught up
+    by the next rebuild-related.
+    """
+
+    config_prefix = 'RELATED'
+    label = 'Related posts'
+    default_workers = 1
+
+    def enqueue(self, post):
+        """
+        Record a durable refresh job for a post
+        Runs inside the caller's transaction; call submit() after committing
+        """
+        from models import db, RelatedJob
+
+        job = db.session.get(RelatedJob, post.id)
+        if job is None:
+            job = RelatedJob(post_id=post.id)
+            db.session.add(job)
+        job.attempts = 0
+        job.available_at = datetime.utcnow()
+
+    def process(self, post_id):
+        """Claim and run the refresh for a post; returns True when it completed"""
+        from models import db, RelatedJob
+        from fragment_cache import fragment_cache
+
+        with self.app.app_context():
+            attempts = None
+            try:
+                job = db.session.execute(
+                    select(RelatedJob.attempts, RelatedJob.available_at).where(RelatedJob.post_id == post_id)
+                ).first()
+                if job is None or job.available_at > datetime.utcnow():
+                    return False
+                # A save that re-queued the post since the read moved available_at
+                claimed = db.session.execute(
+                    delete(RelatedJob)
+                    .where(RelatedJob.post_id == post_id, RelatedJob.available_at == job.available_at)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                db.session.commit()
+                if not claimed:
+                    return False
+
+                attempts = job.attempts + 1
+                changed = related_index.refresh_post(post_id)
+                fragment_cache.bump(*(f'post:{other_id}' for other_id in changed))
+                return True
+            except Exception as e:
+                db.session.rollback()
+                print(f"Related posts refresh for post {post_id} failed: {e}")
+                if attempts is not None:
+                    self._record_failure(post_id, attempts)
+                return False
+            finally:
+                db.session.remove()
+
+    def _record_failure(self, post_id, attempts):
+        """Schedule a retry with linear backoff, or give up after max attempts"""
+        from models import db, RelatedJob
+
+        if attempts >= self.max_attempts:
+            print(f"Giving up on related posts for post {post_id} until the next rebuild-related")
+            return
+        try:
+            # A save since the claim has already queued a fresh job
+            if db.session.get(RelatedJob, post_id) is None:
+                db.session.add(RelatedJob(post_id=post_id, attempts=attempts, available_at=self.retry_at(attempts)))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error recording related posts job failure: {e}")
+
+    def due_jobs(self, limit):
+        """Jobs whose retry time has come, oldest first"""
+        from models import db, RelatedJob
+
+        return db.session.execute(
+            select(RelatedJob.post_id)
+            .where(RelatedJob.available_at <= datetime.utcnow())
+            .order_by(RelatedJob.available_at)
+            .limit(limit)
+        ).scalars().all()
+
+
+# Global instances
+related_index = RelatedPostsIndex()
+related_queue = RelatedRefreshQueue()
+
+
+@click.command('rebuild-related')
+@with_appcontext
+def rebuild_related_command():
+    """Recompute the related-posts table for every published post."""
+    from fragment_cache import fragment_cache
+    from conditional_get import conditional_get
+
+    count = related_index.rebuild()
+    conditional_get.touch_all_posts()
+    fragment_cache.bump('related')
+    backend = 'NumPy/SciPy' if numpy_available() else 'pure Python - install requirements.txt for NumPy/SciPy'
+    click.echo(f'Related posts rebuilt for {count} posts ({backend}).')
@@ -0,0 +1,168 @@
+"""
+Full-Text Search Module
+Keeps an SQLite FTS5 inverted index of published posts for BM25-ranked search
+"""
+import re
+from sqlalchemy import select, table, column, text, desc, or_, false
+
+
+class SearchIndex:
+    """FTS5-backed search index for blog posts"""
+
+    TABLE_NAME = 'post_search'
+
+    # bm25() column weights: title, summary, content
+    RANK_EXPRESSION = 'bm25(post_search, 10.0, 5.0, 1.0)'
+
+    def __init__(self):
+        """Initialize the search index"""
+        self.available = False
+        self._table = table(self.TABLE_NAME, column('rowid'))
+
+    def detect(self):
+        """Use the FTS5 table if it already exists, without creating or backfilling it"""
+        from models import db
+
+        self.available = False
+        if db.engine.dialect.name != 'sqlite':
+            return
+        try:
+            self.available = db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': self.TABLE_NAME}
+            ).first() is not None
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error checking search index: {e}")
+        if not self.available:
+            print("Full-text index missing - run `flask init-db`; falling back to LIKE search")
+
+    def ensure_index(self):
+        """Create the FTS5 table if needed and backfill it when empty"""
+        from models import db
+
+        self.available = False
+        if db.engine.dialect.name != 'sqlite':
+            print("Full-text index requires SQLite - falling back to LIKE search")
+            return
+
+        try:
+            db.session.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.TABLE_NAME} "
+                "USING fts5(title, summary, content, tokenize='porter unicode61')"
+            ))
+            is_empty = db.session.execute(
+                text(f"SELECT 1 FROM {self.TABLE_NAME} LIMIT 1")
+            ).first() is None
+            db.session.commit()
+            self.available = True
+
+            if is_empty:
+                self.rebuild()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating search index: {e}")
+
+    def rebuild(self):
+        """Re-index every published post from scratch"""
+        from models import db
+
+        if not self.available:
+            return
+        try:
+            db.session.execute(text(f"DELETE FROM {self.TABLE_NAME}"))
+            db.session.execute(text(
+                f"INSERT INTO {self.TABLE_NAME}(rowid, title, summary, content) "
+                "SELECT id, title, coalesce(summary, ''), content FROM blog_post WHERE published = 1"
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error rebuilding search index: {e}")
+
+    def index_post(self, post):
+        """
+        Add or refresh a post in the index
+        Runs inside the caller's transaction, so commit afterwards
+        """
+        from models import db
+
+        if not self.available or post.id is None:
+            return
+
+        self.remove_post(post.id)
+        if post.published:
+            db.session.execute(
+                text(f"INSERT INTO {self.TABLE_NAME}(rowid, title, summary, content) "
+                     "VALUES (:id, :title, :summary, :content)"),
+                {'id': post.id, 'title': post.title or '',
+                 'summary': post.summary or '', 'content': post.content or ''}
+            )
+
+    def remove_post(self, post_id):
+        """Remove a post from the index (caller commits)"""
+        from models import db
+
+        if not self.available:
+            return
+        db.session.execute(text(f"DELETE FROM {self.TABLE_NAME} WHERE rowid = :id"),
+                           {'id': post_id})
+
+    @staticmethod
+    def build_match_expression(query):
+        """
+        Turn free-form user input into a safe FTS5 MATCH expression
+        Every word becomes a quoted prefix term, so FTS syntax in the input is ignored
+        """
+        terms = re.findall(r'\w+', (query or '').lower())
+        return ' '.join(f'"{term}"*' for term in terms[:20])
+
+    def search(self, query, category_id=0, page=1, per_page=12):
+        """
+        Search published posts
+        Returns: Flask-SQLAlchemy pagination ordered by BM25 relevance
+        """
+        from models import db, BlogPost
+        from query_options import query_options
+
+        if not self.available:
+            return self._search_with_like(query, category_id, page, per_page)
+
+        match = self.build_match_expression(query)
+        if not match:
+            return db.paginate(select(BlogPost).where(false()), page=page,
+                               per_page=per_page, error_out=False)
+
+        stmt = select(BlogPost).options(*query_options.post_cards())\
+            .join(self._table, self._table.c.rowid == BlogPost.id)\
+            .where(text(f"{self.TABLE_NAME} MATCH :match").bindparams(match=match))\
+            .where(BlogPost.published == True)
+
+        if category_id > 0:
+            stmt = stmt.where(BlogPost.category_id == category_id)
+
+        stmt = stmt.order_by(text(self.RANK_EXPRESSION))
+        return db.paginate(stmt, page=page, per_page=per_page, error_out=False)
+
+    def _search_with_like(self, query, category_id, page, per_page):
+        """Substring search used when FTS5 is not available"""
+        from models import db, BlogPost
+        from query_options import query_options
+
+        stmt = select(BlogPost).options(*query_options.post_cards()).where(BlogPost.published == True).where(
+            or_(
+                BlogPost.title.contains(query),
+                BlogPost.content.contains(query),
+                BlogPost.summary.contains(query)
+            )
+        )
+        if category_id > 0:
+            stmt = stmt.where(BlogPost.category_id == category_id)
+
+        stmt = stmt.order_by(desc(BlogPost.created_at))
+        return db.paginate(stmt, page=page, per_page=per_page, error_out=False)
+
+
+# Global instance
+search_index = SearchIndex()
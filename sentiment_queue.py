@@ -0,0 +1,308 @@
+"""
+Sentiment Queue Module
+Runs sentiment analysis for new and edited posts on a background worker pool
+"""
+import time
+from datetime import datetime, timedelta
+from itertools import islice, tee
+import click
+from flask import session, flash, has_request_context
+from flask.cli import with_appcontext
+from sqlalchemy import update, select, bindparam, or_
+from fragment_cache import fragment_cache
+from background_queue import BackgroundQueue
+
+
+class SentimentQueue(BackgroundQueue):
+    """
+    Durable background queue for post sentiment analysis
+    Jobs live in the sentiment_job table; a job whose worker died is
+    recovered once it has been running for stale_after seconds.
+    """
+
+    config_prefix = 'SENTIMENT'
+    label = 'Sentiment'
+    default_workers = 2
+
+    def __init__(self):
+        """Initialize the queue"""
+        super().__init__()
+        self.stale_after = 300
+
+    def enqueue(self, post):
+        """
+        Mark a post as pending analysis and record a durable job for it
+        Runs inside the caller's transaction; call submit() after committing
+        """
+        from models import db, SentimentJob
+
+        post.sentiment_label = 'pending'
+        post.sentiment_score = None
+        post.sentiment_confidence = None
+
+        job = SentimentJob.query.filter_by(post_id=post.id).first()
+        if job is None:
+            job = SentimentJob(post_id=post.id)
+            db.session.add(job)
+        job.status = 'pending'
+        job.attempts = 0
+        job.last_error = None
+        job.available_at = datetime.utcnow()
+
+    def submit(self, post_id, insight_prefix='AI Insight'):
+        """
+        Hand a committed job to the workers
+        The post is remembered in the user's session so its insights can be
+        flashed once the analysis has finished.
+        """
+        if has_request_context():
+            pending = session.get('sentiment_pending', {})
+            pending[str(post_id)] = insight_prefix
+            session['sentiment_pending'] = pending
+
+        super().submit(post_id)
+
+    def flash_ready_insights(self, post):
+        """Flash insights for a post the current user just saved, once analyzed"""
+        from ai_sentiment import sentiment_analyzer
+
+        pending = session.get('sentiment_pending', {})
+        key = str(post.id)
+        if key not in pending:
+            return
+        if post.sentiment_label == 'pending':
+            flash('AI sentiment analysis is still running - insights will appear shortly.', 'info')
+            return
+
+        prefix = pending.pop(key)
+        session['sentiment_pending'] = pending
+        if post.sentiment_score is None:
+            return
+
+        sentiment_data = {
+            'score': post.sentiment_score,
+            'label': post.sentiment_label,
+            'confidence': post.sentiment_confidence
+        }
+        for insight in sentiment_analyzer.get_sentiment_insights(sentiment_data):
+            flash(f"{prefix}: {insight}", 'info')
+
+    def process(self, post_id):
+        """Claim and run the job for a post; returns True when it completed"""
+        from models import db, BlogPost, SentimentJob, RelatedPost
+        from ai_sentiment import sentiment_analyzer
+        from conditional_get import conditional_get
+
+        with self.app.app_context():
+            now = datetime.utcnow()
+            claimed = db.session.execute(
+                update(SentimentJob)
+                .where(SentimentJob.post_id == post_id)
+                .where(SentimentJob.status == 'pending')
+                .where(SentimentJob.available_at <= now)
+                .values(status='running', attempts=SentimentJob.attempts + 1, updated_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not claimed:
+                db.session.commit()
+                return False
+            attempts = db.session.execute(
+                select(SentimentJob.attempts).where(SentimentJob.post_id == post_id)
+            ).scalar()
+            db.session.commit()
+            # Still this claim: not re-queued by an edit or recovered by a sweep since
+            this_claim = (SentimentJob.post_id == post_id, SentimentJob.status == 'running',
+                          SentimentJob.attempts == attempts, SentimentJob.updated_at == now)
+
+            try:
+                post = db.session.get(BlogPost, post_id)
+                result = None
+                if post is not None:
+                    result = sentiment_analyzer.analyze_sentiment(f"{post.title} {post.content}")
+                # End the read before writing: SQLite can't upgrade a snapshot
+                # that an edit has committed past
+                db.session.commit()
+
+                finished = db.session.execute(
+                    update(SentimentJob).where(*this_claim)
+                    .values(status='done', last_error=None)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                if not finished:
+                    # The text changed while it was scored; the new job scores it
+                    db.session.rollback()
+                    return False
+
+                if post is not None:
+                    post.sentiment_score = result['score']
+                    post.sentiment_label = result['label']
+                    post.sentiment_confidence = result['confidence']
+                    # Related-post sidebars listing it show its sentiment badge
+                    containing = db.session.execute(
+                        select(RelatedPost.post_id).where(RelatedPost.related_id == post_id)
+                    ).scalars().all()
+                    conditional_get.touch_posts(containing)
+                db.session.commit()
+                if post is not None:
+                    fragment_cache.bump_post(post)
+                    fragment_cache.bump(*(f'post:{other_id}' for other_id in containing))
+                return True
+            except Exception as e:
+                db.session.rollback()
+                print(f"Sentiment job for post {post_id} failed: {e}")
+                self._record_failure(post_id, attempts, str(e))
+                return False
+            finally:
+                db.session.remove()
+
+    def _record_failure(self, post_id, attempts, error):
+        """Schedule a retry with linear backoff, or give up after max attempts"""
+        from models import db, BlogPost, SentimentJob
+
+        try:
+            job = SentimentJob.query.filter_by(post_id=post_id).first()
+            if job is None or job.status != 'running' or job.attempts != attempts:
+                # Re-queued since the claim; the new job runs on its own
+                db.session.rollback()
+                return
+            job.last_error = error[:1000]
+            if job.attempts >= self.max_attempts:
+                job.status = 'failed'
+                db.session.execute(
+                    update(BlogPost).where(BlogPost.id == post_id)
+                    .where(BlogPost.sentiment_label == 'pending')
+                    .values(sentiment_label=None)
+                    .execution_options(synchronize_session=False)
+                )
+            else:
+                job.status = 'pending'
+                job.available_at = self.retry_at(job.attempts)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error recording sentiment job failure: {e}")
+
+    def recover(self):
+        """Return jobs running for longer than stale_after to pending"""
+        from models import db, SentimentJob
+
+        now = datetime.utcnow()
+        db.session.execute(
+            update(SentimentJob)
+            .where(SentimentJob.status == 'running')
+            .where(SentimentJob.updated_at < now - timedelta(seconds=self.stale_after))
+            .values(status='pending', available_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def due_jobs(self, limit):
+        """Pending jobs whose retry time has come, oldest first"""
+        from models import db, SentimentJob
+
+        return db.session.execute(
+            select(SentimentJob.post_id)
+            .where(SentimentJob.status == 'pending')
+            .where(SentimentJob.available_at <= datetime.utcnow())
+            .order_by(SentimentJob.available_at)
+            .limit(limit)
+        ).scalars().all()
+
+
+# Global instance
+sentiment_queue = SentimentQueue()
+
+
+def backfill_sentiment(rescore=False, batch_size=500, processes=None, report=None):
+    """
+    Score posts in bulk, reading keyset pages and writing bulk UPDATEs
+    Args:
+        rescore: rescore every post instead of only unscored/pending ones,
+            bypassing cached results so analyzer changes take effect
+        batch_size: rows per page and per UPDATE batch
+        processes: worker processes passed to SentimentAnalyzer.analyze_many
+        report: optional callback(done, elapsed_seconds) after each batch
+    Returns: (posts scored, elapsed seconds)
+    """
+    from models import db, BlogPost, SentimentJob
+    from ai_sentiment import sentiment_analyzer
+
+    posts = BlogPost.__table__
+    jobs = SentimentJob.__table__
+
+    stmt = select(posts.c.id, posts.c.category_id, posts.c.title, posts.c.content)\
+        .order_by(posts.c.id).limit(batch_size)
+    if not rescore:
+        stmt = stmt.where(or_(posts.c.sentiment_score.is_(None), posts.c.sentiment_label == 'pending'))
+
+    # A rescore is not an edit: keep updated_at from moving under its onupdate
+    update_posts = update(posts).where(posts.c.id == bindparam('b_id')).values(
+        sentiment_score=bindparam('b_score'),
+        sentiment_label=bindparam('b_label'),
+        sentiment_confidence=bindparam('b_confidence'),
+        updated_at=posts.c.updated_at
+    )
+    finish_jobs = update(jobs).where(jobs.c.post_id == bindparam('b_id'))\
+        .where(jobs.c.status == 'pending').values(status='done', last_error=None)
+
+    def pages():
+        # Each page is fetched in full on the session's connection, so no
+        # open cursor or stale snapshot sits between the batch writes (the
+        # persistent sentiment cache writes through the same session)
+        last_id = 0
+        while True:
+            page = db.session.execute(stmt.where(posts.c.id > last_id)).all()
+            if not page:
+                return
+            yield from page
+            last_id = page[-1].id
+
+    done = 0
+    started = time.perf_counter()
+    results = None
+    try:
+        # One analyze_many call (and one worker pool) for the whole stream; tee
+        # only buffers the rows scored ahead of the batch being written
+        row_stream, text_stream = tee(pages())
+        results = sentiment_analyzer.analyze_many((f"{row.title} {row.content}" for row in text_stream),
+                                                  processes=processes, use_cache=not rescore)
+        scored = zip(row_stream, results)
+        for partition in iter(lambda: list(islice(scored, batch_size)), []):
+            params = [
+                {'b_id': row.id, 'b_score': result['score'],
+                 'b_label': result['label'], 'b_confidence': result['confidence']}
+                for row, result in partition
+            ]
+            db.session.execute(update_posts, params)
+            db.session.execute(finish_jobs, [{'b_id': p['b_id']} for p in params])
+            db.session.commit()
+            fragment_cache.bump('categories', 'tags', *{f'category:{row.category_id}' for row, _ in partition},
+                               *(f"post:{p['b_id']}" for p in params))
+
+            done += len(params)
+            if report:
+                report(done, time.perf_counter() - started)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if results is not None:
+            # Shuts the worker pool down if the loop stopped early
+            results.close()
+
+    return done, time.perf_counter() - started
+
+
+@click.command('sentiment-backfill')
+@click.option('--rescore', is_flag=True, help='Rescore every post, not just unscored ones.')
+@click.option('--batch-size', default=500, show_default=True, help='Rows per streamed batch.')
+@click.option('--workers', default=1, show_default=True, help='Worker processes for scoring.')
+@with_appcontext
+def sentiment_backfill_command(rescore, batch_size, workers):
+    """Score (or rescore) blog posts in bulk."""
+    def report(done, elapsed):
+        click.echo(f"{done} posts scored ({done / max(elapsed, 1e-9):.1f} docs/s)")
+
+    done, elapsed = backfill_sentiment(rescore=rescore, batch_size=batch_size,
+                                       processes=workers, report=report)
+    click.echo(f"Done: {done} posts in {elapsed:.2f}s ({done / max(elapsed, 1e-9):.1f} docs/s)")
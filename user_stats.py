@@ -0,0 +1,166 @@
+"""
+User Stats Module
+Maintains the per-user UserStats rollup read by the dashboard, profile and home page
+"""
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import update, insert, select, func, exists
+
+
+class UserStatsRollup:
+    """Incremental maintenance and reconciliation of UserStats rows"""
+
+    @staticmethod
+    def get(user_id):
+        """
+        Stats for a user with a single primary-key lookup
+        A missing row is built from the source tables on first access.
+        """
+        from models import db, UserStats
+
+        stats = db.session.get(UserStats, user_id)
+        if stats is None:
+            try:
+                UserStatsRollup._recompute(db.session, user_id)
+                db.session.commit()
+                stats = db.session.get(UserStats, user_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error building user stats: {e}")
+        return stats
+
+    @staticmethod
+    def adjust(user_id, **deltas):
+        """
+        Apply relative changes to one user's counters
+        Runs inside the caller's transaction; call it after the change has been
+        flushed, so a missing row can be rebuilt from the source tables instead.
+        """
+        from models import db, UserStats
+
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if user_id is None or not deltas:
+            return
+
+        result = db.session.execute(
+            update(UserStats)
+            .where(UserStats.user_id == user_id)
+            .values({name: getattr(UserStats, name) + delta for name, delta in deltas.items()})
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            UserStatsRollup._recompute(db.session, user_id)
+
+    @staticmethod
+    def apply_post(before, after):
+        """
+        Adjust post counts for a post going from `before` to `after`
+        Takes PostCounters snapshots; None for `before` on create and for
+        `after` on delete.
+        """
+        changes = {}
+        for snapshot, sign in ((before, -1), (after, 1)):
+            if snapshot is None:
+                continue
+            counts = changes.setdefault(snapshot['user_id'], {'post_count': 0, 'published_post_count': 0})
+            counts['post_count'] += sign
+            counts['published_post_count'] += sign if snapshot['published'] else 0
+
+        for user_id, counts in changes.items():
+            UserStatsRollup.adjust(user_id, **counts)
+
+    @staticmethod
+    def post_activity(post):
+        """
+        Capture what deleting a post takes away from other users' counters
+        Call before the delete; pass the result to forget_post_activity() after
+        the delete has been flushed.
+        """
+        from models import db, Favorite, Comment
+
+        favorites = db.session.execute(
+            select(Favorite.user_id, func.count()).where(Favorite.post_id == post.id).group_by(Favorite.user_id)
+        ).all()
+        comments = db.session.execute(
+            select(Comment.user_id, func.count()).where(Comment.post_id == post.id).group_by(Comment.user_id)
+        ).all()
+        return {
+            'author_id': post.user_id,
+            'views': post.views or 0,
+            'favorites': dict(favorites),
+            'comments': dict(comments)
+        }
+
+    @staticmethod
+    def forget_post_activity(activity):
+        """Remove a deleted post's views, favorites and comments from the rollup"""
+        UserStatsRollup.adjust(activity['author_id'],
+                               total_views=-activity['views'],
+                               favorites_received=-sum(activity['favorites'].values()))
+        for user_id, count in activity['favorites'].items():
+            UserStatsRollup.adjust(user_id, favorites_given=-count)
+        for user_id, count in activity['comments'].items():
+            UserStatsRollup.adjust(user_id, comment_count=-count)
+
+    @staticmethod
+    def favorite_changed(user_id, author_id, delta):
+        """A user favorited (+1) or unfavorited (-1) a post by `author_id`"""
+        UserStatsRollup.adjust(user_id, favorites_given=delta)
+        UserStatsRollup.adjust(author_id, favorites_received=delta)
+
+    @staticmethod
+    def _recompute(executor, user_id=None):
+        """Create missing rows and recompute counters from the source tables"""
+        from models import User, BlogPost, Favorite, Comment, UserStats
+
+        missing = select(User.id).where(~exists().where(UserStats.user_id == User.id))
+        if user_id is not None:
+            missing = missing.where(User.id == user_id)
+        executor.execute(insert(UserStats).from_select(['user_id'], missing))
+
+        def total(column, *criteria):
+            return select(func.coalesce(column, 0)).where(*criteria).scalar_subquery()
+
+        stmt = update(UserStats).values(
+            post_count=total(func.count(BlogPost.id), BlogPost.user_id == UserStats.user_id),
+            published_post_count=total(func.count(BlogPost.id), BlogPost.user_id == UserStats.user_id,
+                                       BlogPost.published == True),
+            total_views=total(func.sum(BlogPost.views), BlogPost.user_id == UserStats.user_id),
+            favorites_received=select(func.count(Favorite.id))
+                .join(BlogPost, BlogPost.id == Favorite.post_id)
+                .where(BlogPost.user_id == UserStats.user_id)
+                .scalar_subquery(),
+            favorites_given=total(func.count(Favorite.id), Favorite.user_id == UserStats.user_id),
+            comment_count=total(func.count(Comment.id), Comment.user_id == UserStats.user_id)
+        ).execution_options(synchronize_session=False)
+        if user_id is not None:
+            stmt = stmt.where(UserStats.user_id == user_id)
+        executor.execute(stmt)
+
+    @staticmethod
+    def rebuild(connection=None):
+        """
+        Reconcile every user's stats with the source tables
+        Pass a connection to run inside its transaction (used by migrations)
+        """
+        from models import db
+
+        if connection is not None:
+            UserStatsRollup._recompute(connection)
+            return
+
+        try:
+            UserStatsRollup._recompute(db.session)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error rebuilding user stats: {e}")
+            raise
+
+
+@click.command('reconcile-user-stats')
+@with_appcontext
+def reconcile_user_stats_command():
+    """Recompute every user's stats rollup from posts, favorites and comments."""
+    UserStatsRollup.rebuild()
+    click.echo('User stats reconciled.')
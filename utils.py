@@ -5,27 +5,54 @@ import os
 import secrets
 import uuid
 
+# Image formats accepted for uploads -> extension the stored file gets
+UPLOAD_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif'}
+
 class FileHandler:
     """Handle file uploads and processing"""
 
     @staticmethod
-    def save_picture(form_picture, folder, size=(800, 600)):
+    def verify_picture(stream):
+        """
+        Check an upload's image header without decoding its pixels
+        Rejects non-images, formats outside UPLOAD_FORMATS, truncated or
+        corrupt files and decompression bombs. Returns the extension for the
+        detected format and leaves the stream rewound.
+        """
+        from PIL import Image
+
+        stream.seek(0)
+        with Image.open(stream) as image:
+            if image.format not in UPLOAD_FORMATS:
+                raise ValueError(f"unsupported image format {image.format}")
+            if Image.MAX_IMAGE_PIXELS and image.width * image.height > Image.MAX_IMAGE_PIXELS:
+                raise ValueError(f"image too large ({image.width}x{image.height})")
+            extension = UPLOAD_FORMATS[image.format]
+            image.verify()
+        stream.seek(0)
+        return extension
+
+    @staticmethod
+    def save_picture(form_picture, folder):
         """
         Save uploaded picture with random filename
+        Resized/WebP renditions are rendered in the background by image_pipeline
+        Returns None when the upload is not a valid image
         Args:
             form_picture: FileStorage object from form
             folder: subfolder in uploads directory
-            size: tuple for image resizing
         Returns:
             filename: saved filename
         """
         try:
-            from PIL import Image
             from flask import current_app
+            from image_pipeline import image_pipeline
+
+            # Cheap header check on the request path; the pixels are decoded in the background
+            f_ext = FileHandler.verify_picture(form_picture.stream)
 
-            # Generate random filename
+            # Generate random filename, named for the real format
             random_hex = secrets.token_hex(8)
-            _, f_ext = os.path.splitext(form_picture.filename)
             picture_fn = random_hex + f_ext
 
             # Create full path
@@ -33,30 +60,11 @@ class FileHandler:
             os.makedirs(upload_path, exist_ok=True)
             picture_path = os.path.join(upload_path, picture_fn)
 
-            # Resize and save image
-            img = Image.open(form_picture)
-            img.thumbnail(size, Image.Resampling.LANCZOS)
-            img.save(picture_path, optimize=True, quality=85)
+            # Store the original as uploaded; no decoding on the request path
+            form_picture.save(picture_path)
+            image_pipeline.submit(picture_path, folder)
             return picture_fn
 
-        except ImportError:
-            # If PIL is not available, save without resizing
-            try:
-                from flask import current_app
-
-                random_hex = secrets.token_hex(8)
-                _, f_ext = os.path.splitext(form_picture.filename)
-                picture_fn = random_hex + f_ext
-
-                upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], folder)
-                os.makedirs(upload_path, exist_ok=True)
-                picture_path = os.path.join(upload_path, picture_fn)
-
-                form_picture.save(picture_path)
-                return picture_fn
-            except Exception as e:
-                print(f"Error saving image: {e}")
-                return None
         except Exception as e:
             print(f"Error saving image: {e}")
             return None
@@ -67,9 +75,11 @@ class FileHandler:
         if filename and filename != 'default.jpg':
             try:
                 from flask import current_app
+                from image_pipeline import image_pipeline
                 file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], folder, filename)
                 if os.path.exists(file_path):
                     os.remove(file_path)
+                image_pipeline.delete_renditions(filename, folder)
             except Exception as e:
                 print(f"Error deleting file: {e}")
 
@@ -0,0 +1,111 @@
+"""
+View Counter Module
+Buffers post view increments in memory and writes them back in batches
+"""
+import atexit
+import os
+import threading
+from sqlalchemy import text
+
+
+class ViewCounter:
+    """Write-behind accumulator for BlogPost.views"""
+
+    def __init__(self):
+        """Initialize the counter"""
+        self.app = None
+        self.flush_interval = 5.0
+        self.flush_threshold = 200
+        self._reset()
+
+        # A forked worker must not inherit (and double-flush) the parent's buffer
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """Drop buffered state and the flusher thread reference"""
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pending_total = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        """Read configuration and flush whatever is buffered on shutdown"""
+        self.app = app
+        self.flush_interval = app.config.get('VIEW_COUNTER_FLUSH_INTERVAL', 5.0)
+        self.flush_threshold = app.config.get('VIEW_COUNTER_FLUSH_THRESHOLD', 200)
+        atexit.register(self.shutdown)
+
+    def increment(self, post_id, amount=1):
+        """Record a view; flushes immediately once the threshold is reached"""
+        with self._lock:
+            self._pending[post_id] = self._pending.get(post_id, 0) + amount
+            self._pending_total += amount
+            threshold_reached = self._pending_total >= self.flush_threshold
+
+        self._ensure_flusher()
+        if threshold_reached:
+            self.flush()
+
+    def pending(self, post_id):
+        """Return views recorded for a post but not yet written"""
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def flush(self):
+        """Write all buffered views with atomic relative UPDATEs"""
+        with self._lock:
+            batch = self._pending
+            self._pending = {}
+            self._pending_total = 0
+
+        if not batch or self.app is None:
+            return
+
+        from models import db
+
+        try:
+            with self.app.app_context():
+                params = [{'id': post_id, 'amount': amount} for post_id, amount in batch.items()]
+                with db.engine.begin() as connection:
+                    connection.execute(
+                        text("UPDATE blog_post SET views = coalesce(views, 0) + :amount WHERE id = :id"),
+                        params
+                    )
+                    # Keep the authors' UserStats rollup in the same transaction
+                    connection.execute(
+                        text("UPDATE user_stats SET total_views = total_views + :amount "
+                             "WHERE user_id = (SELECT user_id FROM blog_post WHERE id = :id)"),
+                        params
+                    )
+        except Exception as e:
+            print(f"Error flushing view counts: {e}")
+            # Put the batch back so the next flush retries it
+            with self._lock:
+                for post_id, amount in batch.items():
+                    self._pending[post_id] = self._pending.get(post_id, 0) + amount
+                    self._pending_total += amount
+
+    def shutdown(self):
+        """Stop the background flusher and write out remaining views"""
+        self._stop.set()
+        self.flush()
+
+    def _ensure_flusher(self):
+        """Start the periodic flush thread lazily (after any fork)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """Flush on a fixed interval until shutdown"""
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+# Global instance
+view_counter = ViewCounter()